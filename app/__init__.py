@@ -59,10 +59,39 @@ def create_app():
     # Init extensions
     # -------------------------
     db.init_app(app)
-    socketio.init_app(app)
+    socketio.init_app(app, message_queue=app.config["SOCKETIO_MESSAGE_QUEUE"])  # Set to share emits across workers
     mail.init_app(app)
     migrate.init_app(app, db)
 
+    from app.services.logging_service import user_loggers
+    user_loggers.init_app(app)
+
+    from app.services.auth_key_service import auth_key_cache
+    auth_key_cache.init_app(app)
+
+    from app.services.profile_service import profile_cache
+    profile_cache.init_app(app)
+
+    from app.services.presence_service import presence, presence_subscriptions, typing_throttle
+    presence.init_app(app)
+    presence_subscriptions.init_app(app)
+    typing_throttle.init_app(app)
+
+    from app.services.status_service import status_batcher
+    status_batcher.init_app(app)
+
+    from app.services import media_service
+    media_service.init_app(app)
+
+    from app.services.media_processing_service import media_processor
+    media_processor.init_app(app)
+
+    from app.services.thumbnail_service import thumbnail_cache
+    thumbnail_cache.init_app(app)
+
+    from app.services.upload_service import upload_sessions
+    upload_sessions.init_app(app)
+
     # Import and register blueprints (inside factory to avoid circular imports)
     from app.routes.auth_routes import auth_bp  # Import routes here
     from app.routes.chat_routes import chat_bp  # Import routes here
@@ -27,6 +27,75 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads", "media")
     THUMBNAIL_FOLDER = os.path.join(os.getcwd(), "uploads", "thumbnails")
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB file size limit
+    MEDIA_SEGMENT_SIZE = int(os.environ.get("MEDIA_SEGMENT_SIZE", 64 * 1024))  # Bytes encrypted/decrypted per step
+    MEDIA_STORE_SECRET = os.environ.get("MEDIA_STORE_SECRET")  # Server media key seed; required unless DEBUG (never derived from SECRET_KEY)
+    MEDIA_GC_GRACE = int(os.environ.get("MEDIA_GC_GRACE", 300))  # Seconds a freshly stored object is safe from GC
+    MEDIA_WORKERS = int(os.environ.get("MEDIA_WORKERS", 2))  # Thumbnail/MIME worker processes; 0 runs inline
+    MEDIA_POLL_INTERVAL_MS = int(os.environ.get("MEDIA_POLL_INTERVAL_MS", 50))
+    UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 2 * 1024 ** 3))  # Resumable uploads (/chat/uploads); requests stay under MAX_CONTENT_LENGTH
+    UPLOAD_PART_SIZE = int(os.environ.get("UPLOAD_PART_SIZE", 512 * 1024))  # Default part; clients may pick any multiple of 1 KiB
+    UPLOAD_PART_MAX = int(os.environ.get("UPLOAD_PART_MAX", 512 * 1024))
+    UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", 24 * 3600))  # Seconds an idle session survives
+    UPLOAD_SWEEP_INTERVAL = int(os.environ.get("UPLOAD_SWEEP_INTERVAL", 600))
+    THUMBNAIL_SIZES = {"list": 64, "bubble": 320, "preview": 1280}  # Rendition name -> longest edge in pixels
+    THUMBNAIL_CACHE_BYTES = int(os.environ.get("THUMBNAIL_CACHE_BYTES", 32 * 1024 * 1024))  # Served-thumbnail LRU
+
+    # Per-User MTProto Logs
+    LOGS_FOLDER = os.path.join(os.getcwd(), "logs")
+    LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", 7))
+    LOG_MAX_OPEN_HANDLERS = int(os.environ.get("LOG_MAX_OPEN_HANDLERS", 128))  # LRU bound on open log files
+    LOG_SWEEP_INTERVAL = int(os.environ.get("LOG_SWEEP_INTERVAL", 3600))  # Seconds between retention sweeps
+
+    # MTProto Crypto Trace (written to logs/ by a background QueueListener)
+    CRYPTO_TRACE_ENABLED = os.environ.get("CRYPTO_TRACE_ENABLED", "True").lower() in ["true", "1", "t", "y", "yes"]  # Disable in production
+    CRYPTO_TRACE_LEVEL = os.environ.get("CRYPTO_TRACE_LEVEL", "DEBUG")  # INFO drops the hex/JSON dumps
+    CRYPTO_TRACE_HEX_LIMIT = int(os.environ.get("CRYPTO_TRACE_HEX_LIMIT", 64))  # Max bytes per hex/base64 dump
+
+    # auth_key_id -> auth_key Cache (decrypt_message)
+    AUTH_KEY_CACHE_SIZE = int(os.environ.get("AUTH_KEY_CACHE_SIZE", 1024))
+    AUTH_KEY_CACHE_TTL = int(os.environ.get("AUTH_KEY_CACHE_TTL", 300))  # Seconds
+
+    # User Profile Cache (display names for contacts, /users, /user_info, typing, crypto logs)
+    PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", 10000))
+    PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", 300))  # Seconds
+
+    # User Directory Pagination (/users)
+    USERS_PAGE_SIZE = int(os.environ.get("USERS_PAGE_SIZE", 100))
+    USERS_PAGE_MAX = int(os.environ.get("USERS_PAGE_MAX", 1000))
+
+    # Message History Pagination
+    MESSAGE_PAGE_SIZE = int(os.environ.get("MESSAGE_PAGE_SIZE", 50))  # Default page for /chat/messages
+    MESSAGE_PAGE_MAX = int(os.environ.get("MESSAGE_PAGE_MAX", 500))
+    MESSAGE_STREAM_BATCH = int(os.environ.get("MESSAGE_STREAM_BATCH", 200))  # yield_per for NDJSON streaming
+
+    # Contact List Pagination (users without a conversation yet)
+    CONTACTS_PAGE_SIZE = int(os.environ.get("CONTACTS_PAGE_SIZE", 100))
+    CONTACTS_PAGE_MAX = int(os.environ.get("CONTACTS_PAGE_MAX", 1000))
+
+    # Offline Delivery (messages pushed per receive_messages event on join)
+    OFFLINE_DELIVERY_CHUNK = int(os.environ.get("OFFLINE_DELIVERY_CHUNK", 100))
+
+    # Cloud Send Self-Check (fraction of sent messages decrypted again and compared; 0 disables)
+    CLOUD_SEND_VERIFY_RATE = float(os.environ.get("CLOUD_SEND_VERIFY_RATE", 0.0))
+
+    # Message Status Durability: "batched" (write-behind, WAL on SQLite) or "strict" (commit per event)
+    MESSAGE_DURABILITY = os.environ.get("MESSAGE_DURABILITY", "batched")
+    STATUS_FLUSH_INTERVAL_MS = int(os.environ.get("STATUS_FLUSH_INTERVAL_MS", 5))
+    STATUS_FLUSH_MAX_EVENTS = int(os.environ.get("STATUS_FLUSH_MAX_EVENTS", 200))
+    STATUS_FLUSH_RETRY_MS = int(os.environ.get("STATUS_FLUSH_RETRY_MS", 1000))  # Delay before retrying a failed flush
+
+    # Multi-Worker Socket.IO (e.g. redis://localhost:6379/0); unset runs a single worker
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+    PRESENCE_BACKEND = os.environ.get("PRESENCE_BACKEND", "memory")  # "memory" or "redis"
+    PRESENCE_REDIS_URL = os.environ.get("PRESENCE_REDIS_URL")  # Defaults to SOCKETIO_MESSAGE_QUEUE
+    PRESENCE_TTL = int(os.environ.get("PRESENCE_TTL", 60))  # Redis: seconds a dead worker's sockets stay online
+    PRESENCE_WORKER_ID = os.environ.get("PRESENCE_WORKER_ID")  # Redis: stable id per worker slot; defaults to host:pid
+    PRESENCE_FLUSH_INTERVAL = float(os.environ.get("PRESENCE_FLUSH_INTERVAL", 5))  # Seconds between users.last_seen writes
+    PRESENCE_COALESCE_MS = int(os.environ.get("PRESENCE_COALESCE_MS", 1500))  # Window in which online/offline flaps cancel out
+    PRESENCE_SUBSCRIBE_MAX = int(os.environ.get("PRESENCE_SUBSCRIBE_MAX", 500))  # Users one socket may watch
+    PRESENCE_STATUS_CACHE_TTL = int(os.environ.get("PRESENCE_STATUS_CACHE_TTL", 60))  # Seconds users.last_seen answers are reused
+    PRESENCE_STATUS_MAX_AGE = int(os.environ.get("PRESENCE_STATUS_MAX_AGE", 5))  # Browser cache for /status
+    TYPING_RELAY_INTERVAL = float(os.environ.get("TYPING_RELAY_INTERVAL", 2))  # Min seconds between relays per sender/receiver pair
 
     # Session Configuration (for security)
     SESSION_COOKIE_SECURE = False  # Set to True in production when using HTTPS
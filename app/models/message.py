@@ -5,6 +5,13 @@ from app import db
 
 class Message(db.Model):
     __tablename__ = "messages"
+    __table_args__ = (
+        db.Index("ix_messages_sender_id_timestamp", "sender_id", "timestamp"),      # history, contacts
+        db.Index("ix_messages_receiver_id_timestamp", "receiver_id", "timestamp"),  # history, contacts
+        db.Index("ix_messages_receiver_id_status", "receiver_id", "status"),        # pending delivery on join
+        db.Index("ix_messages_sender_receiver_timestamp",                           # one conversation's history
+                 "sender_id", "receiver_id", "timestamp"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
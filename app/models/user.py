@@ -6,6 +6,8 @@ from app import db
 import logging
 import os
 import hashlib
+from app.services.auth_key_service import auth_key_cache
+from app.services.profile_service import profile_cache
 
 # -----------------------------
 # 📋 Logger Setup
@@ -31,6 +33,10 @@ logger.addHandler(console_handler)
 # -----------------------------
 class User(db.Model):
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index("ix_users_auth_key_id", "auth_key_id"),  # decrypt_message looks keys up by id
+        db.Index("ix_users_profile_updated_at", "profile_updated_at"),  # max() for the /users ETag
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -56,6 +62,7 @@ class User(db.Model):
 
     # Activity & Presence
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    profile_updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # Last username/email/phone change
     is_online = db.Column(db.Boolean, default=False)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -80,12 +87,16 @@ class User(db.Model):
         Set the user's MTProto 2.0 auth key and related metadata.
         This should only be called during DH key exchange.
         """
+        old_auth_key_id = self.auth_key_id
         self.auth_key = auth_key
         self.auth_key_id = hashlib.sha1(auth_key).digest()[-8:].hex()  # Proper 64-bit ID from SHA1
         self.salt = os.urandom(8).hex()
         self.session_id = os.urandom(8).hex()
         db.session.commit()
 
+        auth_key_cache.invalidate(auth_key_id=old_auth_key_id)
+        auth_key_cache.invalidate(auth_key_id=self.auth_key_id)
+
         logger.info(
             f"[AuthKey] Set for User {self.id} | "
             f"auth_key_id={self.auth_key_id}, salt={self.salt}, session_id={self.session_id}"
@@ -95,4 +106,46 @@ class User(db.Model):
         return self.auth_key
 
     def __repr__(self):
-        return f"<User {self.username or self.email or self.phone}>"
\ No newline at end of file
+        return f"<User {self.username or self.email or self.phone}>"
+
+
+# -------------------------
+# ♻️ Profile Cache Invalidation
+# -------------------------
+# Invalidating at flush time would let a concurrent request re-prime the cache
+# from the pre-commit row and keep that for a full TTL. Affected ids are
+# collected per session on flush and only dropped once the commit lands.
+# Profile edits also stamp profile_updated_at, which the /users ETag reads.
+PROFILE_FIELDS = ("username", "email", "phone")
+
+
+def _profile_changed(target):
+    state = db.inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in PROFILE_FIELDS)
+
+
+@db.event.listens_for(db.session, "before_flush")
+def _stamp_profile_changes(session, flush_context, instances):
+    for user in session.dirty:
+        if isinstance(user, User) and _profile_changed(user):
+            user.profile_updated_at = datetime.utcnow()
+
+
+@db.event.listens_for(db.session, "after_flush")
+def _collect_profile_changes(session, flush_context):
+    changed = {user.id for user in session.new if isinstance(user, User)}
+    changed.update(user.id for user in session.deleted if isinstance(user, User))
+    changed.update(user.id for user in session.dirty if isinstance(user, User) and _profile_changed(user))
+    if changed:
+        session.info.setdefault("profile_changes", set()).update(changed)
+
+
+@db.event.listens_for(db.session, "after_commit")
+def _invalidate_profiles(session):
+    for user_id in session.info.pop("profile_changes", ()):
+        profile_cache.invalidate(user_id=user_id)
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def _discard_profile_changes(session):
+    session.info.pop("profile_changes", None)
@@ -1,8 +1,10 @@
-from flask import Blueprint, request, jsonify, session, redirect, url_for, render_template
+from flask import Blueprint, Response, request, jsonify, session, redirect, url_for, render_template
 from app import db, mail
 from app.models.user import User
 from app.services.otp_service import send_otp_email, send_otp_sms, generate_otp
 from app.services.encryption_service import encrypt_message, decrypt_message
+from app.services.wire_service import TL_CONTENT_TYPE, encode_encrypted, decode_encrypted
+import struct
 from datetime import datetime, timedelta
 from flask_mail import Message as MailMessage
 
@@ -155,6 +157,11 @@ def send_message():
         sender_user, recipient_user, plaintext_message
     )
 
+    # Clients that accept TL get the raw encryptedMessage envelope instead of hex-in-JSON
+    if request.accept_mimetypes.best_match(["application/json", TL_CONTENT_TYPE]) == TL_CONTENT_TYPE:
+        body = encode_encrypted(encrypted_data, msg_key, auth_key_id, salt, session_id, msg_id, seq_no)
+        return Response(body, status=201, mimetype=TL_CONTENT_TYPE)
+
     return jsonify({
         "message": "Encrypted message generated",
         "payload": {
@@ -174,12 +181,19 @@ def send_message():
 # -------------------------------
 @auth_bp.route("/decrypt-message", methods=["POST"])
 def decrypt_msg():
-    data = request.get_json()
-    encrypted_message_hex = data.get("encrypted_message")
-    msg_key = data.get("msg_key")
-    auth_key_id = data.get("auth_key_id")
+    if request.mimetype == TL_CONTENT_TYPE:
+        # Body is the encryptedMessage envelope /send-message returns to TL clients
+        try:
+            encrypted_message, msg_key, auth_key_id = decode_encrypted(request.get_data())[:3]
+        except (ValueError, struct.error):
+            return jsonify({"error": "Malformed encryptedMessage"}), 400
+    else:
+        data = request.get_json()
+        encrypted_message_hex = data.get("encrypted_message")
+        msg_key = data.get("msg_key")
+        auth_key_id = data.get("auth_key_id")
+        encrypted_message = bytes.fromhex(encrypted_message_hex)
 
-    encrypted_message = bytes.fromhex(encrypted_message_hex)
     decrypted_message = decrypt_message(encrypted_message, msg_key, auth_key_id)
 
     if "error" in decrypted_message:
@@ -1,42 +1,150 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, session, stream_with_context
 from flask_socketio import emit, join_room, leave_room, disconnect
 from app import db, socketio
 from app.models.user import User
 from app.models.message import Message
-from app.services.encryption_service import encrypt_message, decrypt_message
+from app.services.encryption_service import encrypt_message, decrypt_message, decrypt_messages
+from app.services.status_service import status_batcher
+from app.services.media_service import (
+    MediaWriter, allowed_file, read_media_header, media_etag, iter_decrypted_range, release_media, media_store_stats
+)
+from app.services.media_processing_service import media_processor
+from app.services.upload_service import upload_sessions, UploadSessionError
+from app.services.thumbnail_service import thumbnail_cache
+from app.services.presence_service import (
+    presence, presence_subscriptions, presence_room, presence_entry, typing_throttle
+)
+from app.services.profile_service import profile_cache
+from app.services.wire_service import WIRE_FORMATS, wire_room, emit_message, emit_messages
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.sansio.multipart import MultipartDecoder, NEED_DATA, Data, Epilogue, Field, File
 from datetime import datetime
+import os
+import json
+import random
+import mimetypes
 import logging
+from sqlalchemy import case, func
 
 chat_bp = Blueprint("chat", __name__)
 logger = logging.getLogger(__name__)
 
-connected_users = {}
+
+# -------------------------------------
+# 📜 Message History (keyset pagination)
+# -------------------------------------
+def _is_secret(msg):
+    return msg.auth_key_id in (b'secretchat', 'secretchat')
+
+def _message_text(msg):
+    if _is_secret(msg):
+        return msg.encrypted_data.decode('utf-8')  # For secret chats (E2EE)
+    if msg.auth_key_id:
+        return decrypt_message(msg.encrypted_data, msg.msg_key, msg.auth_key_id).get("text")
+    return None
+
+def _message_payload(msg):
+    return {
+        "id": msg.id,
+        "from": msg.sender_id,
+        "to": msg.receiver_id,
+        "text": _message_text(msg),
+        "media_type": msg.media_type,
+        "timestamp": msg.timestamp.isoformat(),
+        "status": msg.status,
+        "chat_mode": "secret" if _is_secret(msg) else "cloud",
+        "file": msg.file_path,
+        "thumbnail": msg.thumbnail_path
+    }
+
+def _encode_cursor(msg):
+    return f"{msg.timestamp.isoformat()}_{msg.id}"
+
+def _decode_cursor(cursor):
+    timestamp, _, msg_id = cursor.rpartition("_")
+    return datetime.fromisoformat(timestamp), int(msg_id)
+
+def _page_limit():
+    limit = request.args.get("limit", current_app.config["MESSAGE_PAGE_SIZE"], type=int)
+    return max(1, min(limit, current_app.config["MESSAGE_PAGE_MAX"]))
+
+def _history_query(user_id, with_user_id=None):
+    """Messages ``user_id`` can still see (not deleted on their side), optionally with one partner."""
+    if with_user_id is None:
+        return Message.query.filter(
+            ((Message.sender_id == user_id) & (Message.visible_to_sender == True)) |
+            ((Message.receiver_id == user_id) & (Message.visible_to_receiver == True))
+        )
+    return Message.query.filter(
+        ((Message.sender_id == user_id) & (Message.receiver_id == with_user_id) & (Message.visible_to_sender == True)) |
+        ((Message.sender_id == with_user_id) & (Message.receiver_id == user_id) & (Message.visible_to_receiver == True))
+    )
+
+def _apply_cursors(query, before, after):
+    """Restrict to rows strictly between the cursors, ordered on (timestamp, id)."""
+    if before:
+        ts, msg_id = _decode_cursor(before)
+        query = query.filter(
+            (Message.timestamp < ts) | ((Message.timestamp == ts) & (Message.id < msg_id))
+        )
+    if after:
+        ts, msg_id = _decode_cursor(after)
+        query = query.filter(
+            (Message.timestamp > ts) | ((Message.timestamp == ts) & (Message.id > msg_id))
+        )
+    return query
+
+def _stream_ndjson(query):
+    batch_size = current_app.config["MESSAGE_STREAM_BATCH"]
+    query = query.order_by(Message.timestamp.asc(), Message.id.asc()).yield_per(batch_size)
+
+    def generate():
+        for msg in query:
+            yield json.dumps(_message_payload(msg)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def _history_response(query):
+    """
+    One page of history as a JSON list (oldest first), newest page by default.
+
+    ``before``/``after`` take the cursors returned in the ``X-Before-Cursor`` /
+    ``X-After-Cursor`` headers; ``format=ndjson`` streams every matching row instead.
+    """
+    before = request.args.get("before")
+    after = request.args.get("after")
+    try:
+        query = _apply_cursors(query, before, after)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    if request.args.get("format") == "ndjson":
+        return _stream_ndjson(query)
+
+    limit = _page_limit()
+    if after and not before:
+        # Walk forward from the cursor (e.g. catching up on new messages)
+        page = query.order_by(Message.timestamp.asc(), Message.id.asc()).limit(limit).all()
+    else:
+        page = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).all()
+        page.reverse()
+
+    response = jsonify([_message_payload(msg) for msg in page])
+    if page:
+        response.headers["X-Before-Cursor"] = _encode_cursor(page[0])
+        response.headers["X-After-Cursor"] = _encode_cursor(page[-1])
+    return response
 
 @chat_bp.route("/messages/<int:user_id>", methods=["GET"])
 def get_messages(user_id):
-    messages = Message.query.filter(
-        (Message.sender_id == user_id) | (Message.receiver_id == user_id)
-    ).order_by(Message.timestamp.asc()).all()
+    with_user_id = request.args.get("with_user_id", type=int)
+    return _history_response(_history_query(user_id, with_user_id))
 
-    results = []
-    for msg in messages:
-        if msg.auth_key_id:
-            decrypted = decrypt_message(msg.encrypted_data, msg.msg_key, msg.auth_key_id)
-            text = decrypted.get("text")
-        else:
-            text = msg.encrypted_data  # For secret chats (E2EE)
-        results.append({
-            "id": msg.id,
-            "from": msg.sender_id,
-            "to": msg.receiver_id,
-            "text": text,
-            "media_type": msg.media_type,
-            "timestamp": msg.timestamp.isoformat(),
-            "status": msg.status,
-            "file": msg.file_path,
-            "thumbnail": msg.thumbnail_path
-        })
-    return jsonify(results)
+@chat_bp.route("/conversations/<int:user_id>/<int:with_user_id>/messages", methods=["GET"])
+def get_conversation(user_id, with_user_id):
+    """One conversation as ``user_id`` sees it; same paging parameters as /messages."""
+    return _history_response(_history_query(user_id, with_user_id))
 
 @socketio.on("exchange_public_key")
 def handle_public_key_exchange(data):
@@ -49,6 +157,53 @@ def handle_public_key_exchange(data):
         "public_key": public_key
     }, room=f"user_{receiver_id}")
 
+def _verify_round_trip(message_id, encrypted_blob, msg_key, auth_key_id, text):
+    decrypted = decrypt_message(encrypted_blob, msg_key, auth_key_id)
+    if decrypted.get("text") != text:
+        logger.error(f"[VERIFY] Round-trip mismatch for message {message_id}: {decrypted.get('error', 'text differs')}")
+    else:
+        print(f"🔓 [Cloud Chat] Verified round-trip for message {message_id}\n")
+
+def _save_cloud_message(sender, receiver, text, receiver_online, **media):
+    """Encrypt ``text`` server-side, store it (plus any media columns) and return the socket payload."""
+    encrypted_blob, msg_key, auth_key_id, salt, session_id, msg_id, seq_no = encrypt_message(sender, receiver, text)
+    logger.info(f"[ENCRYPT] User '{sender.username}' sent message to '{receiver.username}'")
+
+    message = Message(
+        sender_id=sender.id,
+        receiver_id=receiver.id,
+        encrypted_data=encrypted_blob,
+        msg_key=msg_key,
+        auth_key_id=auth_key_id,
+        session_id=session_id,
+        salt=salt,
+        msg_id=msg_id,
+        seq_no=seq_no,
+        status="delivered" if receiver_online else "sent",  # Insert and delivery share one commit
+        **media
+    )
+    db.session.add(message)
+    db.session.flush()  # Assigns id/timestamp now so nothing is reloaded after the commit
+
+    payload = {
+        "id": message.id,
+        "from": sender.id,
+        "to": receiver.id,
+        "text": text,
+        "timestamp": message.timestamp.isoformat(),
+        "status": message.status,
+        "chat_mode": "cloud"
+    }
+    if message.file_path:
+        payload.update(media_type=message.media_type, file=message.file_path, thumbnail=message.thumbnail_path)
+    db.session.commit()
+
+    # The plaintext is already in hand; only a sampled fraction is round-tripped as a self-check
+    if random.random() < current_app.config["CLOUD_SEND_VERIFY_RATE"]:
+        _verify_round_trip(payload["id"], encrypted_blob, msg_key, auth_key_id, text)
+
+    return payload
+
 @socketio.on("send_message")
 def handle_send_message(data):
     sender_id = data.get("sender_id")
@@ -62,10 +217,7 @@ def handle_send_message(data):
         emit("error", {"message": "User not found"})
         return
 
-    receiver_room = f"user_{receiver.id}"
-    sender_room = f"user_{sender.id}"
-
-    active_sids = socketio.server.manager.rooms.get("/", {}).get(receiver_room, set())
+    receiver_online = presence.is_online(receiver.id)
 
     # 🔐 Secret Chat Logic (unchanged)
     if chat_mode == "secret":
@@ -84,212 +236,259 @@ def handle_send_message(data):
             salt=data.get("salt"),
             msg_id=b'secretchat',
             seq_no=None,
-            status="sent"
+            status="delivered" if receiver_online else "sent"  # Insert and delivery share one commit
         )
         db.session.add(message)
-        db.session.commit()
-
-        # Emit to receiver (if online)
-        if active_sids:
-            emit("receive_message", {
-                "id": message.id,
-                "from": sender.id,
-                "to": receiver.id,
-                "text": message.encrypted_data.decode('utf-8'),
-                "timestamp": message.timestamp.isoformat(),
-                "status": "✔",
-                "chat_mode": "secret"
-            }, room=receiver_room)
-            message.status = "delivered"
-            db.session.commit()
+        db.session.flush()  # Assigns id/timestamp now so nothing is reloaded after the commit
 
-        # Emit to sender (always)
-        emit("receive_message", {
+        payload = {
             "id": message.id,
             "from": sender.id,
             "to": receiver.id,
-            "text": message.encrypted_data.decode('utf-8'),
+            "text": text,
             "timestamp": message.timestamp.isoformat(),
             "status": message.status,
             "chat_mode": "secret"
-        }, room=sender_room)
+        }
+        db.session.commit()
+
+        # Emit to receiver (if online)
+        if receiver_online:
+            emit_message(dict(payload, status="✔"), receiver.id)
+
+        # Emit to sender (always)
+        emit_message(payload, sender.id)
 
     # ☁️ Cloud Chat Logic
     else:
         print(f"\n📨 [Cloud Chat] Message sent from '{sender.username}' to '{receiver.username}'")
 
-        # Encrypt message (server-side encryption)
-        encrypted_blob, msg_key, auth_key_id, salt, session_id, msg_id, seq_no = encrypt_message(sender, receiver, text)
-        logger.info(f"[ENCRYPT] User '{sender.username}' sent message to '{receiver.username}'")
-
-        message = Message(
-            sender_id=sender.id,
-            receiver_id=receiver.id,
-            encrypted_data=encrypted_blob,
-            msg_key=msg_key,
-            auth_key_id=auth_key_id,
-            session_id=session_id,
-            salt=salt,
-            msg_id=msg_id,
-            seq_no=seq_no,
-            status="sent"
-        )
-        db.session.add(message)
-        db.session.commit()
-
-        # Decrypt message for frontend (plaintext)
-        decrypted = decrypt_message(encrypted_blob, msg_key, auth_key_id)
-
-        # Log decrypted message for Cloud Chat
-        print(f"🔓 [Cloud Chat] Decrypted message: \"{decrypted.get('text')}\"\n")
+        payload = _save_cloud_message(sender, receiver, text, receiver_online)
 
         # Emit to receiver (if online)
-        if active_sids:
-            emit("receive_message", {
-                "id": message.id,
-                "from": sender.id,
-                "to": receiver.id,
-                "text": decrypted.get("text"),
-                "timestamp": message.timestamp.isoformat(),
-                "status": "✔",
-                "chat_mode": "cloud"
-            }, room=receiver_room)
-            message.status = "delivered"
-            db.session.commit()
+        if receiver_online:
+            emit_message(dict(payload, status="✔"), receiver.id)
 
         # Emit to sender (always)
-        emit("receive_message", {
-            "id": message.id,
-            "from": sender.id,
-            "to": receiver.id,
-            "text": decrypted.get("text"),
-            "timestamp": message.timestamp.isoformat(),
-            "status": message.status,
-            "chat_mode": "cloud"
-        }, room=sender_room)
+        emit_message(payload, sender.id)
+
+def _current_status(message_id):
+    """(sender_id, status) for a message, preferring a status still waiting to be flushed."""
+    row = db.session.query(Message.sender_id, Message.status).filter_by(id=message_id).first()
+    if not row:
+        return None, None
+    return row.sender_id, status_batcher.pending_status(message_id) or row.status
 
 @socketio.on("mark_read")
 def mark_message_read(data):
     message_id = data.get("message_id")
-    message = Message.query.get(message_id)
-    if message and message.status != "read":
-        message.status = "read"
-        db.session.commit()
+    sender_id, status = _current_status(message_id)
+    if sender_id is not None and status != "read":
+        status_batcher.record(message_id, "read")
 
         emit("message_status", {
-            "message_id": message.id,
+            "message_id": message_id,
             "status": "✅"
-        }, room=f"user_{message.sender_id}")
+        }, room=f"user_{sender_id}")
 
 @socketio.on("message_status")
 def update_message_status(data):
     message_id = data.get("message_id")
     new_status = data.get("status")
 
-    message = Message.query.get(message_id)
-    if message and new_status and message.status != "read":
-        message.status = new_status
-        db.session.commit()
+    sender_id, status = _current_status(message_id)
+    if sender_id is not None and new_status and status != "read":
+        status_batcher.record(message_id, new_status)
 
         emit("message_status", {
-            "message_id": message.id,
+            "message_id": message_id,
             "status": new_status
-        }, room=f"user_{message.sender_id}")
+        }, room=f"user_{sender_id}")
 
 @chat_bp.route("/contacts/<int:user_id>")
 def get_contacts(user_id):
-    messages = Message.query.filter(
+    """
+    Conversation partners (most recent first) with their last message time and
+    unread count, followed by a page of every other user ordered by id.
+
+    Pass ``after_id`` (from the ``X-Next-After-Id`` header) to fetch the next page
+    of other users only.
+    """
+    limit = request.args.get("limit", current_app.config["CONTACTS_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, current_app.config["CONTACTS_PAGE_MAX"]))
+    after_id = request.args.get("after_id", type=int)
+
+    partner_id = case((Message.sender_id == user_id, Message.receiver_id), else_=Message.sender_id)
+    conversations = db.session.query(
+        partner_id.label("partner_id"),
+        func.max(Message.timestamp).label("last_message_at"),
+        func.sum(case(((Message.receiver_id == user_id) & (Message.status != "read"), 1), else_=0)).label("unread"),
+    ).filter(
         (Message.sender_id == user_id) | (Message.receiver_id == user_id)
-    ).order_by(Message.timestamp.desc()).all()
+    ).group_by(partner_id).subquery()
 
-    seen = set()
     ordered_contacts = []
 
-    for msg in messages:
-        other_id = msg.receiver_id if msg.sender_id == user_id else msg.sender_id
-        if other_id != user_id and other_id not in seen:
-            user = User.query.get(other_id)
-            if user:
-                ordered_contacts.append({
-                    "id": user.id,
-                    "username": user.username or user.email or user.phone
-                })
-                seen.add(other_id)
-
-    all_users = User.query.filter(User.id != user_id).all()
-    for u in all_users:
-        if u.id not in seen:
+    if after_id is None:
+        rows = db.session.query(
+            conversations.c.partner_id, conversations.c.last_message_at, conversations.c.unread,
+        ).filter(conversations.c.partner_id != user_id).order_by(conversations.c.last_message_at.desc()).all()
+
+        # Names come from the profile cache; partners whose account is gone are skipped
+        profiles = profile_cache.get_many(row.partner_id for row in rows)
+        for row in rows:
+            if row.partner_id not in profiles:
+                continue
             ordered_contacts.append({
-                "id": u.id,
-                "username": u.username or u.email or u.phone
+                "id": row.partner_id,
+                "username": profiles[row.partner_id].display_name,
+                "last_message_at": row.last_message_at.isoformat() if row.last_message_at else None,
+                "unread": int(row.unread or 0)
             })
 
-    return jsonify(ordered_contacts)
+    others = [row.id for row in db.session.query(User.id).filter(
+        User.id != user_id,
+        User.id > (after_id or 0),
+        ~User.id.in_(db.session.query(conversations.c.partner_id)),
+    ).order_by(User.id.asc()).limit(limit)]
+
+    profiles = profile_cache.get_many(others)
+    for other_id in others:
+        ordered_contacts.append({
+            "id": other_id,
+            "username": profiles[other_id].display_name if other_id in profiles else None,
+            "last_message_at": None,
+            "unread": 0
+        })
+
+    response = jsonify(ordered_contacts)
+    if len(others) == limit:
+        response.headers["X-Next-After-Id"] = str(others[-1])
+    return response
+
+def _deliver_pending(user_id):
+    """
+    Push messages stored while the user was offline in bounded chunks: one
+    ``receive_messages`` event and one bulk status UPDATE per chunk, yielding to
+    the event loop in between so a long backlog doesn't stall other sockets.
+    """
+    chunk_size = current_app.config["OFFLINE_DELIVERY_CHUNK"]
+    last_id = 0
+
+    while True:
+        chunk = Message.query.filter(
+            Message.receiver_id == user_id,
+            Message.status == "sent",
+            Message.id > last_id
+        ).order_by(Message.id.asc()).limit(chunk_size).all()
+        if not chunk:
+            break
+
+        cloud = [msg for msg in chunk if not _is_secret(msg)]
+        decrypted = decrypt_messages((msg.encrypted_data, msg.msg_key, msg.auth_key_id) for msg in cloud)
+        texts = {msg.id: payload.get("text") for msg, payload in zip(cloud, decrypted)}
+
+        emit_messages([{
+            "id": msg.id,
+            "from": msg.sender_id,
+            "to": msg.receiver_id,
+            "text": msg.encrypted_data.decode('utf-8') if _is_secret(msg) else texts[msg.id],
+            "timestamp": msg.timestamp.isoformat(),
+            "status": "✔",
+            "chat_mode": "secret" if _is_secret(msg) else "cloud"
+        } for msg in chunk], user_id)
+
+        ids = [msg.id for msg in chunk]
+        Message.query.filter(Message.id.in_(ids)).update({"status": "delivered"}, synchronize_session=False)
+        db.session.commit()
+
+        last_id = ids[-1]
+        socketio.sleep(0)
 
 @socketio.on("join")
 def handle_join(data):
-    user_id = data.get("user_id")
+    """
+    ``{"user_id", "format"?}``. ``format`` picks the encoding of message events
+    for this socket: ``"json"`` (default) or ``"tl"`` (binary chatMessage
+    envelopes, see wire_service). The ack carries the format in effect.
+    """
+    try:
+        if not isinstance(data, dict):
+            raise TypeError("join payload must be an object")
+        user_id = int(data.get("user_id"))  # Presence keys are ints, whatever the client sent
+    except (TypeError, ValueError):
+        emit("error", {"message": "user_id must be an integer"})
+        return
     room = f"user_{user_id}"
     sid = request.sid
+    wire_format = data.get("format") if data.get("format") in WIRE_FORMATS else "json"
 
-    # ✅ Add socket ID to connected_users
-    if user_id not in connected_users:
-        connected_users[user_id] = set()
-    connected_users[user_id].add(sid)
-
-    # ✅ Only mark the user as online the FIRST time
-    if len(connected_users[user_id]) == 1:
-        user = User.query.get(user_id)
-        if user:
-            user.is_online = True
-            user.last_seen = datetime.utcnow()
-            db.session.commit()
-
-            print(f"🔔 User '{user.username}' came ONLINE. Delivering stored messages...")
-
-            pending_messages = Message.query.filter_by(receiver_id=user_id, status="sent").all()
-            for msg in pending_messages:
-                chat_mode = "secret" if msg.auth_key_id == b'secretchat' else "cloud"
-                emit("receive_message", {
-                    "id": msg.id,
-                    "from": msg.sender_id,
-                    "to": msg.receiver_id,
-                    "text": msg.encrypted_data.decode('utf-8') if chat_mode == "secret" else decrypt_message(msg.encrypted_data, msg.msg_key, msg.auth_key_id).get("text"),
-                    "timestamp": msg.timestamp.isoformat(),
-                    "status": "✔",
-                    "chat_mode": chat_mode
-                }, room=room)
-                msg.status = "delivered"
-            db.session.commit()
-
+    # Join first so the stored messages below reach this socket
     join_room(room)
+    join_room(wire_room(user_id, wire_format))
+
+    # ✅ Register the socket; only the user's FIRST socket marks them online (written back in batches)
+    if presence.connect(user_id, sid, wire_format):
+        name = profile_cache.display_name(user_id)
+        if name:
+            print(f"🔔 User '{name}' came ONLINE. Delivering stored messages...")
+            _deliver_pending(user_id)
+
+    return {"format": wire_format}
 
 @socketio.on("disconnect")
 def handle_disconnect():
-    sid = request.sid
-    for user_id, sids in connected_users.items():
-        if sid in sids:
-            sids.remove(sid)
-            if not sids:
-                user = User.query.get(user_id)
-                if user:
-                    user.is_online = False
-                    user.last_seen = datetime.utcnow()
-                    db.session.commit()
-                    print(f"🔌 User '{user.username}' went OFFLINE.")
-            break
+    presence_subscriptions.drop(request.sid)  # Socket.IO leaves its presence_<id> rooms itself
+    user_id, went_offline = presence.disconnect(request.sid)
+    if went_offline:
+        print(f"🔌 User '{profile_cache.display_name(user_id)}' went OFFLINE.")
+
+@socketio.on("subscribe_presence")
+def handle_subscribe_presence(data):
+    """
+    ``{"user_ids": [...]}``: the users this socket shows (replaces any earlier
+    subscription). Answers with a ``presence`` snapshot of the newly watched
+    users; transitions follow as ``presence`` events.
+    """
+    try:
+        user_ids = [int(user_id) for user_id in data.get("user_ids", [])]
+    except (TypeError, ValueError):
+        emit("error", {"message": "user_ids must be integers"})
+        return
+
+    to_join, to_leave = presence_subscriptions.replace(request.sid, user_ids)
+    for user_id in to_leave:
+        leave_room(presence_room(user_id))
+    for user_id in to_join:
+        join_room(presence_room(user_id))
+
+    if to_join:
+        statuses = presence.statuses(to_join)
+        emit("presence", {"users": [
+            presence_entry(user_id, online, seen) for user_id, (online, seen) in statuses.items()
+        ]})
 
 @socketio.on("typing")
 def handle_typing(data):
-    sender = data.get("from")
-    receiver = data.get("to")
+    try:
+        if not isinstance(data, dict):
+            raise TypeError("typing payload must be an object")
+        sender = int(data.get("from"))
+        receiver = int(data.get("to"))
+    except (TypeError, ValueError):
+        return  # Malformed typing events are dropped like throttled ones
     room = f"user_{receiver}"
-    user = User.query.get(sender)
 
-    if user:
+    # Highest-frequency event we get: the in-process throttle drops most of it before the
+    # presence lookup (a Redis round trip with PRESENCE_BACKEND=redis)
+    if not typing_throttle.allow(sender, receiver) or not presence.is_online(receiver):
+        return
+
+    name = profile_cache.display_name(sender)
+    if name:
         emit("typing", {
             "from": sender,
-            "username": user.username or user.email or "Someone"
+            "username": name
         }, room=room)
 
 @socketio.on("connect")
@@ -307,6 +506,7 @@ def delete_message():
     if not message:
         return jsonify({"success": False, "message": "Message not found"})
 
+    media_paths = (message.file_path, message.thumbnail_path)
     if delete_for_all:
         db.session.delete(message)
     else:
@@ -316,6 +516,11 @@ def delete_message():
             message.visible_to_receiver = False
 
     db.session.commit()
+
+    # Drop the stored media object if that was its last reference
+    if delete_for_all:
+        for path in media_paths:
+            release_media(path)
     return jsonify({"success": True})
 
 @chat_bp.route("/delete_chat/<int:user_id>/<int:with_user_id>", methods=["POST"])
@@ -332,4 +537,269 @@ def delete_chat(user_id, with_user_id):
             msg.visible_to_receiver = False
 
     db.session.commit()
-    return jsonify({"success": True})
\ No newline at end of file
+    return jsonify({"success": True})
+
+
+# -------------------------------------
+# 📤 Media Upload (streamed multipart)
+# -------------------------------------
+def _receive_upload():
+    """
+    Parse the multipart body with werkzeug's incremental decoder, pushing the
+    ``file`` part straight into a MediaWriter as it arrives. Nothing larger
+    than one read is buffered, neither in memory nor in a spool file.
+
+    Returns ``(fields, filename, file_path)``; ``file_path`` is None if the
+    request carried no usable file. Extra file parts are read and discarded.
+    """
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        raise BadRequest("Expected a multipart/form-data body")
+
+    # Same limits Flask applies to request.form (the decoder's buffer also holds one read)
+    max_field = request.max_form_memory_size
+    decoder = MultipartDecoder(boundary.encode(), max_form_memory_size=max_field, max_parts=request.max_form_parts)
+    stream = request.stream  # Bounded by MAX_CONTENT_LENGTH (413 past it)
+    read_size = current_app.config["MEDIA_SEGMENT_SIZE"]
+
+    fields, filename, file_path = {}, None, None
+    part, writer, eof = None, None, False
+    try:
+        while True:
+            event = decoder.next_event()
+            if event is NEED_DATA:
+                if eof:
+                    raise BadRequest("Truncated multipart body")
+                chunk = stream.read(read_size)
+                eof = not chunk
+                decoder.receive_data(chunk or None)
+                continue
+            if isinstance(event, Epilogue):
+                break
+
+            if isinstance(event, File):
+                part = None
+                if event.name == "file" and writer is None and file_path is None and allowed_file(event.filename):
+                    filename = secure_filename(event.filename) or "file"
+                    writer = MediaWriter()
+            elif isinstance(event, Field):
+                part = event.name
+                fields[part] = b""
+            elif isinstance(event, Data):
+                if writer is not None:
+                    writer.write(event.data)
+                    if not event.more_data:
+                        file_path, writer = writer.close(), None
+                elif part is not None:
+                    fields[part] += event.data
+                    if max_field is not None and len(fields[part]) > max_field:
+                        raise RequestEntityTooLarge()
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    return {name: value.decode("utf-8", "replace") for name, value in fields.items()}, filename, file_path
+
+@chat_bp.route("/upload", methods=["POST"])
+def upload_media():
+    fields, filename, file_path = _receive_upload()
+    if file_path is None:
+        return jsonify({"error": "No file or unsupported file type"}), 400
+
+    sender, receiver = _upload_parties(fields.get("sender_id"), fields.get("receiver_id"))
+    if not sender or not receiver:
+        release_media(file_path)
+        return jsonify({"error": "User not found"}), 404
+
+    return jsonify(_publish_upload(sender, receiver, filename, file_path)), 201
+
+def _upload_parties(sender_id, receiver_id):
+    try:
+        return db.session.get(User, int(sender_id or 0)), db.session.get(User, int(receiver_id or 0))
+    except (TypeError, ValueError):
+        return None, None
+
+def _publish_upload(sender, receiver, filename, file_path):
+    """Save a stored upload as a message, emit it and queue its processing. Returns the payload."""
+    # Media messages are cloud messages: the server stores (and thumbnails) the object
+    receiver_online = presence.is_online(receiver.id)
+    payload = _save_cloud_message(
+        sender, receiver, filename, receiver_online,
+        file_path=file_path, original_filename=filename,
+    )
+    print(f"\n📎 [Cloud Chat] '{sender.username}' uploaded '{filename}' for '{receiver.username}'")
+
+    if receiver_online:
+        emit_message(dict(payload, status="✔"), receiver.id)
+    emit_message(payload, sender.id)
+
+    # MIME sniffing and thumbnails run in the media workers; media_processed follows
+    media_processor.submit(payload["id"], file_path)
+    return payload
+
+
+# -------------------------------------
+# 🧩 Resumable Upload Sessions
+# -------------------------------------
+@chat_bp.errorhandler(UploadSessionError)
+def _upload_session_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+@chat_bp.route("/uploads", methods=["POST"])
+def open_upload():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get("filename") or "")
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "Unsupported file type"}), 400
+
+    sender, receiver = _upload_parties(data.get("sender_id"), data.get("receiver_id"))
+    if not sender or not receiver:
+        return jsonify({"error": "User not found"}), 404
+
+    try:
+        size, part_size = int(data.get("size") or 0), int(data.get("part_size") or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({"error": "size and part_size must be integers"}), 400
+
+    session = upload_sessions.open(sender.id, receiver.id, filename[:128], size, part_size)
+    return jsonify(session), 201
+
+@chat_bp.route("/uploads/<upload_id>", methods=["GET"])
+def describe_upload(upload_id):
+    return jsonify(upload_sessions.describe(upload_id))
+
+@chat_bp.route("/uploads/<upload_id>/parts/<int:part>", methods=["PUT"])
+def save_upload_part(upload_id, part):
+    # The raw body is the part; it is encrypted into place while it is read
+    if request.content_length is None:
+        return jsonify({"error": "Content-Length is required"}), 411
+    upload_sessions.save_part(upload_id, part, request.stream, request.content_length)
+    return "", 204
+
+@chat_bp.route("/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    meta, data_path = upload_sessions.finalize(upload_id)
+
+    sender, receiver = _upload_parties(meta["sender_id"], meta["receiver_id"])
+    if not sender or not receiver:
+        upload_sessions.finish(upload_id)
+        return jsonify({"error": "User not found"}), 404
+
+    # Sealing decrypts and hashes the whole file (up to UPLOAD_MAX_BYTES), so it runs in the media
+    # workers; the message (receive_message, then upload_finalized) goes out once it is stored
+    media_processor.seal(
+        data_path,
+        lambda file_path: _publish_sealed_upload(meta, file_path),
+        lambda e: _seal_failed(meta, e),
+    )
+    return jsonify(dict(meta, received=list(range(meta["parts"])), sealing=True)), 202
+
+def _publish_sealed_upload(meta, file_path):
+    upload_sessions.finish(meta["upload_id"])
+    sender, receiver = _upload_parties(meta["sender_id"], meta["receiver_id"])
+    if not sender or not receiver:  # Deleted while the upload was sealing
+        release_media(file_path)
+        return
+
+    payload = _publish_upload(sender, receiver, meta["filename"], file_path)
+    socketio.emit("upload_finalized", {"upload_id": meta["upload_id"], "message": payload},
+                  room=f"user_{sender.id}")
+
+def _seal_failed(meta, e):
+    logger.error(f"[UPLOAD] Sealing {meta['upload_id']} failed: {e}")
+    upload_sessions.reopen(meta["upload_id"])  # Every part is still there; finalize can be retried
+    socketio.emit("upload_failed", {"upload_id": meta["upload_id"], "error": "Could not store the upload"},
+                  room=f"user_{meta['sender_id']}")
+
+@chat_bp.route("/uploads/<upload_id>", methods=["DELETE"])
+def cancel_upload(upload_id):
+    upload_sessions.discard(upload_id)
+    return "", 204
+
+
+# -------------------------------------
+# 📥 Media Download (streamed, Range-capable)
+# -------------------------------------
+@chat_bp.route("/media/<int:message_id>", methods=["GET"])
+def download_media(message_id):
+    viewer_id = request.args.get("user_id", type=int) or session.get("user_id")
+    message = db.session.get(Message, message_id)
+    if not message or not message.file_path:
+        return jsonify({"error": "Media not found"}), 404
+    if viewer_id not in _media_viewers(message):
+        return jsonify({"error": "Not a participant of this conversation"}), 403
+    if not os.path.exists(message.file_path):
+        return jsonify({"error": "Media not found"}), 404
+
+    with open(message.file_path, "rb") as f:
+        header = read_media_header(f)
+    etag = media_etag(header)
+
+    headers = {
+        "ETag": f'"{etag}"',
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0",
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    mimetype = mimetypes.guess_type(message.original_filename or message.file_path)[0] or "application/octet-stream"
+    if message.original_filename:
+        headers["Content-Disposition"] = f'inline; filename="{secure_filename(message.original_filename)}"'
+
+    # A Range only applies while the client's copy is current (If-Range). Multi-range requests are
+    # answered with the full body (RFC 9110 lets a server ignore Range), never with a 416
+    start, stop, status = 0, header.length, 200
+    single_range = request.range and request.range.units == "bytes" and len(request.range.ranges) == 1
+    if single_range and ("If-Range" not in request.headers or request.if_range.etag == etag):
+        span = request.range.range_for_length(header.length)
+        if span is None:
+            headers["Content-Range"] = f"bytes */{header.length}"
+            return Response(status=416, headers=headers)
+        start, stop, status = span[0], span[1], 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{header.length}"
+    headers["Content-Length"] = str(stop - start)
+
+    uploader = db.session.get(User, message.sender_id)
+    body = iter_decrypted_range(message.file_path, uploader, start, stop)
+    return Response(stream_with_context(body), status=status, mimetype=mimetype,
+                    headers=headers, direct_passthrough=True)
+
+
+@chat_bp.route("/media/<int:message_id>/thumbnail", methods=["GET"])
+def download_thumbnail(message_id):
+    viewer_id = request.args.get("user_id", type=int) or session.get("user_id")
+    size = request.args.get("size", "bubble")
+    if size not in current_app.config["THUMBNAIL_SIZES"]:
+        return jsonify({"error": "Unknown thumbnail size"}), 404
+    message = db.session.get(Message, message_id)
+    if not message or not message.thumbnail_path:
+        return jsonify({"error": "Thumbnail not found"}), 404
+    if viewer_id not in _media_viewers(message):
+        return jsonify({"error": "Not a participant of this conversation"}), 403
+
+    # Bundles are content-addressed, so the path itself is a strong validator
+    etag = f"{os.path.basename(message.thumbnail_path)[:32]}-{size}"
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, max-age=86400"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    jpeg = thumbnail_cache.get(message.thumbnail_path, size)
+    if jpeg is None:
+        return jsonify({"error": "Thumbnail not found"}), 404
+    return Response(jpeg, mimetype="image/jpeg", headers=headers)
+
+
+@chat_bp.route("/media/stats", methods=["GET"])
+def media_stats():
+    return jsonify(media_store_stats())
+
+
+def _media_viewers(message):
+    viewers = set()
+    if message.visible_to_sender:
+        viewers.add(message.sender_id)
+    if message.visible_to_receiver:
+        viewers.add(message.receiver_id)
+    return viewers
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, Response, current_app, render_template, request, jsonify
 from datetime import datetime
 
 general_bp = Blueprint("general", __name__)
@@ -26,33 +26,56 @@ def chat_page():
 # 👇 MOVE THIS IMPORT INSIDE THE FUNCTION
 @general_bp.route("/users")
 def list_users():
-    from app.models.user import User  # <--- move it here to avoid circular import
-    users = User.query.all()
-    user_list = [{"id": u.id, "username": u.username or u.email or u.phone} for u in users]
-    return jsonify(user_list)
+    """
+    One page of the user directory, ordered by id. ``after_id`` (from the
+    ``X-Next-After-Id`` header) continues, ``q`` keeps names starting with it.
+    Each page is one keyset query; the weak ETag comes from an aggregate over
+    ``users`` (count, max id, latest profile change), so it is the same on every
+    worker and unchanged pages revalidate with a 304.
+    """
+    from app.services.profile_service import profile_cache  # <--- imported here to avoid circular import
+
+    etag = profile_cache.directory_etag()
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers={"ETag": f'W/"{etag}"'})
+
+    limit = request.args.get("limit", current_app.config["USERS_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, current_app.config["USERS_PAGE_MAX"]))
+    page = profile_cache.directory_page(
+        after_id=request.args.get("after_id", type=int),
+        limit=limit,
+        prefix=request.args.get("q", "").strip(),
+    )
+
+    response = jsonify([profile.to_dict() for profile in page])
+    response.headers["ETag"] = f'W/"{etag}"'
+    response.headers["Cache-Control"] = "no-cache"  # Always revalidate; the 304 is cheap
+    if len(page) == limit:
+        response.headers["X-Next-After-Id"] = str(page[-1].id)
+    return response
 
 @general_bp.route("/status/<int:user_id>")
 def get_user_status(user_id):
-    from app.models.user import User
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"status": "unknown"})
+    from app.services.presence_service import presence
 
-    if user.is_online:
-        return jsonify({"status": "online"})
-    
-    # Show "last seen"
-    delta = datetime.utcnow() - user.last_seen
-    minutes = int(delta.total_seconds() // 60)
-    last_seen = f"{minutes} min ago" if minutes > 0 else "just now"
+    # Fallback for clients without a presence subscription. Online comes from the registry; "last seen"
+    # from this process's transitions or a short-lived cache of users.last_seen
+    status = presence.statuses([user_id]).get(user_id)
+    if status is None:
+        response = jsonify({"status": "unknown"})
+    elif status[0]:
+        response = jsonify({"status": "online"})
+    else:
+        # Show "last seen"
+        delta = datetime.utcnow() - (status[1] or datetime.utcnow())
+        minutes = int(delta.total_seconds() // 60)
+        last_seen = f"{minutes} min ago" if minutes > 0 else "just now"
+        response = jsonify({"status": f"last seen {last_seen}"})
 
-    return jsonify({"status": f"last seen {last_seen}"})
+    response.headers["Cache-Control"] = f"private, max-age={current_app.config['PRESENCE_STATUS_MAX_AGE']}"
+    return response
 
 @general_bp.route("/user_info/<int:user_id>")
 def user_info(user_id):
-    from app.models.user import User
-    user = User.query.get(user_id)
-    if user:
-        return jsonify({"username": user.username or user.email or user.phone})
-    else:
-        return jsonify({"username": None})
\ No newline at end of file
+    from app.services.profile_service import profile_cache
+    return jsonify({"username": profile_cache.display_name(user_id)})
\ No newline at end of file
@@ -1,6 +1,10 @@
 import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
 from Crypto.Util.number import getPrime, inverse, bytes_to_long, long_to_bytes
 from hashlib import sha256, sha1
+from app.services.profile_service import profile_cache
 
 # DH Parameters from Telegram Spec (2048-bit MODP group)
 DH_PRIME = int(
@@ -30,4 +34,130 @@ def compute_auth_key(client_public, server_private):
     shared_secret = pow(client_public, server_private, DH_PRIME)
     auth_key = sha256(long_to_bytes(shared_secret)).digest()
     auth_key_id = sha1(auth_key).digest()[-8:]  # 64-bit key ID
-    return auth_key, auth_key_id
\ No newline at end of file
+    return auth_key, auth_key_id
+
+# --------------------------------------
+# 🗂️ auth_key_id → auth_key Cache
+# --------------------------------------
+AuthKeyEntry = namedtuple("AuthKeyEntry", ["auth_key", "user_id", "display_name"])
+
+
+class AuthKeyCache:
+    """
+    Bounded LRU/TTL cache in front of ``users.auth_key_id`` lookups. Display
+    names loaded along the way are handed to the shared profile cache.
+
+    Entries are dropped by ``invalidate`` whenever ``User.set_auth_key`` rotates a
+    key; the TTL bounds staleness across worker processes.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._keys = OrderedDict()   # auth_key_id -> (AuthKeyEntry, expires_at)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get("AUTH_KEY_CACHE_SIZE", self.max_entries)
+        self.ttl = app.config.get("AUTH_KEY_CACHE_TTL", self.ttl)
+
+    # -------------------------
+    # 🔎 Lookups
+    # -------------------------
+    def get(self, auth_key_id):
+        """Return the AuthKeyEntry for ``auth_key_id`` or None if no user holds that key."""
+        entry = self._lookup(self._keys, auth_key_id)
+        if entry is not None:
+            return entry
+
+        from app import db
+        from app.models.user import User
+
+        row = db.session.query(
+            User.id, User.auth_key, User.username, User.email, User.phone
+        ).filter_by(auth_key_id=auth_key_id).first()
+        if not row or not row.auth_key:
+            return None
+
+        entry = AuthKeyEntry(row.auth_key, row.id, row.username or row.email or row.phone)
+        self._store(self._keys, auth_key_id, entry)
+        profile_cache.prime(row.id, entry.display_name)
+        return entry
+
+    def get_many(self, auth_key_ids):
+        """Resolve several auth_key_ids with at most one query. Returns {auth_key_id: AuthKeyEntry}."""
+        found, missing = {}, []
+        for auth_key_id in set(auth_key_ids):
+            entry = self._lookup(self._keys, auth_key_id)
+            if entry is not None:
+                found[auth_key_id] = entry
+            else:
+                missing.append(auth_key_id)
+
+        if missing:
+            from app import db
+            from app.models.user import User
+
+            rows = db.session.query(
+                User.id, User.auth_key, User.auth_key_id, User.username, User.email, User.phone
+            ).filter(User.auth_key_id.in_(missing)).all()
+
+            for row in rows:
+                if not row.auth_key:
+                    continue
+                entry = AuthKeyEntry(row.auth_key, row.id, row.username or row.email or row.phone)
+                self._store(self._keys, row.auth_key_id, entry)
+                profile_cache.prime(row.id, entry.display_name)
+                found[row.auth_key_id] = entry
+
+        return found
+
+    def _lookup(self, table, key):
+        with self._lock:
+            cached = table.get(key)
+            if cached is not None:
+                value, expires_at = cached
+                if expires_at > time.monotonic():
+                    table.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del table[key]
+            self.misses += 1
+            return None
+
+    def _store(self, table, key, value):
+        with self._lock:
+            table[key] = (value, time.monotonic() + self.ttl)
+            table.move_to_end(key)
+            while len(table) > self.max_entries:
+                table.popitem(last=False)
+
+    # -------------------------
+    # ♻️ Invalidation & Stats
+    # -------------------------
+    def invalidate(self, auth_key_id=None, user_id=None):
+        with self._lock:
+            if auth_key_id is not None:
+                self._keys.pop(auth_key_id, None)
+            if user_id is not None:
+                for key in [k for k, (entry, _) in self._keys.items() if entry.user_id == user_id]:
+                    del self._keys[key]
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "keys": len(self._keys),
+        }
+
+
+auth_key_cache = AuthKeyCache()
@@ -1,59 +1,94 @@
 import os
 import json
 import time
+from datetime import datetime
 from hashlib import sha256
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 from Crypto.Random import get_random_bytes
+from Crypto.Util.strxor import strxor
 import logging
-import base64
-from datetime import datetime, timedelta
+from app.services.logging_service import user_loggers, hexdump, b64dump, jsondump, deferred
+from app.services.auth_key_service import auth_key_cache
+from app.services.profile_service import profile_cache
+
+def get_user_logger(username):
+    return user_loggers.get_logger(username)
+
+# --------------------------------------
+# 🧱 AES-256-IGE Engine (MTProto 2.0)
+# --------------------------------------
+# IGE: y_i = E(x_i ^ y_{i-1}) ^ x_{i-1}, with iv = y_{-1} || x_{-1} (32 bytes).
+#
+# Writing z_i = E(x_i ^ y_{i-1}) gives y_i = z_i ^ x_{i-1} and
+# z_i = E((x_i ^ x_{i-2}) ^ z_{i-1}): plain CBC (zero IV) over a pre-XORed
+# buffer. Encryption is therefore two whole-buffer XORs around one CBC pass,
+# all in C. Decryption has the same shape with D() and no CBC equivalent, so
+# it steps block by block.
+
+IGE_BLOCK = 16
+_ZERO_BLOCK = bytes(IGE_BLOCK)
+
+
+def _ige_check(data, iv):
+    if len(data) % IGE_BLOCK:
+        raise ValueError("IGE data must be a multiple of 16 bytes")
+    if len(iv) != 2 * IGE_BLOCK:
+        raise ValueError("IGE needs a 32-byte IV")
+
+
+def _ige_prewhiten(data, first_prev, second_prev):
+    # Block i of the result is data_i ^ data_{i-2}, seeded with the two IV halves
+    return strxor(data, (first_prev + second_prev + data[:-2 * IGE_BLOCK])[:len(data)])
+
+
+def ige256_encrypt(data, key, iv):
+    """Raw AES-IGE encryption (no padding). ``len(data)`` must be a multiple of 16."""
+    _ige_check(data, iv)
+    if not data:
+        return b""
+    y_prev, x_prev = iv[:IGE_BLOCK], iv[IGE_BLOCK:]
+    whitened = _ige_prewhiten(data, y_prev, x_prev)
+    chained = AES.new(key, AES.MODE_CBC, _ZERO_BLOCK).encrypt(whitened)
+    return strxor(chained, x_prev + data[:-IGE_BLOCK])
+
+
+def ige256_decrypt(data, key, iv):
+    """Raw AES-IGE decryption (no unpadding). ``len(data)`` must be a multiple of 16."""
+    _ige_check(data, iv)
+    if not data:
+        return b""
+    y_prev, x_prev = iv[:IGE_BLOCK], iv[IGE_BLOCK:]
+    whitened = _ige_prewhiten(data, x_prev, y_prev)
+    decrypt_block = AES.new(key, AES.MODE_ECB).decrypt
+
+    chained = bytearray(len(data))
+    prev = 0
+    for i in range(0, len(data), IGE_BLOCK):
+        block = decrypt_block((int.from_bytes(whitened[i:i + IGE_BLOCK], "big") ^ prev).to_bytes(IGE_BLOCK, "big"))
+        chained[i:i + IGE_BLOCK] = block
+        prev = int.from_bytes(block, "big")
+
+    return strxor(bytes(chained), y_prev + data[:-IGE_BLOCK])
 
-def get_user_logger(username, retention_days=7):
-    logs_dir = os.path.join(os.getcwd(), "logs")
-    os.makedirs(logs_dir, exist_ok=True)
-
-    # Auto-delete old log files
-    now = time.time()
-    for filename in os.listdir(logs_dir):
-        file_path = os.path.join(logs_dir, filename)
-        if filename.endswith(".log") and os.path.isfile(file_path):
-            file_mtime = os.path.getmtime(file_path)
-            if now - file_mtime > retention_days * 86400:
-                os.remove(file_path)
-
-    log_file = os.path.join(logs_dir, f"{username}.log")
-    logger_name = f"MTProtoLogger_{username}"
-    logger = logging.getLogger(logger_name)
-
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
-    logger.setLevel(logging.DEBUG)
-    logger.propagate = False
-
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-
-    return logger
 
 def aes_ige_encrypt(plaintext, key, iv, logger):
     logger.info("Encrypting with AES-IGE...")
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    encrypted = cipher.encrypt(pad(plaintext, AES.block_size))
-    logger.debug(f"Encrypted data: {encrypted.hex()}")
+    encrypted = ige256_encrypt(pad(plaintext, AES.block_size), key, iv)
+    logger.debug("Encrypted data: %s", hexdump(encrypted))
     return encrypted
 
 def aes_ige_decrypt(ciphertext, key, iv, logger):
     logger.info("Decrypting with AES-IGE...")
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    decrypted = unpad(cipher.decrypt(ciphertext), AES.block_size)
-    logger.debug(f"Decrypted data: {decrypted.hex()}")
+    decrypted = unpad(ige256_decrypt(ciphertext, key, iv), AES.block_size)
+    logger.debug("Decrypted data: %s", hexdump(decrypted))
     return decrypted
 
+def aes_cbc_legacy_decrypt(ciphertext, key, iv, logger):
+    # Messages stored before the IGE engine landed were encrypted with AES-CBC and iv[:16]
+    logger.info("Decrypting with legacy AES-CBC...")
+    return unpad(AES.new(key, AES.MODE_CBC, iv[:IGE_BLOCK]).decrypt(ciphertext), AES.block_size)
+
 def derive_aes_key_iv(auth_key, msg_key, logger):
     logger.info("Deriving AES key and IV using msg_key + auth_key...")
     sha_a = sha256(msg_key + auth_key[0:36]).digest()
@@ -61,15 +96,15 @@ def derive_aes_key_iv(auth_key, msg_key, logger):
 
     aes_key = sha_a[0:8] + sha_b[8:24] + sha_a[24:32]
     aes_iv = sha_b[0:8] + sha_a[8:24] + sha_b[24:32]
-    logger.debug(f"AES Key               : {aes_key.hex()}")
-    logger.debug(f"AES IV                : {aes_iv.hex()}")
-    return aes_key[:32], aes_iv[:16]
+    logger.debug("AES Key               : %s", hexdump(aes_key))
+    logger.debug("AES IV                : %s", hexdump(aes_iv))
+    return aes_key, aes_iv
 
 def generate_auth_key(logger):
     logger.info("🔑 Simulated DH Key Exchange - Generated auth_key")
     auth_key = get_random_bytes(256)
-    logger.debug(f"auth_key (hex)       : {auth_key.hex()}")
-    logger.debug(f"auth_key_id (SHA256) : {sha256(auth_key).hexdigest()}")
+    logger.debug("auth_key (hex)       : %s", hexdump(auth_key))
+    logger.debug("auth_key_id (SHA256) : %s", deferred(lambda: sha256(auth_key).hexdigest()))
     return auth_key
 
 def encrypt_message(sender_user, recipient_user, plaintext_str):
@@ -78,11 +113,12 @@ def encrypt_message(sender_user, recipient_user, plaintext_str):
     logger = get_user_logger(sender)
 
     logger.info("===== MTProto ENCRYPTION FLOW START =====")
-    logger.info(f"📤 User '{sender}' is sending a message to '{recipient}'")
+    logger.info("📤 User '%s' is sending a message to '%s'", sender, recipient)
 
     if not sender_user.auth_key:
         sender_user.auth_key = generate_auth_key(logger)
         sender_user.auth_key_id = sha256(sender_user.auth_key).hexdigest()
+        auth_key_cache.invalidate(auth_key_id=sender_user.auth_key_id)
 
     salt_bytes = get_random_bytes(8)
     session_id_bytes = get_random_bytes(8)
@@ -99,12 +135,12 @@ def encrypt_message(sender_user, recipient_user, plaintext_str):
     }
     payload = json.dumps(payload_dict).encode()
 
-    logger.info(f"Message Content       : \"{plaintext_str}\"")
-    logger.info(f"Sender ID             : {sender_user.id}")
-    logger.info(f"Recipient ID          : {recipient_user.id}")
-    logger.info(f"Timestamp             : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    logger.info(f"Msg ID                : {msg_id}")
-    logger.info(f"Seq No                : {seq_no}")
+    logger.info("Message Content       : \"%s\"", plaintext_str)
+    logger.info("Sender ID             : %s", sender_user.id)
+    logger.info("Recipient ID          : %s", recipient_user.id)
+    logger.info("Timestamp             : %s", deferred(datetime.now().strftime, "%Y-%m-%d %H:%M:%S"))
+    logger.info("Msg ID                : %s", msg_id)
+    logger.info("Seq No                : %s", seq_no)
 
     to_encrypt = salt_bytes + session_id_bytes + payload
     temp_data = sender_user.auth_key[:32] + to_encrypt
@@ -114,12 +150,12 @@ def encrypt_message(sender_user, recipient_user, plaintext_str):
     aes_key, aes_iv = derive_aes_key_iv(sender_user.auth_key, msg_key, logger)
     encrypted_data = aes_ige_encrypt(to_encrypt, aes_key, aes_iv, logger)
 
-    logger.debug(f"Auth Key ID           : {sender_user.auth_key_id}")
-    logger.debug(f"msg_key               : {msg_key.hex()}")
-    logger.debug(f"Salt (hex)            : {salt_bytes.hex()}")
-    logger.debug(f"Session ID (hex)      : {session_id_bytes.hex()}")
-    logger.debug(f"Encrypted Payload     : {encrypted_data.hex()} ({len(encrypted_data)} bytes)")
-    logger.debug("Encrypted (base64)    : " + base64.b64encode(encrypted_data).decode())
+    logger.debug("Auth Key ID           : %s", sender_user.auth_key_id)
+    logger.debug("msg_key               : %s", hexdump(msg_key))
+    logger.debug("Salt (hex)            : %s", hexdump(salt_bytes))
+    logger.debug("Session ID (hex)      : %s", hexdump(session_id_bytes))
+    logger.debug("Encrypted Payload     : %s (%d bytes)", hexdump(encrypted_data), len(encrypted_data))
+    logger.debug("Encrypted (base64)    : %s", b64dump(encrypted_data))
     logger.info("===== MTProto ENCRYPTION FLOW END =====\n")
 
     return (
@@ -133,53 +169,52 @@ def encrypt_message(sender_user, recipient_user, plaintext_str):
     )
 
 def decrypt_message(encrypted_blob, msg_key_hex, auth_key_id):
-    from app.models.user import User
-    from app import db
-
-    user = User.query.filter_by(auth_key_id=auth_key_id).first()
-    if not user or not user.auth_key:
+    key_entry = auth_key_cache.get(auth_key_id)
+    if not key_entry:
         return {"error": "Auth key not found"}
 
     msg_key = bytes.fromhex(msg_key_hex)
     temp_logger = get_user_logger("temp_debug")
-    aes_key, aes_iv = derive_aes_key_iv(user.auth_key, msg_key, temp_logger)
+    aes_key, aes_iv = derive_aes_key_iv(key_entry.auth_key, msg_key, temp_logger)
 
     try:
-        decrypted = aes_ige_decrypt(encrypted_blob, aes_key, aes_iv, temp_logger)
+        try:
+            decrypted = aes_ige_decrypt(encrypted_blob, aes_key, aes_iv, temp_logger)
+            payload_json = json.loads(decrypted[16:].decode())
+        except ValueError:
+            decrypted = aes_cbc_legacy_decrypt(encrypted_blob, aes_key, aes_iv, temp_logger)
+            payload_json = json.loads(decrypted[16:].decode())
+
         salt = decrypted[0:8]
         session_id = decrypted[8:16]
-        payload = decrypted[16:]
-
-        payload_json = json.loads(payload.decode())
         recipient_id = payload_json.get("recipient_id")
-        recipient = User.query.get(recipient_id)
+        recipient_name = profile_cache.display_name(recipient_id)
 
-        if recipient:
-            recipient_name = recipient.username or recipient.email or recipient.phone
+        if recipient_name:
             logger = get_user_logger(recipient_name)
         else:
+            recipient_name = f"ID:{recipient_id}"
             logger = temp_logger
 
         logger.info("===== MTProto DECRYPTION FLOW START =====")
-        logger.info(f"📥 User '{recipient_name}' is receiving a message...")
-        logger.debug(f"Encrypted Blob Length : {len(encrypted_blob)} bytes")
-        logger.debug(f"Encrypted Blob (hex)  : {encrypted_blob.hex()}")
+        logger.info("📥 User '%s' is receiving a message...", recipient_name)
+        logger.debug("Encrypted Blob Length : %d bytes", len(encrypted_blob))
+        logger.debug("Encrypted Blob (hex)  : %s", hexdump(encrypted_blob))
 
         logger.info("Deriving AES key and IV...")
-        logger.debug(f"msg_key               : {msg_key.hex()}")
-        logger.debug(f"AES Key               : {aes_key.hex()}")
-        logger.debug(f"AES IV                : {aes_iv.hex()}")
+        logger.debug("msg_key               : %s", hexdump(msg_key))
+        logger.debug("AES Key               : %s", hexdump(aes_key))
+        logger.debug("AES IV                : %s", hexdump(aes_iv))
 
         logger.info("Decrypting with AES-IGE...")
-        logger.debug(f"Decrypted Data (hex)  : {decrypted.hex()}")
-        logger.debug(f"Salt (hex)            : {salt.hex()}")
-        logger.debug(f"Session ID (hex)      : {session_id.hex()}")
-        logger.debug("Payload JSON          :\n" + json.dumps(payload_json, indent=4))
+        logger.debug("Decrypted Data (hex)  : %s", hexdump(decrypted))
+        logger.debug("Salt (hex)            : %s", hexdump(salt))
+        logger.debug("Session ID (hex)      : %s", hexdump(session_id))
+        logger.debug("Payload JSON          :\n%s", jsondump(payload_json))
 
         sender_id = payload_json.get("sender_id")
-        sender = User.query.get(sender_id)
-        sender_str = sender.username if sender else f"ID:{sender_id}"
-        logger.info(f"📬 Message received from '{sender_str}'")
+        sender_str = profile_cache.display_name(sender_id) or f"ID:{sender_id}"
+        logger.info("📬 Message received from '%s'", sender_str)
         logger.info("===== MTProto DECRYPTION FLOW END =====\n")
 
         return payload_json
@@ -187,4 +222,45 @@ def decrypt_message(encrypted_blob, msg_key_hex, auth_key_id):
     except Exception as e:
         temp_logger.error("❌ Padding error: likely wrong AES key/IV or corrupted ciphertext.")
         temp_logger.error("[DECRYPTION ERROR]", exc_info=True)
-        return {"error": "Decryption failed"}
\ No newline at end of file
+        return {"error": "Decryption failed"}
+
+
+def decrypt_messages(items):
+    """
+    Decrypt many stored ``(encrypted_blob, msg_key_hex, auth_key_id)`` messages (offline delivery).
+    Auth keys are resolved with a single lookup; returns payload dicts (or error dicts) in input order.
+    """
+    items = list(items)
+    key_entries = auth_key_cache.get_many(auth_key_id for _, _, auth_key_id in items)
+    temp_logger = get_user_logger("temp_debug")
+
+    results = []
+    for index, (encrypted_blob, msg_key_hex, auth_key_id) in enumerate(items):
+        key_entry = key_entries.get(auth_key_id)
+        if not key_entry:
+            results.append({"error": "Auth key not found"})
+            continue
+
+        aes_key, aes_iv = derive_aes_key_iv(key_entry.auth_key, bytes.fromhex(msg_key_hex), temp_logger)
+        try:
+            try:
+                decrypted = unpad(ige256_decrypt(encrypted_blob, aes_key, aes_iv), AES.block_size)
+                payload_json = json.loads(decrypted[16:].decode())
+            except ValueError:
+                decrypted = aes_cbc_legacy_decrypt(encrypted_blob, aes_key, aes_iv, temp_logger)
+                payload_json = json.loads(decrypted[16:].decode())
+        except Exception:
+            temp_logger.error("[DECRYPTION ERROR] Stored message %d", index, exc_info=True)
+            results.append({"error": "Decryption failed"})
+            continue
+
+        recipient_name = profile_cache.display_name(payload_json.get("recipient_id"))
+        logger = get_user_logger(recipient_name) if recipient_name else temp_logger
+        sender_id = payload_json.get("sender_id")
+        logger.info("📬 Message %s received from '%s' (offline delivery, %d bytes)",
+                    payload_json.get("msg_id"), profile_cache.display_name(sender_id) or f"ID:{sender_id}",
+                    len(encrypted_blob))
+        logger.debug("Payload JSON          :\n%s", jsondump(payload_json))
+        results.append(payload_json)
+
+    return results
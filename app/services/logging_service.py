@@ -0,0 +1,288 @@
+# app/services/logging_service.py
+
+import os
+import json
+import time
+import queue
+import atexit
+import base64
+import logging
+import threading
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOGGER_PREFIX = "MTProtoLogger_"
+
+
+# -------------------------------------
+# 🧾 Lazy Trace Arguments
+# -------------------------------------
+class _HexDump:
+    """Renders ``data.hex()`` only when the record is formatted, capped at ``limit`` bytes."""
+    __slots__ = ("data", "limit")
+
+    def __init__(self, data, limit):
+        self.data = data
+        self.limit = limit
+
+    def __str__(self):
+        if self.limit is None or len(self.data) <= self.limit:
+            return self.data.hex()
+        return f"{self.data[:self.limit].hex()}... (+{len(self.data) - self.limit} bytes)"
+
+
+class _Base64Dump(_HexDump):
+    __slots__ = ()
+
+    def __str__(self):
+        if self.limit is None or len(self.data) <= self.limit:
+            return base64.b64encode(self.data).decode()
+        return f"{base64.b64encode(self.data[:self.limit]).decode()}... (+{len(self.data) - self.limit} bytes)"
+
+
+class _JsonDump:
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return json.dumps(self.obj, indent=4)
+
+
+class _Deferred:
+    """Calls ``func(*args)`` only when the record is formatted."""
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+def hexdump(data):
+    return _HexDump(data, user_loggers.hex_limit)
+
+
+def b64dump(data):
+    return _Base64Dump(data, user_loggers.hex_limit)
+
+
+def jsondump(obj):
+    return _JsonDump(obj)
+
+
+def deferred(func, *args):
+    return _Deferred(func, args)
+
+
+# -------------------------------------
+# 📬 Queue Plumbing
+# -------------------------------------
+class _LazyQueueHandler(QueueHandler):
+    """
+    The stock QueueHandler formats the message on the calling thread. This one
+    enqueues the record untouched so msg % args (and the hex dumps above) are
+    only rendered by the listener thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _UserFileRouter(logging.Handler):
+    """Listener-side handler that writes each record to its user's log file."""
+
+    def __init__(self, registry):
+        super().__init__()
+        self.registry = registry
+
+    def handle(self, record):
+        self.registry.write(record)
+        return True
+
+
+# -------------------------------------
+# 📒 Per-User Logger Registry
+# -------------------------------------
+class UserLoggerRegistry:
+    """
+    Hands out one ``MTProtoLogger_<username>`` logger per user. Loggers only
+    enqueue records; a single QueueListener thread formats them and writes to
+    ``logs/<username>.log``, keeping at most ``max_handlers`` files open (LRU).
+
+    Retention cleanup runs in a periodic background sweep instead of on every
+    lookup, so fetching a warm logger costs a dict lookup and no syscalls.
+    """
+
+    def __init__(self, logs_dir=None, max_handlers=128, retention_days=7, sweep_interval=3600,
+                 trace_enabled=True, trace_level=logging.DEBUG, hex_limit=64):
+        self.logs_dir = logs_dir or os.path.join(os.getcwd(), "logs")
+        self.max_handlers = max_handlers
+        self.retention_days = retention_days
+        self.sweep_interval = sweep_interval
+        self.trace_enabled = trace_enabled
+        self.trace_level = trace_level
+        self.hex_limit = hex_limit
+
+        self._loggers = {}              # username -> logging.Logger
+        self._handlers = OrderedDict()  # username -> FileHandler, LRU order
+        self._lock = threading.Lock()
+
+        self._queue = queue.SimpleQueue()
+        self._queue_handler = _LazyQueueHandler(self._queue)
+        self._listener = None
+
+        self._stop = threading.Event()
+        self._sweeper = None
+
+    def init_app(self, app):
+        self.logs_dir = app.config.get("LOGS_FOLDER", self.logs_dir)
+        self.max_handlers = app.config.get("LOG_MAX_OPEN_HANDLERS", self.max_handlers)
+        self.retention_days = app.config.get("LOG_RETENTION_DAYS", self.retention_days)
+        self.sweep_interval = app.config.get("LOG_SWEEP_INTERVAL", self.sweep_interval)
+        self.hex_limit = app.config.get("CRYPTO_TRACE_HEX_LIMIT", self.hex_limit)
+        self.trace_level = logging.getLevelName(app.config.get("CRYPTO_TRACE_LEVEL", "DEBUG"))
+        self.trace_enabled = app.config.get("CRYPTO_TRACE_ENABLED", self.trace_enabled)
+
+        for logger in self._loggers.values():
+            self._configure(logger)
+
+        os.makedirs(self.logs_dir, exist_ok=True)
+        if self.trace_enabled:
+            self.start_listener()
+        self.start_sweeper()
+
+    # -------------------------
+    # 🔎 Lookup (request thread)
+    # -------------------------
+    def get_logger(self, username):
+        logger = self._loggers.get(username)
+        if logger is not None:
+            return logger
+
+        with self._lock:
+            logger = self._loggers.get(username)
+            if logger is None:
+                logger = logging.getLogger(f"{LOGGER_PREFIX}{username}")
+                self._configure(logger)
+                self._loggers[username] = logger
+
+        if self.trace_enabled:
+            self.start_listener()
+        return logger
+
+    def _configure(self, logger):
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.propagate = False
+
+        if self.trace_enabled:
+            logger.disabled = False
+            logger.setLevel(self.trace_level)
+            logger.addHandler(self._queue_handler)
+        else:
+            logger.disabled = True
+            logger.setLevel(logging.CRITICAL + 1)
+
+    # -------------------------
+    # ✍️ File Output (listener thread)
+    # -------------------------
+    def write(self, record):
+        username = record.name[len(LOGGER_PREFIX):] if record.name.startswith(LOGGER_PREFIX) else record.name
+        with self._lock:
+            handler = self._handlers.get(username)
+            if handler is None:
+                handler = self._open(username)
+                self._handlers[username] = handler
+                while len(self._handlers) > self.max_handlers:
+                    _, evicted = self._handlers.popitem(last=False)
+                    evicted.close()
+            else:
+                self._handlers.move_to_end(username)
+            handler.handle(record)
+
+    def _open(self, username):
+        os.makedirs(self.logs_dir, exist_ok=True)
+        file_handler = logging.FileHandler(os.path.join(self.logs_dir, f"{username}.log"))
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        return file_handler
+
+    def start_listener(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = QueueListener(self._queue, _UserFileRouter(self))
+                self._listener.start()
+                atexit.register(self.stop_listener)
+
+    def stop_listener(self):
+        """Drain the queue and stop the writer thread."""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+    def close_all(self):
+        self.stop_listener()
+        with self._lock:
+            while self._handlers:
+                _, handler = self._handlers.popitem(last=False)
+                handler.close()
+
+    # -------------------------
+    # 🧹 Retention Sweep
+    # -------------------------
+    def sweep(self):
+        """Delete ``*.log`` files older than ``retention_days``. Returns the number removed."""
+        if not os.path.isdir(self.logs_dir):
+            return 0
+
+        cutoff = time.time() - self.retention_days * 86400
+        removed = 0
+
+        with os.scandir(self.logs_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".log") or not entry.is_file():
+                    continue
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+
+                username = entry.name[:-len(".log")]
+                with self._lock:
+                    handler = self._handlers.pop(username, None)
+                    if handler is not None:
+                        handler.close()
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+
+        return removed
+
+    def start_sweeper(self):
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="log-retention-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except OSError as e:
+                print(f"[Log Sweep Error]: {e}")
+            if self._stop.wait(self.sweep_interval):
+                return
+
+
+user_loggers = UserLoggerRegistry()
@@ -0,0 +1,247 @@
+# app/services/media_processing_service.py
+
+import io
+import sys
+import atexit
+import logging
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 8192  # Plaintext prefix handed to libmagic
+SPOOL_BYTES = 8 * 1024 * 1024  # Decrypted images larger than this spool to disk for PIL
+
+
+def _media_category(mime_type):
+    # Message.media_type is a short category; the full MIME type travels in the socket event
+    for category in ("image", "video", "audio"):
+        if mime_type.startswith(category + "/"):
+            return category
+    return "file"
+
+
+# -------------------------------------
+# ⚙️ Worker Process Side
+# -------------------------------------
+def _init_worker(settings):
+    from app.services import media_service
+    from app.services.logging_service import user_loggers
+
+    user_loggers.trace_enabled = False  # Crypto traces belong to the web process
+    media_service.configure_worker(**settings)
+    media_service._magic()  # One Magic instance per worker, loaded up front
+
+
+@contextmanager
+def _main_script_hidden():
+    """
+    Spawned processes re-run the parent's ``__main__`` script (as ``__mp_main__``)
+    before they unpickle any work, and run.py builds the whole app at import.
+    Workers only need app.services, so the script is hidden while they start.
+    """
+    main = sys.modules["__main__"]
+    saved_file = main.__dict__.pop("__file__", None)
+    saved_spec, main.__spec__ = getattr(main, "__spec__", None), None
+    try:
+        yield
+    finally:
+        main.__spec__ = saved_spec
+        if saved_file is not None:
+            main.__file__ = saved_file
+
+
+def process_media(file_path, thumbnail_sizes=None):
+    """
+    Sniff, measure and thumbnail one stored media object. Runs in a worker
+    process (or inline when MEDIA_WORKERS is 0); never touches the database.
+    """
+    from app.services import media_service
+    from app.services.thumbnail_service import render_thumbnails, pack_bundle
+
+    with open(file_path, "rb") as f:
+        header = media_service.read_media_header(f)
+
+    head = b"".join(media_service.iter_decrypted_range(file_path, None, 0, SNIFF_BYTES))
+    mime_type = media_service.detect_buffer_type(head)
+    result = {
+        "mime_type": mime_type,
+        "media_type": _media_category(mime_type),
+        "size": header.length,
+        "width": None,
+        "height": None,
+        "thumbnail_path": None,
+        "thumbnails": [],
+    }
+    if result["media_type"] != "image":
+        return result
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as plain:
+        for chunk in media_service.iter_decrypted_range(file_path, None):
+            plain.write(chunk)
+        plain.seek(0)
+
+        renditions, (result["width"], result["height"]) = render_thumbnails(plain, thumbnail_sizes)
+        result["thumbnail_path"] = media_service.store_stream(io.BytesIO(pack_bundle(renditions)))
+        result["thumbnails"] = list(renditions)
+
+    return result
+
+
+# -------------------------------------
+# 🏭 Media Processing Pool
+# -------------------------------------
+class MediaProcessor:
+    """
+    Runs process_media() off the request path in a process pool. Futures are
+    polled from a Socket.IO background task; each completion updates the
+    message row and emits ``media_processed`` to both participants.
+
+    The same pool seals finished resumable uploads (``seal``), which reads and
+    hashes the whole file.
+    """
+
+    def __init__(self, workers=2, poll_interval=0.05, thumbnail_sizes=None):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.thumbnail_sizes = thumbnail_sizes
+        self.app = None
+
+        self._executor = None
+        self._pending = {}  # future -> (on_done, on_error)
+        self._lock = threading.Lock()
+        self._polling = False
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get("MEDIA_WORKERS", self.workers)
+        self.poll_interval = app.config.get("MEDIA_POLL_INTERVAL_MS", self.poll_interval * 1000) / 1000
+        self.thumbnail_sizes = app.config.get("THUMBNAIL_SIZES", self.thumbnail_sizes)
+        atexit.register(self.shutdown)
+
+    def _pool(self):
+        if self._executor is None:
+            from app.services import media_service
+
+            settings = {
+                "media_folder": media_service.MEDIA_FOLDER,
+                "store_secret": self.app.config["MEDIA_STORE_SECRET"],
+                "segment_size": self.app.config.get("MEDIA_SEGMENT_SIZE"),
+            }
+            # spawn: forking a process that runs an eventlet hub and holds DB connections is not safe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings,),
+            )
+        return self._executor
+
+    # -------------------------
+    # 📤 Submitting
+    # -------------------------
+    def submit(self, message_id, file_path):
+        def failed(e):
+            logger.error(f"[MEDIA] Processing failed for message {message_id}: {e}")
+
+        self._run(process_media, (file_path, self.thumbnail_sizes),
+                  lambda result: self._complete(message_id, result), failed)
+
+    def seal(self, path, on_done, on_error):
+        """
+        Content-address a finished upload container (media_service.seal_media_object)
+        in the pool. ``on_done(file_path)`` or ``on_error(exception)`` then runs in
+        this process, inside an app context.
+        """
+        from app.services.media_service import seal_media_object
+
+        self._run(seal_media_object, (path,), on_done, on_error)
+
+    def _run(self, fn, args, on_done, on_error):
+        if not self.workers:
+            try:
+                result = fn(*args)
+            except Exception as e:
+                on_error(e)
+                return
+            on_done(result)
+            return
+
+        with _main_script_hidden():  # submit() starts the worker processes on demand
+            future = self._pool().submit(fn, *args)
+        with self._lock:
+            self._pending[future] = (on_done, on_error)
+            start = not self._polling
+            self._polling = True
+        if start:
+            from app import socketio
+            socketio.start_background_task(self._poll)
+
+    def pending(self):
+        return len(self._pending)
+
+    # -------------------------
+    # 📥 Completion
+    # -------------------------
+    def _poll(self):
+        from app import socketio
+
+        while True:
+            socketio.sleep(self.poll_interval)
+            with self._lock:
+                done = [future for future in self._pending if future.done()]
+                callbacks = [self._pending.pop(future) for future in done]
+                if not self._pending and not done:
+                    self._polling = False
+                    return
+
+            for future, (on_done, on_error) in zip(done, callbacks):
+                with self.app.app_context():
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        on_error(e)
+                        continue
+                    try:
+                        on_done(result)
+                    except Exception:
+                        logger.exception("[MEDIA] Completion handler failed")  # Keep polling the rest
+
+    def _complete(self, message_id, result):
+        from app import db, socketio
+        from app.models.message import Message
+        from app.services.media_service import release_media
+
+        message = db.session.get(Message, message_id)
+        if not message:
+            release_media(result["thumbnail_path"])  # Deleted while it was being processed
+            return
+
+        message.media_type = result["media_type"]
+        if result["thumbnail_path"]:
+            message.thumbnail_path = result["thumbnail_path"]
+        sender_id, receiver_id = message.sender_id, message.receiver_id
+        db.session.commit()
+
+        event = {
+            "message_id": message_id,
+            "media_type": result["media_type"],
+            "mime_type": result["mime_type"],
+            "size": result["size"],
+            "width": result["width"],
+            "height": result["height"],
+            "thumbnails": result["thumbnails"],
+        }
+        for user_id in {sender_id, receiver_id}:
+            socketio.emit("media_processed", event, room=f"user_{user_id}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+media_processor = MediaProcessor()
@@ -1,24 +1,249 @@
 # app/services/media_service.py
 
 import os
+import hmac
+import time
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from hashlib import sha256, shake_256
+from functools import lru_cache
+from collections import namedtuple
+from flask import current_app, has_app_context
 from werkzeug.utils import secure_filename
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
 from base64 import b64encode, b64decode
-from app import db
-from app.models.user import User
-from app.services.encryption_service import derive_aes_key_iv
+from app.services.encryption_service import derive_aes_key_iv, get_user_logger
 from PIL import Image
 import magic
 
+try:
+    import fcntl  # POSIX; the store lock is per-process elsewhere
+except ImportError:
+    fcntl = None
+
 MEDIA_FOLDER = os.path.join(os.getcwd(), "uploads", "media")
-THUMBNAIL_FOLDER = os.path.join(os.getcwd(), "uploads", "thumbnails")
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "mp4", "pdf", "docx", "txt", "zip"}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# -------------------------------------
+# 📦 Encrypted Media Container
+# -------------------------------------
+# header: magic | version | segment_size | plaintext length | msg_key
+# body  : AES-256-CTR ciphertext, same length as the plaintext
+#
+# The body is processed in segment_size pieces; the CTR counter of each piece
+# is derived from its offset, so any segment decrypts on its own and neither
+# side ever holds more than one segment. The exact plaintext length lives in
+# the header, so nothing is padded and trailing zero bytes survive.
+MEDIA_MAGIC = b"MTPM"
+MEDIA_VERSION = 1
+MEDIA_HEADER = struct.Struct(">4sB3xIQ16s")
+MEDIA_SEGMENT_SIZE = 64 * 1024
+
+MediaHeader = namedtuple("MediaHeader", "segment_size length msg_key")
+
+
+# Settings for processes without an app context (media workers), see configure_worker()
+_worker_settings = {}
+
+# Used only when DEBUG is on and MEDIA_STORE_SECRET is unset (the old SECRET_KEY default, so
+# development stores stay readable)
+DEV_MEDIA_STORE_SECRET = "super-secret-dev-key"
+
+
+def init_app(app):
+    """
+    The media key is derived from MEDIA_STORE_SECRET alone. It used to fall back to
+    SECRET_KEY, which made a routine session-secret rotation lock every stored
+    object; now a missing secret stops the app from starting unless DEBUG is on.
+    """
+    if app.config.get("MEDIA_STORE_SECRET"):
+        return
+    if str(app.config.get("DEBUG")).lower() not in ["true", "1", "t", "y", "yes"]:
+        raise RuntimeError(
+            "MEDIA_STORE_SECRET is not set. Stored media is encrypted under it; deployments that relied "
+            "on the old SECRET_KEY fallback should set it to their current SECRET_KEY."
+        )
+    app.logger.warning("MEDIA_STORE_SECRET is not set; using the development media key")
+    app.config["MEDIA_STORE_SECRET"] = DEV_MEDIA_STORE_SECRET
+
+
+def configure_worker(media_folder=None, store_secret=None, segment_size=None):
+    global MEDIA_FOLDER
+    if media_folder:
+        MEDIA_FOLDER = media_folder
+    _worker_settings.update(store_secret=store_secret, segment_size=segment_size)
+
+
+def _segment_size():
+    if has_app_context():
+        size = current_app.config.get("MEDIA_SEGMENT_SIZE", MEDIA_SEGMENT_SIZE)
+    else:
+        size = _worker_settings.get("segment_size") or MEDIA_SEGMENT_SIZE
+    return max(AES.block_size, size - size % AES.block_size)
+
+
+@lru_cache(maxsize=4)
+def _store_keys(secret):
+    # 256-byte server-side auth_key for media plus a separate key for content addressing
+    stream = shake_256(b"mtproto-media-store:" + secret.encode()).digest(256 + 32)
+    return stream[:256], stream[256:]
+
+
+def _store_secret():
+    if has_app_context():
+        return current_app.config.get("MEDIA_STORE_SECRET") or DEV_MEDIA_STORE_SECRET
+    return _worker_settings.get("store_secret") or DEV_MEDIA_STORE_SECRET
+
+
+def _media_keys(user, msg_key):
+    # Stored media is encrypted under the server's media key, not the uploader's
+    # auth_key, so identical uploads produce one shareable object
+    logger = get_user_logger((user.username or user.email or user.phone) if user else "media")
+    return derive_aes_key_iv(_store_keys(_store_secret())[0], msg_key, logger)
+
+
+def _media_cipher(aes_key, aes_iv, offset):
+    # offset must be block aligned; the 8-byte nonce comes from the derived IV
+    return AES.new(aes_key, AES.MODE_CTR, nonce=aes_iv[:8], initial_value=offset // AES.block_size)
+
+
+def read_media_header(f):
+    magic_bytes, version, segment_size, length, msg_key = MEDIA_HEADER.unpack(f.read(MEDIA_HEADER.size))
+    if magic_bytes != MEDIA_MAGIC or version != MEDIA_VERSION:
+        raise ValueError("Not an encrypted media container")
+    return MediaHeader(segment_size, length, msg_key)
+
+
+# -------------------------------------
+# 🗄️ Content-Addressed Store
+# -------------------------------------
+# Objects live at MEDIA_FOLDER/ab/cd/<digest>, where digest is an HMAC-SHA256
+# of the plaintext under the store's addressing key (a plain hash would let
+# anyone with disk access confirm a guessed file). Messages reference objects
+# through Message.file_path; the object goes away with its last reference.
+#
+# An upload reaches its content address before its Message row is committed,
+# so "no references" can briefly be wrong for an object that was just stored
+# or reused. Commits refresh the object's mtime, and GC leaves objects younger
+# than MEDIA_GC_GRACE seconds alone (retrying once the grace has passed).
+# Both sides hold a file lock, so this also holds across worker processes.
+MEDIA_GC_GRACE = 300
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def _store_lock():
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(MEDIA_FOLDER, exist_ok=True)
+        with open(os.path.join(MEDIA_FOLDER, ".store.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _gc_grace():
+    if has_app_context():
+        return current_app.config.get("MEDIA_GC_GRACE", MEDIA_GC_GRACE)
+    return MEDIA_GC_GRACE
+
+
+def store_path(digest):
+    return os.path.join(MEDIA_FOLDER, digest[:2], digest[2:4], digest)
+
+
+def media_references(file_path):
+    from app.models.message import Message
+    return Message.query.filter((Message.file_path == file_path) | (Message.thumbnail_path == file_path)).count()
+
+
+def release_media(file_path):
+    """
+    Delete a stored object once no message references it. Returns True if removed.
+    Objects committed within the grace period may still be gaining a reference;
+    they are checked again once it has passed.
+    """
+    if not file_path:
+        return False
+    grace = _gc_grace()
+    with _store_lock():
+        if media_references(file_path) or not os.path.exists(file_path):
+            return False
+        recent = time.time() - os.path.getmtime(file_path) < grace
+        if not recent:
+            os.remove(file_path)
+            return True
+
+    _release_later(file_path, grace)
+    return False
+
+
+def _release_later(file_path, delay):
+    from app import socketio
+
+    app = current_app._get_current_object()
+
+    def retry():
+        socketio.sleep(delay)
+        with app.app_context():
+            release_media(file_path)
+
+    socketio.start_background_task(retry)
+
+
+def _commit_object(temp_path, digest):
+    """Move a finished temp object to its content address (or drop it if already stored)."""
+    file_path = store_path(digest)
+    with _store_lock():
+        if os.path.exists(file_path):
+            os.remove(temp_path)  # Duplicate content: reuse the stored object
+            os.utime(file_path)  # ...and keep it out of GC until the new reference is committed
+        else:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            os.replace(temp_path, file_path)
+            os.utime(file_path)
+    return file_path
+
+
+def media_store_stats():
+    from app import db
+    from app.models.message import Message
+
+    rows = db.session.query(Message.file_path, db.func.count(Message.id)).filter(
+        Message.file_path.isnot(None)
+    ).group_by(Message.file_path).all()
+
+    objects = references = stored_bytes = logical_bytes = 0
+    for file_path, count in rows:
+        if not os.path.exists(file_path):
+            continue
+        size = os.path.getsize(file_path)
+        objects += 1
+        references += count
+        stored_bytes += size
+        logical_bytes += size * count
+
+    return {
+        "objects": objects,
+        "references": references,
+        "dedup_ratio": round(references / objects, 3) if objects else 1.0,
+        "stored_bytes": stored_bytes,
+        "logical_bytes": logical_bytes,
+        "bytes_saved": logical_bytes - stored_bytes,
+    }
+
+
 # -------------------------------------
 # 🔒 Encrypt & Save Media File
 # -------------------------------------
@@ -26,72 +251,182 @@ def encrypt_and_save_file(file, user):
     if not allowed_file(file.filename):
         return None, "Unsupported file type"
 
-    # Generate file info
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(MEDIA_FOLDER, filename)
+    return store_stream(file, user), None
+
+
+class MediaWriter:
+    """
+    Incremental writer for one stored object: ``write()`` plaintext pieces of
+    any size as they arrive, then ``close()`` for the object path (or
+    ``abort()`` to drop it). Only the ciphertext of the current piece is ever
+    in memory; the length is patched into the header at the end.
+    """
 
-    # Read content
-    file_data = file.read()
+    def __init__(self, user=None):
+        os.makedirs(MEDIA_FOLDER, exist_ok=True)
 
-    # Use user's auth key
-    if not user.auth_key:
-        return None, "Missing encryption key"
+        self.segment_size = _segment_size()
+        self.length = 0
+        self._msg_key = get_random_bytes(16)
+        aes_key, aes_iv = _media_keys(user, self._msg_key)
+        self._cipher = _media_cipher(aes_key, aes_iv, 0)
+        self._digest = hmac.new(_store_keys(_store_secret())[1], digestmod=sha256)
 
-    msg_key = get_random_bytes(16)
-    aes_key, aes_iv = derive_aes_key_iv(user.auth_key, msg_key)
+        fd, self._temp_path = tempfile.mkstemp(prefix=".upload-", dir=MEDIA_FOLDER)
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._header())
 
-    cipher = AES.new(aes_key, AES.MODE_CBC, aes_iv)
-    encrypted_data = cipher.encrypt(file_data.ljust((len(file_data) + 15) // 16 * 16, b"\0"))
+    def _header(self):
+        return MEDIA_HEADER.pack(MEDIA_MAGIC, MEDIA_VERSION, self.segment_size, self.length, self._msg_key)
 
-    with open(file_path, "wb") as f:
-        f.write(encrypted_data)
+    def write(self, data):
+        self._digest.update(data)
+        self._file.write(self._cipher.encrypt(data))  # CTR keeps its keystream position across calls
+        self.length += len(data)
 
-    return file_path, None
+    def close(self):
+        """Finish the object and move it into the store. Returns its path."""
+        try:
+            self._file.seek(0)
+            self._file.write(self._header())
+            self._file.close()
+            return _commit_object(self._temp_path, self._digest.hexdigest())
+        except OSError:
+            self.abort()
+            raise
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+def store_stream(stream, user=None):
+    """Encrypt everything readable from ``stream`` into the store. Returns the object path."""
+    writer = MediaWriter(user)
+    try:
+        while True:
+            chunk = stream.read(writer.segment_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
 
 
 # -------------------------------------
-# 🔓 Decrypt Media for Download
+# 🧩 Random-Access Writes (resumable uploads)
 # -------------------------------------
-def decrypt_file(file_path, user, msg_key_hex):
-    if not os.path.exists(file_path):
-        return None
+# A container can also be filled out of order: create it at its final length,
+# write each part at its plaintext offset (CTR needs only the offset), then
+# seal it into the store once every byte is there.
+def create_media_object(path, length):
+    """Create an empty container for ``length`` plaintext bytes at ``path``."""
+    with open(path, "wb") as f:
+        f.write(MEDIA_HEADER.pack(MEDIA_MAGIC, MEDIA_VERSION, _segment_size(), length, get_random_bytes(16)))
+        f.truncate(MEDIA_HEADER.size + length)
 
-    with open(file_path, "rb") as f:
-        encrypted_data = f.read()
 
-    msg_key = bytes.fromhex(msg_key_hex)
-    aes_key, aes_iv = derive_aes_key_iv(user.auth_key, msg_key)
+def write_media_part(path, offset, stream, length, user=None):
+    """Encrypt exactly ``length`` bytes read from ``stream`` into the container at plaintext ``offset``."""
+    with open(path, "r+b") as f:
+        header = read_media_header(f)
+        if offset % AES.block_size or offset + length > header.length:
+            raise ValueError("Part does not fit the upload")
+
+        aes_key, aes_iv = _media_keys(user, header.msg_key)
+        cipher = _media_cipher(aes_key, aes_iv, offset)
+        f.seek(MEDIA_HEADER.size + offset)
 
-    cipher = AES.new(aes_key, AES.MODE_CBC, aes_iv)
-    decrypted = cipher.decrypt(encrypted_data)
+        remaining = length
+        while remaining:
+            chunk = stream.read(min(header.segment_size, remaining))
+            if not chunk:
+                raise ValueError("Part is shorter than announced")
+            f.write(cipher.encrypt(chunk))
+            remaining -= len(chunk)
 
-    return decrypted.rstrip(b"\0")
+
+def seal_media_object(path, user=None):
+    """Content-address a completed container and move it into the store. Returns the object path."""
+    digest = hmac.new(_store_keys(_store_secret())[1], digestmod=sha256)
+    for chunk in iter_decrypted_range(path, user):
+        digest.update(chunk)
+    return _commit_object(path, digest.hexdigest())
 
 
 # -------------------------------------
-# 📷 Generate Thumbnail (Images)
+# 🔓 Decrypt Media for Download
 # -------------------------------------
-def generate_thumbnail(image_file, size=(150, 150)):
-    try:
-        img = Image.open(image_file)
-        img.thumbnail(size)
-        thumb_path = os.path.join(
-            THUMBNAIL_FOLDER, "thumb_" + secure_filename(image_file.filename)
-        )
-        img.save(thumb_path)
-        return thumb_path
-    except Exception as e:
-        print(f"[Thumbnail Error]: {e}")
+def media_etag(header):
+    """Strong validator for a stored media object (msg_key is fresh per object)."""
+    return sha256(MEDIA_HEADER.pack(MEDIA_MAGIC, MEDIA_VERSION, *header)).hexdigest()[:32]
+
+
+def iter_decrypted_range(file_path, user, start=0, stop=None):
+    """
+    Yield the plaintext bytes ``[start, stop)`` of an encrypted media file one
+    segment at a time. Only the segments overlapping the range are read and
+    decrypted.
+    """
+    with open(file_path, "rb") as f:
+        header = read_media_header(f)
+        stop = header.length if stop is None else min(stop, header.length)
+        if start >= stop:
+            return
+
+        aes_key, aes_iv = _media_keys(user, header.msg_key)
+        offset = start - start % header.segment_size
+        cipher = _media_cipher(aes_key, aes_iv, offset)
+        f.seek(MEDIA_HEADER.size + offset)
+
+        while offset < stop:
+            chunk = f.read(min(header.segment_size, header.length - offset))
+            if not chunk:
+                raise ValueError("Encrypted media file is truncated")
+            plain = cipher.decrypt(chunk)
+            yield plain[max(start - offset, 0):stop - offset]
+            offset += len(chunk)
+
+
+def iter_decrypted_file(file_path, user):
+    """Yield the plaintext of an encrypted media file one segment at a time."""
+    return iter_decrypted_range(file_path, user)
+
+
+def decrypt_file(file_path, user, msg_key_hex=None):
+    # msg_key_hex is kept for callers of the old signature; the container carries its own msg_key
+    if not os.path.exists(file_path):
         return None
 
+    return b"".join(iter_decrypted_file(file_path, user))
+
 
 # -------------------------------------
 # 📦 Detect File Type
 # -------------------------------------
+_mime_detector = None
+
+
+def _magic():
+    # Loading the magic database is the expensive part; do it once per process
+    global _mime_detector
+    if _mime_detector is None:
+        _mime_detector = magic.Magic(mime=True)
+    return _mime_detector
+
+
 def detect_file_type(file_path):
     try:
-        mime = magic.Magic(mime=True)
-        file_type = mime.from_file(file_path)
-        return file_type
+        return _magic().from_file(file_path)
+    except Exception as e:
+        return "unknown"
+
+
+def detect_buffer_type(data):
+    try:
+        return _magic().from_buffer(data)
     except Exception as e:
-        return "unknown"
\ No newline at end of file
+        return "unknown"
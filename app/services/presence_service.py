@@ -0,0 +1,605 @@
+# app/services/presence_service.py
+
+import os
+import time
+import socket
+import threading
+from datetime import datetime
+
+
+# -------------------------------------
+# 🧠 In-Process Backend (single worker)
+# -------------------------------------
+class InMemoryPresence:
+    """user_id -> socket ids, with a sid -> user_id reverse index so disconnects are O(1)."""
+
+    def __init__(self):
+        self._sids = {}     # user_id -> set(sid)
+        self._users = {}    # sid -> user_id
+        self._formats = {}  # sid -> wire format negotiated at join
+        self._windows = {}  # user_id -> (online before the coalescing window, latest transition)
+        self._lock = threading.Lock()
+
+    def add(self, user_id, sid, wire_format="json"):
+        """Register ``sid`` for ``user_id``. Returns True if this is the user's first socket."""
+        with self._lock:
+            self._users[sid] = user_id
+            self._formats[sid] = wire_format
+            sids = self._sids.setdefault(user_id, set())
+            sids.add(sid)
+            return len(sids) == 1
+
+    def remove(self, sid):
+        """Forget ``sid``. Returns ``(user_id, went_offline)``, or ``(None, False)`` for unknown sids."""
+        with self._lock:
+            user_id = self._users.pop(sid, None)
+            self._formats.pop(sid, None)
+            if user_id is None:
+                return None, False
+            sids = self._sids.get(user_id, set())
+            sids.discard(sid)
+            if sids:
+                return user_id, False
+            self._sids.pop(user_id, None)
+            return user_id, True
+
+    def is_online(self, user_id):
+        return user_id in self._sids
+
+    def sids(self, user_id):
+        return set(self._sids.get(user_id, ()))
+
+    def wire_formats(self, user_id):
+        """The wire formats the user's sockets joined with (what message emits need to encode)."""
+        with self._lock:
+            return {self._formats[sid] for sid in self._sids.get(user_id, ()) if sid in self._formats}
+
+    def online_users(self):
+        return set(self._sids)
+
+    def open_window(self, user_id, before, seen, ttl):
+        """Start or extend the user's coalescing window. Returns True if this call started it."""
+        with self._lock:
+            opened = user_id not in self._windows
+            self._windows[user_id] = (before if opened else self._windows[user_id][0], seen)
+            return opened
+
+    def close_window(self, user_id):
+        """End the user's window. Returns ``(online before it, latest transition)``, or None."""
+        with self._lock:
+            return self._windows.pop(user_id, None)
+
+
+# -------------------------------------
+# 🛰️ Redis Backend (shared by all workers)
+# -------------------------------------
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class RedisPresence:
+    """
+    The same registry kept in Redis so every gunicorn/eventlet worker sees it:
+
+      presence:user:<user_id>      SET of sids (Redis drops it when the last sid goes)
+      presence:formats:<user_id>   HASH sid -> wire format negotiated at join
+      presence:sid:<sid>           STRING user_id
+      presence:worker:<worker_id>  HASH sid -> user_id of the sockets this worker holds
+      presence:alive:<worker_id>   marker, present while the worker heartbeats
+      presence:window:<user_id>    HASH before, seen: the user's open coalescing window
+
+    Sid, user and alive keys expire after ``ttl`` seconds unless the owning
+    worker's ``heartbeat()`` refreshes them, so a worker that dies without
+    disconnecting its sockets cannot keep them online for longer than that.
+    ``reap()`` then removes a dead worker's sids (reporting who went offline),
+    and user sets are pruned of sids whose key has expired whenever a socket of
+    that user joins or leaves.
+
+    Any client with the redis-py API works, e.g. ``fakeredis.FakeRedis()`` in tests.
+    """
+
+    def __init__(self, client, prefix="presence", ttl=60, worker_id=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+        self._local = {}  # sid -> user_id for this worker's sockets (what heartbeat() refreshes)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url, prefix="presence", ttl=60, worker_id=None):
+        import redis  # Only needed when PRESENCE_BACKEND=redis
+        return cls(redis.Redis.from_url(url), prefix, ttl, worker_id)
+
+    def _user_key(self, user_id):
+        return f"{self.prefix}:user:{user_id}"
+
+    def _sid_key(self, sid):
+        return f"{self.prefix}:sid:{sid}"
+
+    def _formats_key(self, user_id):
+        return f"{self.prefix}:formats:{user_id}"
+
+    def _worker_key(self, worker_id):
+        return f"{self.prefix}:worker:{worker_id}"
+
+    def _alive_key(self, worker_id):
+        return f"{self.prefix}:alive:{worker_id}"
+
+    def _window_key(self, user_id):
+        return f"{self.prefix}:window:{user_id}"
+
+    def _live_sids(self, user_id):
+        """The user's sids whose key has not expired; expired ones are dropped from the set."""
+        user_key = self._user_key(user_id)
+        sids = [_text(sid) for sid in self.client.smembers(user_key)]
+        if not sids:
+            return []
+        pipe = self.client.pipeline()
+        for sid in sids:
+            pipe.exists(self._sid_key(sid))
+        alive = pipe.execute()
+        dead = [sid for sid, exists in zip(sids, alive) if not exists]
+        if dead:
+            self.client.srem(user_key, *dead)
+            self.client.hdel(self._formats_key(user_id), *dead)
+        return [sid for sid, exists in zip(sids, alive) if exists]
+
+    def add(self, user_id, sid, wire_format="json"):
+        with self._lock:
+            self._local[sid] = user_id
+        pipe = self.client.pipeline()
+        pipe.set(self._sid_key(sid), user_id, ex=self.ttl)
+        pipe.sadd(self._user_key(user_id), sid)
+        pipe.expire(self._user_key(user_id), self.ttl)
+        pipe.hset(self._formats_key(user_id), sid, wire_format)
+        pipe.expire(self._formats_key(user_id), self.ttl)
+        pipe.hset(self._worker_key(self.worker_id), sid, user_id)
+        pipe.set(self._alive_key(self.worker_id), 1, ex=self.ttl)
+        pipe.execute()
+        return self._live_sids(user_id) == [sid]
+
+    def remove(self, sid):
+        with self._lock:
+            user_id = self._local.pop(sid, None)
+        pipe = self.client.pipeline()
+        pipe.get(self._sid_key(sid))
+        pipe.delete(self._sid_key(sid))
+        pipe.hdel(self._worker_key(self.worker_id), sid)
+        stored = pipe.execute()[0]
+        if user_id is None and stored is None:
+            return None, False
+        return self._drop(int(user_id if user_id is not None else stored), sid)
+
+    def _drop(self, user_id, sid):
+        pipe = self.client.pipeline()
+        pipe.srem(self._user_key(user_id), sid)
+        pipe.hdel(self._formats_key(user_id), sid)
+        pipe.execute()
+        return user_id, not self._live_sids(user_id)
+
+    def is_online(self, user_id):
+        return bool(self.client.exists(self._user_key(user_id)))
+
+    def sids(self, user_id):
+        return {_text(sid) for sid in self.client.smembers(self._user_key(user_id))}
+
+    def wire_formats(self, user_id):
+        return {_text(value) for value in self.client.hvals(self._formats_key(user_id))}
+
+    def online_users(self):
+        start = len(self._user_key(""))
+        return {int(_text(key)[start:]) for key in self.client.scan_iter(self._user_key("*"))}
+
+    def open_window(self, user_id, before, seen, ttl):
+        """
+        Start or extend the user's coalescing window. Only the first transition
+        (on whichever worker) stores ``before`` and gets True; every one updates
+        ``seen``. The key expires after ``ttl`` seconds if its owner never closes it.
+        """
+        key = self._window_key(user_id)
+        pipe = self.client.pipeline()
+        pipe.hsetnx(key, "before", int(before))
+        pipe.hset(key, "seen", seen.isoformat())
+        pipe.pexpire(key, int(ttl * 1000))
+        return bool(pipe.execute()[0])
+
+    def close_window(self, user_id):
+        key = self._window_key(user_id)
+        pipe = self.client.pipeline()  # MULTI/EXEC: nobody extends the window between the read and the delete
+        pipe.hgetall(key)
+        pipe.delete(key)
+        window = {_text(field): _text(value) for field, value in pipe.execute()[0].items()}
+        if "before" not in window:
+            return None
+        return bool(int(window["before"])), datetime.fromisoformat(window["seen"])
+
+    # -------------------------
+    # 💓 Heartbeat & Reaping
+    # -------------------------
+    def heartbeat(self):
+        """Refresh the TTL of this worker's keys, then reap dead workers. Returns reap()'s transitions."""
+        with self._lock:
+            local = list(self._local.items())
+        pipe = self.client.pipeline()
+        pipe.set(self._alive_key(self.worker_id), 1, ex=self.ttl)
+        for sid, user_id in local:
+            pipe.expire(self._sid_key(sid), self.ttl)
+            pipe.expire(self._user_key(user_id), self.ttl)
+            pipe.expire(self._formats_key(user_id), self.ttl)
+        pipe.execute()
+        return self.reap()
+
+    def reap(self, include_self=False):
+        """
+        Remove the sids of workers that stopped heartbeating. ``include_self``
+        also clears what a previous process with this ``worker_id`` left behind
+        (call it once at startup, before any socket joins). Returns
+        ``[(user_id, went_offline), ...]`` for every sid removed.
+        """
+        transitions = []
+        start = len(self._worker_key(""))
+        for key in list(self.client.scan_iter(self._worker_key("*"))):
+            worker_id = _text(key)[start:]
+            if worker_id == self.worker_id and not include_self:
+                continue
+            if worker_id != self.worker_id and self.client.exists(self._alive_key(worker_id)):
+                continue
+
+            for sid, user_id in self.client.hgetall(key).items():
+                sid = _text(sid)
+                self.client.delete(self._sid_key(sid))
+                transitions.append(self._drop(int(user_id), sid))
+            self.client.delete(key)
+        return transitions
+
+
+# -------------------------------------
+# 🟢 Presence Registry
+# -------------------------------------
+class PresenceService:
+    """
+    Which users have a live socket, answered without touching the database.
+
+    ``PRESENCE_BACKEND``: ``"memory"`` (default, one worker) or ``"redis"``
+    (``PRESENCE_REDIS_URL``, falling back to ``SOCKETIO_MESSAGE_QUEUE``). With
+    Redis every worker heartbeats its sockets every ``PRESENCE_TTL / 3``
+    seconds, and sockets of a worker that died are taken offline within
+    ``PRESENCE_TTL``.
+
+    Online/offline transitions are written back to ``users.is_online`` /
+    ``users.last_seen`` in one batch every ``PRESENCE_FLUSH_INTERVAL`` seconds,
+    so a reconnect storm costs one UPDATE per interval, not one commit per socket.
+    A batch whose commit fails is rolled back and retried with the next flush.
+
+    Transitions are also pushed as ``presence`` events to the sockets
+    subscribed to that user (see PresenceSubscriptions), after a short
+    coalescing window (``PRESENCE_COALESCE_MS``): a user who drops and comes
+    back within it (a page reload) announces nothing. The window lives in the
+    backend, so with Redis it spans workers: the worker that saw the first
+    transition owns it and, when it ends, compares the state before it with
+    the shared registry - also when the reconnect landed on another worker.
+    """
+
+    def __init__(self, backend=None, flush_interval=5.0, coalesce=1.5, seen_ttl=60):
+        self.backend = backend or InMemoryPresence()
+        self.flush_interval = flush_interval
+        self.coalesce = coalesce
+        self.seen_ttl = seen_ttl
+        self.app = None
+
+        self._pending = {}    # user_id -> (is_online, last_seen) not yet written
+        self._last_seen = {}  # user_id -> latest transition seen by this process
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+        self._announce = set()    # user ids whose open coalescing window this process owns
+        self._announcing = False
+        self._db_seen = {}        # user_id -> (last_seen, expires_at), fallback for users this process never saw
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config.get("PRESENCE_FLUSH_INTERVAL", self.flush_interval)
+        self.coalesce = app.config.get("PRESENCE_COALESCE_MS", self.coalesce * 1000) / 1000
+        self.seen_ttl = app.config.get("PRESENCE_STATUS_CACHE_TTL", self.seen_ttl)
+        if app.config.get("PRESENCE_BACKEND", "memory") == "redis":
+            url = app.config.get("PRESENCE_REDIS_URL") or app.config.get("SOCKETIO_MESSAGE_QUEUE")
+            self.use_backend(RedisPresence.from_url(
+                url, ttl=app.config.get("PRESENCE_TTL", 60), worker_id=app.config.get("PRESENCE_WORKER_ID"),
+            ))
+        else:
+            self.backend = InMemoryPresence()
+
+    def use_backend(self, backend):
+        self.backend = backend
+        if isinstance(backend, RedisPresence):
+            # Leftovers of an earlier process with the same worker id are stale by definition
+            self._went_offline(backend.reap(include_self=True))
+            from app import socketio
+            socketio.start_background_task(self._heartbeat_loop, backend)
+
+    def _heartbeat_loop(self, backend):
+        from app import socketio
+
+        while self.backend is backend:
+            socketio.sleep(backend.ttl / 3)
+            try:
+                self._went_offline(backend.heartbeat())
+            except Exception as e:
+                print(f"[Presence Heartbeat Error]: {e}")
+
+    def _went_offline(self, transitions):
+        for user_id, went_offline in transitions:
+            if went_offline:
+                self._record(user_id, False)
+
+    def add(self, user_id, sid, wire_format="json"):
+        return self.backend.add(user_id, sid, wire_format)
+
+    def remove(self, sid):
+        return self.backend.remove(sid)
+
+    def is_online(self, user_id):
+        return self.backend.is_online(user_id)
+
+    def sids(self, user_id):
+        return self.backend.sids(user_id)
+
+    def wire_formats(self, user_id):
+        return self.backend.wire_formats(user_id)
+
+    def online_users(self):
+        return self.backend.online_users()
+
+    # -------------------------
+    # 🔌 Socket Lifecycle
+    # -------------------------
+    def connect(self, user_id, sid, wire_format="json"):
+        """Register a socket. Returns True when it is the user's first (user came online)."""
+        first = self.backend.add(user_id, sid, wire_format)
+        if first:
+            self._record(user_id, True)
+        return first
+
+    def disconnect(self, sid):
+        """Forget a socket. Returns ``(user_id, went_offline)``."""
+        user_id, went_offline = self.backend.remove(sid)
+        if went_offline:
+            self._record(user_id, False)
+        return user_id, went_offline
+
+    def last_seen(self, user_id):
+        """Latest online/offline transition seen by this process, or None (ask the database)."""
+        return self._last_seen.get(user_id)
+
+    def statuses(self, user_ids):
+        """
+        ``{user_id: (online, last_seen)}`` for known users, from the registry and
+        this process's transitions; the rest come from one ``users`` query whose
+        answers are cached for ``seen_ttl`` seconds.
+        """
+        result, missing = {}, []
+        now = time.monotonic()
+        for user_id in set(user_ids):
+            online = self.backend.is_online(user_id)
+            seen = self._last_seen.get(user_id)
+            if seen is None:
+                cached = self._db_seen.get(user_id)
+                if cached is not None and cached[1] > now:
+                    seen = cached[0]
+                elif not online:
+                    missing.append(user_id)
+                    continue
+            result[user_id] = (online, seen)
+
+        if missing:
+            from app import db
+            from app.models.user import User
+
+            rows = db.session.query(User.id, User.last_seen).filter(User.id.in_(missing)).all()
+            with self._lock:
+                for row in rows:
+                    self._db_seen[row.id] = (row.last_seen, now + self.seen_ttl)
+                    result[row.id] = (False, row.last_seen)
+                if len(self._db_seen) > 10000:
+                    self._db_seen = {k: v for k, v in self._db_seen.items() if v[1] > now}
+        return result
+
+    # -------------------------
+    # 🚿 Write-Behind to users
+    # -------------------------
+    def _record(self, user_id, online):
+        now = datetime.utcnow()
+        # A transition to `online` means the user was not online before it. The key outlives the
+        # window a little, so an owner that dies cannot block the user's announcements for long
+        owner = self.backend.open_window(user_id, not online, now, 2 * self.coalesce + 1)
+        with self._lock:
+            self._pending[user_id] = (online, now)
+            self._last_seen[user_id] = now
+            schedule = not self._scheduled
+            self._scheduled = True
+
+            announce = False
+            if owner:
+                self._announce.add(user_id)
+                announce = not self._announcing
+                self._announcing = True
+
+        from app import socketio
+        if schedule:
+            socketio.start_background_task(self._flush_later)
+        if announce:
+            socketio.start_background_task(self._announce_later)
+
+    def _flush_later(self):
+        from app import socketio
+
+        socketio.sleep(self.flush_interval)
+        with self._lock:
+            self._scheduled = False
+        with self.app.app_context():
+            self.flush()
+
+    # -------------------------
+    # 📣 Push to Subscribers
+    # -------------------------
+    def _announce_later(self):
+        from app import socketio
+
+        socketio.sleep(self.coalesce)
+        with self._lock:
+            self._announcing = False
+        self.announce()
+
+    def announce(self):
+        """Push each user's net change over the window to ``presence_<user_id>``. Returns the number pushed."""
+        from app import socketio
+
+        with self._lock:
+            user_ids, self._announce = self._announce, set()
+
+        changed = []
+        for user_id in user_ids:
+            window = self.backend.close_window(user_id)
+            if window is None:
+                continue
+            before, seen = window
+            online = self.backend.is_online(user_id)
+            # Users who flapped back to where they started within the window announce nothing
+            if online != before:
+                changed.append((user_id, online, seen))
+
+        for user_id, online, seen in changed:
+            socketio.emit("presence", {"users": [presence_entry(user_id, online, seen)]},
+                          room=presence_room(user_id))
+        return len(changed)
+
+    def flush(self):
+        from app import db
+        from app.models.user import User
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        users = User.__table__
+        stmt = users.update().where(users.c.id == db.bindparam("user_id")).values(
+            is_online=db.bindparam("online"), last_seen=db.bindparam("seen")
+        )
+        try:
+            db.session.execute(stmt, [
+                {"user_id": user_id, "online": online, "seen": seen} for user_id, (online, seen) in pending.items()
+            ])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[Presence Flush Error]: {e} ({len(pending)} users, retrying)")
+            self._requeue(pending)
+
+    def _requeue(self, pending):
+        """Put a batch that failed to commit back; transitions recorded since then are newer and win."""
+        with self._lock:
+            for user_id, transition in pending.items():
+                self._pending.setdefault(user_id, transition)
+            schedule = not self._scheduled
+            self._scheduled = True
+
+        if schedule:
+            from app import socketio
+            socketio.start_background_task(self._flush_later)
+
+
+def presence_room(user_id):
+    return f"presence_{user_id}"
+
+
+def presence_entry(user_id, online, last_seen):
+    return {"user_id": user_id, "online": online, "last_seen": last_seen.isoformat() if last_seen else None}
+
+
+# -------------------------------------
+# 👀 Presence Subscriptions
+# -------------------------------------
+class PresenceSubscriptions:
+    """
+    Which users each socket watches (its sidebar). A subscription is a
+    Socket.IO room ``presence_<user_id>``, so the server's room -> sids map is
+    the reverse index that limits fan-out to actual subscribers (and, with
+    ``SOCKETIO_MESSAGE_QUEUE``, spans workers). This class keeps the forward
+    sid -> users side, to diff re-subscriptions and cap their size.
+    """
+
+    def __init__(self, max_users=500):
+        self.max_users = max_users
+        self._targets = {}  # sid -> set(user_id)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_users = app.config.get("PRESENCE_SUBSCRIBE_MAX", self.max_users)
+
+    def replace(self, sid, user_ids):
+        """Make ``user_ids`` the socket's whole subscription. Returns ``(to_join, to_leave)`` user ids."""
+        wanted = set(list(dict.fromkeys(user_ids))[:self.max_users])
+        with self._lock:
+            current = self._targets.get(sid, set())
+            self._targets[sid] = wanted
+        return wanted - current, current - wanted
+
+    def drop(self, sid):
+        with self._lock:
+            self._targets.pop(sid, None)
+
+    def stats(self):
+        return {"sockets": len(self._targets), "subscriptions": sum(len(t) for t in self._targets.values())}
+
+
+# -------------------------------------
+# ⌨️ Typing Relay Throttle
+# -------------------------------------
+class TypingThrottle:
+    """
+    At most one ``typing`` relay per (sender, receiver) pair every ``interval``
+    seconds; everything in between is dropped (the client keeps its indicator
+    up for longer than the interval, so nothing flickers).
+    """
+
+    def __init__(self, interval=2.0, max_pairs=10000):
+        self.interval = interval
+        self.max_pairs = max_pairs
+        self.relayed = 0
+        self.dropped = 0
+
+        self._last = {}  # (sender_id, receiver_id) -> monotonic time of last relay
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.interval = app.config.get("TYPING_RELAY_INTERVAL", self.interval)
+
+    def allow(self, sender_id, receiver_id):
+        now = time.monotonic()
+        key = (sender_id, receiver_id)
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self.dropped += 1
+                return False
+            if len(self._last) >= self.max_pairs:
+                self._prune(now)
+            self._last[key] = now
+            self.relayed += 1
+            return True
+
+    def _prune(self, now):
+        # Pairs idle for longer than the interval hold no state worth keeping
+        for key in [key for key, last in self._last.items() if now - last >= self.interval]:
+            del self._last[key]
+
+    def stats(self):
+        return {"relayed": self.relayed, "dropped": self.dropped, "pairs": len(self._last)}
+
+
+presence = PresenceService()
+presence_subscriptions = PresenceSubscriptions()
+typing_throttle = TypingThrottle()
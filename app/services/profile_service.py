@@ -0,0 +1,156 @@
+# app/services/profile_service.py
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class Profile:
+    """What routes need to show a user: id and display name. ``online`` is read live from presence."""
+    __slots__ = ("id", "display_name", "expires_at")
+
+    def __init__(self, user_id, display_name, expires_at):
+        self.id = user_id
+        self.display_name = display_name
+        self.expires_at = expires_at
+
+    @property
+    def online(self):
+        from app.services.presence_service import presence
+        return presence.is_online(self.id)
+
+    def to_dict(self):
+        return {"id": self.id, "username": self.display_name}
+
+
+# -------------------------------------
+# 🪪 Profile Cache
+# -------------------------------------
+class ProfileCache:
+    """
+    Bounded LRU/TTL cache of user profiles (``username or email or phone``)
+    shared by the chat routes, the directory and the crypto logs. Directory
+    pages are keyset queries that prime it.
+
+    User insert/update/delete (session events, see app/models/user.py)
+    invalidate the affected profile; the TTL bounds staleness across worker
+    processes.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._profiles = OrderedDict()  # user_id -> Profile
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get("PROFILE_CACHE_SIZE", self.max_entries)
+        self.ttl = app.config.get("PROFILE_CACHE_TTL", self.ttl)
+
+    # -------------------------
+    # 🔎 Lookups
+    # -------------------------
+    def get(self, user_id):
+        """Return the Profile for ``user_id`` or None if there is no such user."""
+        return self.get_many([user_id]).get(user_id)
+
+    def display_name(self, user_id):
+        profile = self.get(user_id)
+        return profile.display_name if profile else None
+
+    def get_many(self, user_ids):
+        """Resolve several user ids with at most one query. Returns {user_id: Profile}."""
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for user_id in set(user_ids):
+                profile = self._profiles.get(user_id)
+                if profile is not None and profile.expires_at > now:
+                    self._profiles.move_to_end(user_id)
+                    self.hits += 1
+                    found[user_id] = profile
+                else:
+                    self.misses += 1
+                    missing.append(user_id)
+
+        if missing:
+            from app import db
+            from app.models.user import User
+
+            rows = db.session.query(User.id, User.username, User.email, User.phone).filter(
+                User.id.in_(missing)
+            ).all()
+            for row in rows:
+                found[row.id] = self.prime(row.id, row.username or row.email or row.phone)
+
+        return found
+
+    def directory_page(self, after_id=None, limit=100, prefix=None):
+        """
+        Up to ``limit`` profiles with id > ``after_id`` in id order, optionally
+        only those whose display name starts with ``prefix`` (case-insensitive).
+        One keyset query on the primary key; the rows prime the cache.
+        """
+        from app import db
+        from app.models.user import User
+
+        display_name = db.func.coalesce(User.username, User.email, User.phone)
+        query = db.session.query(User.id, display_name.label("display_name"))
+        if after_id is not None:
+            query = query.filter(User.id > after_id)
+        if prefix:
+            escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.filter(display_name.ilike(escaped + "%", escape="\\"))
+        rows = query.order_by(User.id).limit(limit).all()
+        return [self.prime(row.id, row.display_name) for row in rows]
+
+    def directory_etag(self):
+        """
+        Validator for the whole directory: user count, highest id and latest
+        profile change (``users.profile_updated_at``), so inserts, deletes and
+        renames on any worker change it. One aggregate query.
+        """
+        from app import db
+        from app.models.user import User
+
+        row = db.session.query(
+            db.func.count(User.id), db.func.max(User.id), db.func.max(User.profile_updated_at)
+        ).one()
+        return hashlib.sha1(repr(tuple(row)).encode()).hexdigest()[:16]
+
+    def prime(self, user_id, display_name):
+        """Store a profile another query already loaded. Returns the Profile."""
+        profile = Profile(user_id, display_name, time.monotonic() + self.ttl)
+        with self._lock:
+            self._profiles[user_id] = profile
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+        return profile
+
+    # -------------------------
+    # ♻️ Invalidation & Stats
+    # -------------------------
+    def invalidate(self, user_id):
+        with self._lock:
+            self._profiles.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "profiles": len(self._profiles),
+        }
+
+
+profile_cache = ProfileCache()
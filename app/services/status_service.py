@@ -0,0 +1,151 @@
+# app/services/status_service.py
+
+import logging
+import threading
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Higher rank wins when several transitions for one message land in the same batch
+STATUS_RANK = {"sent": 0, "delivered": 1, "read": 2}
+
+
+def _rank(status):
+    return STATUS_RANK.get(status, STATUS_RANK["delivered"])  # Client acks like "✔✔" count as delivered
+
+
+# -------------------------------------
+# 🗃️ Write-Behind Message Status Updates
+# -------------------------------------
+class MessageStatusBatcher:
+    """
+    Coalesces ``messages.status`` transitions from the socket handlers into one
+    transaction flushed every ``flush_interval`` seconds or every ``max_pending``
+    events, whichever comes first. Transitions stay pending until their commit
+    succeeds; a failed flush is rolled back, logged and retried after
+    ``retry_interval`` seconds.
+
+    ``MESSAGE_DURABILITY``:
+      - ``"batched"`` (default): write-behind batching; on SQLite also WAL with
+        ``synchronous=NORMAL`` (a power loss can drop the last few status flips).
+      - ``"strict"``: every transition is committed before the handler returns.
+    """
+
+    def __init__(self, durability="batched", flush_interval=0.005, max_pending=200, retry_interval=1.0):
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retry_interval = retry_interval
+        self.app = None
+
+        self._pending = {}  # message_id -> status
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def init_app(self, app):
+        from app import db
+
+        self.app = app
+        self.durability = app.config.get("MESSAGE_DURABILITY", self.durability)
+        self.flush_interval = app.config.get("STATUS_FLUSH_INTERVAL_MS", self.flush_interval * 1000) / 1000
+        self.max_pending = app.config.get("STATUS_FLUSH_MAX_EVENTS", self.max_pending)
+        self.retry_interval = app.config.get("STATUS_FLUSH_RETRY_MS", self.retry_interval * 1000) / 1000
+
+        if self.durability == "batched" and app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+            with app.app_context():
+                event.listen(db.engine, "connect", _sqlite_batched_pragmas)
+
+    # -------------------------
+    # ✍️ Recording
+    # -------------------------
+    def record(self, message_id, status):
+        if self.durability == "strict":
+            self._write({message_id: status})
+            return
+
+        with self._lock:
+            current = self._pending.get(message_id)
+            if current is None or _rank(status) >= _rank(current):
+                self._pending[message_id] = status
+            flush_now = len(self._pending) >= self.max_pending
+            schedule = not flush_now and not self._scheduled
+            if schedule:
+                self._scheduled = True
+
+        if flush_now:
+            self.flush()
+        elif schedule:
+            from app import socketio
+            socketio.start_background_task(self._flush_later)
+
+    def pending_status(self, message_id):
+        """The not-yet-flushed status for ``message_id``, if any."""
+        return self._pending.get(message_id)
+
+    # -------------------------
+    # 🚿 Flushing
+    # -------------------------
+    def _flush_later(self, delay=None):
+        from app import socketio
+
+        socketio.sleep(self.flush_interval if delay is None else delay)
+        with self._lock:
+            self._scheduled = False
+        with self.app.app_context():
+            self.flush()
+
+    def flush(self):
+        """Write the pending transitions. Returns False (and schedules a retry) if the commit failed."""
+        with self._lock:
+            pending = dict(self._pending)
+        if not pending:
+            return True
+
+        try:
+            self._write(pending)
+        except Exception as e:
+            logger.error(f"[STATUS] Flushing {len(pending)} status updates failed, retrying: {e}")
+            with self._lock:
+                retry = not self._scheduled
+                self._scheduled = True
+            if retry:
+                from app import socketio
+                socketio.start_background_task(self._flush_later, self.retry_interval)
+            return False
+
+        # Committed: drop what was written, unless a newer transition arrived meanwhile
+        with self._lock:
+            for message_id, status in pending.items():
+                if self._pending.get(message_id) == status:
+                    del self._pending[message_id]
+        return True
+
+    @staticmethod
+    def _write(pending):
+        from app import db
+        from app.models.message import Message
+
+        by_status = {}
+        for message_id, status in pending.items():
+            by_status.setdefault(status, []).append(message_id)
+
+        for status, ids in by_status.items():
+            query = Message.query.filter(Message.id.in_(ids))
+            if status != "read":
+                query = query.filter(Message.status != "read")  # Never downgrade a read receipt
+            query.update({"status": status}, synchronize_session=False)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def _sqlite_batched_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+status_batcher = MessageStatusBatcher()
@@ -0,0 +1,139 @@
+# app/services/thumbnail_service.py
+
+import io
+import struct
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+# Longest edge per rendition: sidebar/chat list, message bubble, full-screen preview
+THUMBNAIL_SIZES = {"list": 64, "bubble": 320, "preview": 1280}
+
+# Bundle plaintext: magic | count, then (name, offset, length) per rendition, then the JPEGs
+BUNDLE_MAGIC = b"MTPT"
+_BUNDLE_HEAD = struct.Struct(">4sB")
+_BUNDLE_ENTRY = struct.Struct(">16sII")
+
+
+# -------------------------------------
+# 🖼️ Rendering (one decode, every size)
+# -------------------------------------
+def render_thumbnails(image_file, sizes=None, quality=85):
+    """
+    Decode ``image_file`` once and return ``({name: jpeg_bytes}, (width, height))``.
+
+    ``draft()`` asks the JPEG decoder for the smallest DCT scale (1/2, 1/4, 1/8)
+    that still covers the largest rendition, so a 4000x3000 photo is never
+    decoded at full resolution. Smaller renditions are downscaled from the
+    next larger one rather than from the source.
+    """
+    sizes = sizes or THUMBNAIL_SIZES
+    img = Image.open(image_file)
+    original_size = img.size
+
+    largest = max(sizes.values())
+    img.draft("RGB", (largest, largest))
+    img = img.convert("RGB")
+
+    renditions = {}
+    for name, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+        img.thumbnail((edge, edge), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=quality)
+        renditions[name] = out.getvalue()
+    return renditions, original_size
+
+
+def pack_bundle(renditions):
+    names = list(renditions)
+    offset = _BUNDLE_HEAD.size + _BUNDLE_ENTRY.size * len(names)
+    head = [_BUNDLE_HEAD.pack(BUNDLE_MAGIC, len(names))]
+    for name in names:
+        head.append(_BUNDLE_ENTRY.pack(name.encode(), offset, len(renditions[name])))
+        offset += len(renditions[name])
+    return b"".join(head) + b"".join(renditions[name] for name in names)
+
+
+def unpack_bundle(data):
+    magic_bytes, count = _BUNDLE_HEAD.unpack_from(data)
+    if magic_bytes != BUNDLE_MAGIC:
+        raise ValueError("Not a thumbnail bundle")
+    renditions = {}
+    for i in range(count):
+        name, offset, length = _BUNDLE_ENTRY.unpack_from(data, _BUNDLE_HEAD.size + i * _BUNDLE_ENTRY.size)
+        renditions[name.rstrip(b"\0").decode()] = data[offset:offset + length]
+    return renditions
+
+
+# -------------------------------------
+# 🗂️ Served Thumbnail Cache
+# -------------------------------------
+class ThumbnailCache:
+    """
+    Byte-bounded LRU of decrypted renditions, keyed by ``(bundle_path, name)``.
+    Bundles are content-addressed, so a forwarded image shares its entries.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # (bundle_path, name) -> jpeg bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get("THUMBNAIL_CACHE_BYTES", self.max_bytes)
+
+    def get(self, bundle_path, name):
+        """Return the JPEG bytes of rendition ``name``, or None if the bundle has no such size."""
+        key = (bundle_path, name)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        from app.services.media_service import decrypt_file
+
+        bundle = decrypt_file(bundle_path, None)
+        if bundle is None:
+            return None
+        renditions = unpack_bundle(bundle)
+        for rendition, jpeg in renditions.items():
+            self._store((bundle_path, rendition), jpeg)
+        return renditions.get(name)
+
+    def _store(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def invalidate(self, bundle_path):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == bundle_path]:
+                self._bytes -= len(self._entries.pop(key))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,236 @@
+# app/services/upload_service.py
+
+import os
+import re
+import json
+import time
+import shutil
+import secrets
+import threading
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadSessionError(Exception):
+    """Rejected upload-session request; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# -------------------------------------
+# 🧩 Resumable Upload Sessions
+# -------------------------------------
+class UploadSessions:
+    """
+    Resumable uploads in the spirit of MTProto's ``upload.saveFilePart``: a
+    client opens a session for a file of known size, PUTs numbered parts in
+    any order (re-sending a part is harmless), then finalizes.
+
+    Every session is a directory under ``<MEDIA_FOLDER>/.sessions/<upload_id>``:
+
+      meta.json   sender, receiver, filename, size, part_size (written once)
+      data        the encrypted container at its final length; each part is
+                  encrypted at its own offset and written in place
+      parts/<n>   empty marker, created once part n is on disk
+
+    Finalize renames the directory to ``<upload_id>.sealing`` while the media
+    workers seal the container, so late parts and a second finalize miss it.
+    All state is on disk, so any worker can take any part. Sessions idle for
+    longer than ``ttl`` seconds are removed by a periodic sweep.
+    """
+
+    def __init__(self, ttl=86400, part_size=512 * 1024, max_part_size=512 * 1024,
+                 max_bytes=2 * 1024 ** 3, sweep_interval=600):
+        self.ttl = ttl
+        self.part_size = part_size
+        self.max_part_size = max_part_size
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+
+        self._stop = threading.Event()
+        self._sweeper = None
+
+    def init_app(self, app):
+        self.ttl = app.config.get("UPLOAD_SESSION_TTL", self.ttl)
+        self.part_size = app.config.get("UPLOAD_PART_SIZE", self.part_size)
+        self.max_part_size = app.config.get("UPLOAD_PART_MAX", self.max_part_size)
+        self.max_bytes = app.config.get("UPLOAD_MAX_BYTES", self.max_bytes)
+        self.sweep_interval = app.config.get("UPLOAD_SWEEP_INTERVAL", self.sweep_interval)
+        self.start_sweeper()
+
+    @property
+    def root(self):
+        from app.services import media_service
+        return os.path.join(media_service.MEDIA_FOLDER, ".sessions")
+
+    def _dir(self, upload_id):
+        if not _UPLOAD_ID.match(upload_id or ""):
+            raise UploadSessionError("Unknown upload", 404)
+        return os.path.join(self.root, upload_id)
+
+    # -------------------------
+    # 📂 Open & Inspect
+    # -------------------------
+    def open(self, sender_id, receiver_id, filename, size, part_size=None):
+        """Start a session. Returns its description (see ``describe``)."""
+        from app.services.media_service import create_media_object
+
+        part_size = part_size or self.part_size
+        # Like saveFilePart: parts are whole KiB (so AES-block aligned) and at most max_part_size
+        if part_size % 1024 or not 0 < part_size <= self.max_part_size:
+            raise UploadSessionError(f"part_size must be a multiple of 1024 up to {self.max_part_size}")
+        if not 0 < size <= self.max_bytes:
+            raise UploadSessionError(f"size must be between 1 and {self.max_bytes} bytes", 413)
+
+        upload_id = secrets.token_hex(16)
+        session_dir = os.path.join(self.root, upload_id)
+        os.makedirs(os.path.join(session_dir, "parts"))
+
+        meta = {
+            "upload_id": upload_id,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "filename": filename,
+            "size": size,
+            "part_size": part_size,
+            "parts": -(-size // part_size),
+        }
+        create_media_object(os.path.join(session_dir, "data"), size)
+        with open(os.path.join(session_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        return dict(meta, received=[], sealing=False)
+
+    def meta(self, upload_id):
+        try:
+            with open(os.path.join(self._dir(upload_id), "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadSessionError("Unknown upload", 404)
+
+    def received(self, upload_id):
+        try:
+            return sorted(int(name) for name in os.listdir(os.path.join(self._dir(upload_id), "parts")))
+        except FileNotFoundError:
+            raise UploadSessionError("Unknown upload", 404)
+
+    def describe(self, upload_id):
+        """
+        Session metadata plus the part numbers already stored (what a resuming
+        client skips). ``sealing`` is true between finalize and the message.
+        """
+        sealing_dir = self._dir(upload_id) + ".sealing"
+        try:
+            with open(os.path.join(sealing_dir, "meta.json")) as f:
+                meta = json.load(f)
+            return dict(meta, received=list(range(meta["parts"])), sealing=True)
+        except FileNotFoundError:
+            return dict(self.meta(upload_id), received=self.received(upload_id), sealing=False)
+
+    def part_length(self, meta, part):
+        if not 0 <= part < meta["parts"]:
+            raise UploadSessionError(f"part must be between 0 and {meta['parts'] - 1}")
+        return min(meta["part_size"], meta["size"] - part * meta["part_size"])
+
+    # -------------------------
+    # 📥 Parts
+    # -------------------------
+    def save_part(self, upload_id, part, stream, length):
+        """Encrypt part ``part`` (exactly ``length`` bytes of ``stream``) into the session's container."""
+        from app.services.media_service import write_media_part
+
+        meta = self.meta(upload_id)
+        expected = self.part_length(meta, part)
+        if length != expected:
+            raise UploadSessionError(f"part {part} must be exactly {expected} bytes")
+
+        session_dir = self._dir(upload_id)
+        try:
+            write_media_part(os.path.join(session_dir, "data"), part * meta["part_size"], stream, length)
+            # The marker only appears once the bytes are written; a part cut off midway is simply re-sent
+            open(os.path.join(session_dir, "parts", str(part)), "w").close()
+            os.utime(session_dir)  # Activity keeps the session away from the TTL sweep
+        except ValueError as e:
+            raise UploadSessionError(str(e))
+        except FileNotFoundError:
+            raise UploadSessionError("Unknown upload", 404)  # Finalized or swept meanwhile
+
+    # -------------------------
+    # ✅ Finalize
+    # -------------------------
+    def finalize(self, upload_id):
+        """
+        Claim a complete session for sealing. Returns ``(meta, data_path)``; the
+        caller seals ``data_path`` into the media store, then calls ``finish``
+        (or ``reopen`` if sealing failed).
+        """
+        session_dir = self._dir(upload_id)
+        meta = self.meta(upload_id)
+        missing = sorted(set(range(meta["parts"])) - set(self.received(upload_id)))
+        if missing:
+            raise UploadSessionError(f"Missing parts: {missing[:20]}", 409)
+
+        # Claim the session so a concurrent finalize (or a late part) cannot race the seal
+        sealing_dir = session_dir + ".sealing"
+        try:
+            os.rename(session_dir, sealing_dir)
+            os.utime(sealing_dir)
+        except FileNotFoundError:
+            raise UploadSessionError("Unknown upload", 404)
+        return meta, os.path.join(sealing_dir, "data")
+
+    def finish(self, upload_id):
+        """Drop a claimed session once its container is sealed (or no longer wanted)."""
+        shutil.rmtree(self._dir(upload_id) + ".sealing", ignore_errors=True)
+
+    def reopen(self, upload_id):
+        """Return a claimed session to its open state, so finalize can be retried."""
+        session_dir = self._dir(upload_id)
+        try:
+            os.rename(session_dir + ".sealing", session_dir)
+        except FileNotFoundError:
+            pass
+
+    def discard(self, upload_id):
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+    # -------------------------
+    # 🧹 TTL Sweep
+    # -------------------------
+    def sweep(self):
+        """Remove sessions idle for longer than ``ttl``. Returns the number removed."""
+        if not os.path.isdir(self.root):
+            return 0
+
+        cutoff = time.time() - self.ttl
+        removed = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def start_sweeper(self):
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="upload-session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except OSError as e:
+                print(f"[Upload Sweep Error]: {e}")
+            if self._stop.wait(self.sweep_interval):
+                return
+
+
+upload_sessions = UploadSessions()
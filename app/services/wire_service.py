@@ -0,0 +1,202 @@
+# app/services/wire_service.py
+
+import zlib
+import struct
+from datetime import datetime, timedelta
+
+# -------------------------------------
+# 📐 TL-Style Binary Envelopes
+# -------------------------------------
+# Message envelopes for sockets that negotiated "tl" at join, and MTProto
+# payloads for REST clients that send/accept TL_CONTENT_TYPE. Layout follows
+# MTProto's TL serialization: little-endian 32/64-bit integers, a 4-byte
+# constructor id (CRC32 of the schema line, as in the TL compiler), `bytes`
+# as a 1-byte length (or 0xFE + 3-byte length) padded to 4, and a `flags:#`
+# bitmask for optional fields. Socket.IO ships the result as a binary
+# attachment, so ciphertext never goes through hex or base64.
+WIRE_FORMATS = ("json", "tl")
+TL_CONTENT_TYPE = "application/vnd.mtproto.tl"
+
+
+def _constructor(schema):
+    return zlib.crc32(schema.encode()) & 0xFFFFFFFF
+
+
+CHAT_MESSAGE = _constructor(
+    "chatMessage flags:# secret:flags.0?true id:int from_id:int to_id:int date:long status:string text:string "
+    "media_type:flags.1?string file:flags.2?string thumbnail:flags.3?string = ChatMessage"
+)
+ENCRYPTED_MESSAGE = _constructor(
+    "encryptedMessage auth_key_id:bytes msg_key:int128 salt:long session_id:long msg_id:long seq_no:int "
+    "data:bytes = EncryptedMessage"
+)
+VECTOR = 0x1CB5C415  # TL's built-in vector#1cb5c415
+
+_HEAD = struct.Struct("<IIiiiq")        # constructor, flags, id, from_id, to_id, date (unix microseconds)
+_ENCRYPTED = struct.Struct("<I")
+_ENCRYPTED_TAIL = struct.Struct("<16s8s8sqI")  # msg_key, salt, session_id, msg_id, seq_no
+_VECTOR = struct.Struct("<Ii")
+
+_OPTIONAL = (("media_type", 1 << 1), ("file", 1 << 2), ("thumbnail", 1 << 3))
+_SECRET = 1 << 0
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def wire_room(user_id, wire_format):
+    """Per-format room next to ``user_{id}``: message events are encoded once per format, not per socket."""
+    return f"user_{user_id}:{wire_format}"
+
+
+def _pack_bytes(data):
+    if len(data) < 254:
+        head = bytes((len(data),))
+    else:
+        head = b"\xfe" + len(data).to_bytes(3, "little")
+    return head + data + b"\0" * (-(len(head) + len(data)) % 4)
+
+
+def _pack_string(text):
+    return _pack_bytes((text or "").encode("utf-8"))
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def bytes(self):
+        if self.offset >= len(self.data):
+            raise ValueError("TL bytes run past the end of the buffer")
+        length = self.data[self.offset]
+        start = self.offset + 1
+        if length == 254:
+            length = int.from_bytes(self.data[self.offset + 1:self.offset + 4], "little")
+            start = self.offset + 4
+        if start + length > len(self.data):
+            raise ValueError("TL bytes run past the end of the buffer")
+        self.offset = start + length + (-(start - self.offset + length) % 4)
+        return bytes(self.data[start:start + length])
+
+    def string(self):
+        return self.bytes().decode("utf-8")
+
+
+# -------------------------
+# 💬 chatMessage
+# -------------------------
+def _pack_message(payload):
+    flags = _SECRET if payload.get("chat_mode") == "secret" else 0
+    tail = []
+    for key, bit in _OPTIONAL:
+        if payload.get(key):
+            flags |= bit
+            tail.append(_pack_string(payload[key]))
+
+    date = (datetime.fromisoformat(payload["timestamp"]) - _EPOCH) // _MICROSECOND
+    return b"".join([
+        _HEAD.pack(CHAT_MESSAGE, flags, payload["id"], payload["from"], payload["to"], date),
+        _pack_string(payload.get("status")),
+        _pack_string(payload.get("text")),
+        *tail,
+    ])
+
+
+def encode_message(payload):
+    """A ``receive_message`` payload dict as a chatMessage."""
+    return _pack_message(payload)
+
+
+def encode_messages(payloads):
+    """A list of payload dicts as a Vector<ChatMessage> (``receive_messages``)."""
+    return _VECTOR.pack(VECTOR, len(payloads)) + b"".join(_pack_message(payload) for payload in payloads)
+
+
+def _unpack_message(reader):
+    constructor, flags, msg_id, from_id, to_id, date = reader.unpack(_HEAD)
+    if constructor != CHAT_MESSAGE:
+        raise ValueError(f"Expected chatMessage, got constructor {constructor:#010x}")
+
+    payload = {
+        "id": msg_id,
+        "from": from_id,
+        "to": to_id,
+        "timestamp": (_EPOCH + date * _MICROSECOND).isoformat(),
+        "status": reader.string(),
+        "text": reader.string(),
+        "chat_mode": "secret" if flags & _SECRET else "cloud",
+    }
+    for key, bit in _OPTIONAL:
+        if flags & bit:
+            payload[key] = reader.string()
+    return payload
+
+
+def decode_message(data):
+    return _unpack_message(_Reader(data))
+
+
+def decode_messages(data):
+    reader = _Reader(data)
+    constructor, count = reader.unpack(_VECTOR)
+    if constructor != VECTOR:
+        raise ValueError("Expected a vector")
+    return [_unpack_message(reader) for _ in range(count)]
+
+
+# -------------------------
+# 🔐 encryptedMessage (REST)
+# -------------------------
+def encode_encrypted(encrypted_data, msg_key, auth_key_id, salt, session_id, msg_id, seq_no):
+    """encrypt_message()'s tuple (hex strings as it returns them) as raw bytes."""
+    return b"".join([
+        _ENCRYPTED.pack(ENCRYPTED_MESSAGE),
+        _pack_bytes(bytes.fromhex(auth_key_id)),
+        _ENCRYPTED_TAIL.pack(bytes.fromhex(msg_key), bytes.fromhex(salt), bytes.fromhex(session_id),
+                             int(msg_id), seq_no),
+        _pack_bytes(encrypted_data),
+    ])
+
+
+def decode_encrypted(data):
+    """Inverse of encode_encrypted: ``(encrypted_data, msg_key, auth_key_id, salt, session_id, msg_id, seq_no)``."""
+    reader = _Reader(data)
+    constructor, = reader.unpack(_ENCRYPTED)
+    if constructor != ENCRYPTED_MESSAGE:
+        raise ValueError(f"Expected encryptedMessage, got constructor {constructor:#010x}")
+    auth_key_id = reader.bytes().hex()
+    msg_key, salt, session_id, msg_id, seq_no = reader.unpack(_ENCRYPTED_TAIL)
+    return reader.bytes(), msg_key.hex(), auth_key_id, salt.hex(), session_id.hex(), str(msg_id), seq_no
+
+
+# -------------------------
+# 📡 Socket Emits
+# -------------------------
+# Only the formats the user's live sockets negotiated (tracked by the presence registry,
+# so it spans workers) are encoded and emitted; offline users cost nothing.
+def emit_message(payload, user_id, event="receive_message"):
+    """Send one message payload to every socket of ``user_id``, in each socket's negotiated format."""
+    from app import socketio
+    from app.services.presence_service import presence
+
+    formats = presence.wire_formats(user_id)
+    if "json" in formats:
+        socketio.emit(event, payload, room=wire_room(user_id, "json"))
+    if "tl" in formats:
+        socketio.emit(event, encode_message(payload), room=wire_room(user_id, "tl"))
+
+
+def emit_messages(payloads, user_id, event="receive_messages"):
+    from app import socketio
+    from app.services.presence_service import presence
+
+    formats = presence.wire_formats(user_id)
+    if "json" in formats:
+        socketio.emit(event, {"messages": payloads}, room=wire_room(user_id, "json"))
+    if "tl" in formats:
+        socketio.emit(event, encode_messages(payloads), room=wire_room(user_id, "tl"))
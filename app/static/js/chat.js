@@ -5,10 +5,18 @@ const pendingMessages = {};
 const keyExchangeComplete = {}; 
 const seqNumbers = {};
 
-// Join user's private room on page load
+// Join user's private room on page load; message events come as binary TL envelopes (wire_format.js)
 const userId = localStorage.getItem("user_id");
+let wireFormat = "json";
+
+function joinRoom() {
+    socket.emit("join", { user_id: parseInt(userId), format: "tl" }, (ack) => {
+        wireFormat = (ack && ack.format) || "json";
+    });
+}
+
 if (userId) {
-    socket.emit("join", { user_id: parseInt(userId) });
+    joinRoom();
 }
 
 // Default chat mode (cloud or secret)
@@ -141,7 +149,7 @@ socket.on("receive_public_key", (data) => {
 });
 
 // Handle incoming message
-socket.on("receive_message", (data) => {
+function handleIncomingMessage(data) {
     const otherUserId = data.from == userId ? data.to : data.from;
 
     // ✅ Initialize sequence numbers for this user
@@ -204,6 +212,13 @@ socket.on("receive_message", (data) => {
             status: "✔✔"
         });
     }
+}
+
+socket.on("receive_message", (data) => handleIncomingMessage(decodeWireMessage(data)));
+
+// Messages stored while we were offline arrive in chunks on join
+socket.on("receive_messages", (batch) => {
+    decodeWireMessages(batch).messages.forEach(handleIncomingMessage);
 });
 
 // Handle message status update (✔, ✔✔, ✅)
@@ -311,6 +326,7 @@ function displayMessage(data, type) {
     });
 
     messageWrapper.classList.add("d-flex", "mb-2");
+    if (data.id) messageWrapper.dataset.msgId = data.id;
     messageWrapper.classList.add(type === "sent" ? "justify-content-end" : "justify-content-start");
 
     const bubble = document.createElement("div");
@@ -330,6 +346,12 @@ function displayMessage(data, type) {
         </div>
     `;
 
+    if (data.file) {
+        const textEl = bubble.querySelector(".message-text");
+        textEl.dataset.filename = data.text;
+        textEl.innerHTML = renderMedia(data);
+    }
+
     messageWrapper.appendChild(bubble);
     targetBox.appendChild(messageWrapper);
     targetBox.scrollTop = targetBox.scrollHeight;
@@ -345,36 +367,101 @@ function updateMessageStatus(messageId, status) {
     if (el) el.textContent = status;
 }
 
+// Files above this go through a resumable upload session; smaller ones in one request
+const RESUMABLE_UPLOAD_THRESHOLD = 4 * 1024 * 1024;
+const UPLOAD_PART_RETRIES = 5;
+
 // Send file
 function sendFile(input) {
     const file = input.files[0];
     if (!file) return;
 
+    if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+        sendFileResumable(file)
+            .catch((err) => console.error(`❌ Upload failed: ${err.message}`))
+            .finally(() => { input.value = ""; });
+        return;
+    }
+
+    // Ids go before the file so the server has them before the (streamed) file part
     const formData = new FormData();
-    formData.append("file", file);
     formData.append("sender_id", userId);
     formData.append("receiver_id", document.getElementById("receiverId").value);
+    formData.append("file", file);
 
+    // The server stores the message and emits receive_message (then media_processed) itself
     fetch("/chat/upload", {
         method: "POST",
         body: formData
     })
     .then((res) => res.json())
     .then((data) => {
-        socket.emit("send_message", {
+        if (data.error) console.error(`❌ Upload failed: ${data.error}`);
+        input.value = "";
+    });
+}
+
+// Resumable upload: open a session, PUT each part (retrying just that part on failure), finalize
+async function sendFileResumable(file) {
+    const res = await fetch("/chat/uploads", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
             sender_id: parseInt(userId),
-            receiver_id: parseInt(data.receiver_id),
-            text: data.filename,
-            media_type: data.media_type,
-            file_path: data.file_path,
-            thumbnail_path: data.thumbnail_path,
-            msg_id: generateMsgId(),
-            salt: generateSalt(),
-            session_id: getSessionId()
-        });
+            receiver_id: parseInt(document.getElementById("receiverId").value),
+            filename: file.name,
+            size: file.size
+        })
     });
+    const session = await res.json();
+    if (!res.ok) throw new Error(session.error);
+
+    const done = new Set(session.received);
+    for (let part = 0; part < session.parts; part++) {
+        if (done.has(part)) continue;
+        const blob = file.slice(part * session.part_size, (part + 1) * session.part_size);
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const put = await fetch(`/chat/uploads/${session.upload_id}/parts/${part}`, { method: "PUT", body: blob });
+                if (put.ok) break;
+                if (put.status < 500) throw new Error((await put.json()).error);
+            } catch (err) {
+                if (attempt >= UPLOAD_PART_RETRIES) throw err;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 500 * attempt));
+        }
+    }
+
+    // 202: the server stores the file in the background, then emits receive_message (and
+    // media_processed) like a single-shot upload, plus upload_finalized / upload_failed
+    const fin = await fetch(`/chat/uploads/${session.upload_id}/finalize`, { method: "POST" });
+    if (!fin.ok) throw new Error((await fin.json()).error);
+}
+
+socket.on("upload_failed", (data) => {
+    console.error(`❌ Upload ${data.upload_id} failed: ${data.error}`);
+});
+
+// Attachment link, plus the bubble-size thumbnail once the server has rendered it
+function renderMedia(data) {
+    const base = `/chat/media/${data.id}`;
+    const query = `user_id=${userId}`;
+    let html = `<a class="message-file d-block" href="${base}?${query}" target="_blank">📎 ${data.text}</a>`;
+    if (data.thumbnail) {
+        html = `<a href="${base}?${query}" target="_blank">
+                    <img class="message-thumbnail img-fluid rounded mb-1" src="${base}/thumbnail?size=bubble&${query}" alt="${data.text}">
+                </a>` + html;
+    }
+    return html;
 }
 
+// Thumbnails and the real media type arrive after the upload has been acknowledged
+socket.on("media_processed", (data) => {
+    const el = document.querySelector(`[data-msg-id="${data.message_id}"] .message-text`);
+    if (!el || !data.thumbnails.includes("bubble")) return;
+    el.innerHTML = renderMedia({ id: data.message_id, text: el.dataset.filename, thumbnail: true });
+});
+
 // Utility functions
 function generateMsgId() {
     return Date.now().toString() + Math.floor(Math.random() * 1000);
@@ -389,41 +476,47 @@ function getSessionId() {
 }
 
 // Load users in dropdown
-function loadUsers() {
-    fetch("/users")
-        .then(res => res.json())
-        .then(users => {
-            const currentUserId = localStorage.getItem("user_id");
-            const select = document.getElementById("receiverId");
-            select.innerHTML = "";
-
-            users.forEach(user => {
-                if (user.id == currentUserId) return;
-                const option = document.createElement("option");
-                option.value = user.id;
-                option.textContent = `${user.username} (ID: ${user.id})`;
-                select.appendChild(option);
-            });
+async function loadUsers() {
+    // /users is paged by id; follow X-Next-After-Id until the whole directory is in the picker
+    const users = [];
+    let afterId = null;
+    do {
+        const res = await fetch(afterId ? `/users?after_id=${afterId}` : "/users");
+        users.push(...await res.json());
+        afterId = res.headers.get("X-Next-After-Id");
+    } while (afterId);
+
+    const currentUserId = localStorage.getItem("user_id");
+    const select = document.getElementById("receiverId");
+    select.innerHTML = "";
+
+    users.forEach(user => {
+        if (user.id == currentUserId) return;
+        const option = document.createElement("option");
+        option.value = user.id;
+        option.textContent = `${user.username} (ID: ${user.id})`;
+        select.appendChild(option);
+    });
 
-            const savedId = localStorage.getItem("recipient_id");
-            if (savedId) {
-                select.value = savedId;
-            }
+    const savedId = localStorage.getItem("recipient_id");
+    if (savedId) {
+        select.value = savedId;
+    }
 
-            select.addEventListener("change", () => {
-                localStorage.setItem("recipient_id", select.value);
-            });
-        });
+    select.addEventListener("change", () => {
+        localStorage.setItem("recipient_id", select.value);
+    });
 }
 
-// Load sidebar chat list
-function loadChatList() {
+// Load sidebar chat list: partners first, then other users one page at a time ("Load more")
+function loadChatList(afterId = null) {
     const userId = localStorage.getItem("user_id");
-    fetch(`/chat/contacts/${userId}`)
-        .then(res => res.json())
-        .then(users => {
+    fetch(afterId ? `/chat/contacts/${userId}?after_id=${afterId}` : `/chat/contacts/${userId}`)
+        .then(res => res.json().then(users => ({ users, next: res.headers.get("X-Next-After-Id") })))
+        .then(({ users, next }) => {
             const chatList = document.getElementById("chatList");
-            chatList.innerHTML = "";
+            if (!afterId) chatList.innerHTML = "";
+            chatList.querySelector(".load-more")?.remove();
             users.forEach(user => {
                 const li = document.createElement("li");
                 li.className = "list-group-item list-group-item-action";
@@ -432,27 +525,73 @@ function loadChatList() {
                 li.onclick = () => openChatWith(user);
                 chatList.appendChild(li);
             });
+            if (next) {
+                const more = document.createElement("li");
+                more.className = "list-group-item list-group-item-action text-muted load-more";
+                more.textContent = "Load more…";
+                more.onclick = () => loadChatList(next);
+                chatList.appendChild(more);
+            }
+            subscribeSidebarPresence();
         });
 }
 
+// Presence: watch exactly the users in the sidebar; the server pushes transitions
+const presenceState = {}; // userId -> { online, last_seen }
+
+function subscribeSidebarPresence() {
+    const chatList = document.getElementById("chatList");
+    if (!chatList) return;
+    const ids = [...chatList.querySelectorAll("[data-user-id]")].map(li => parseInt(li.dataset.userId));
+    if (ids.length) socket.emit("subscribe_presence", { user_ids: ids });
+}
+
+function showPresence(userId) {
+    const state = presenceState[userId];
+    const li = document.querySelector(`#chatList [data-user-id="${userId}"]`);
+    if (li && state) li.classList.toggle("fw-bold", state.online);
+
+    const onlineBadge = document.getElementById("onlineStatus");
+    const offlineBadge = document.getElementById("offlineStatus");
+    if (state && onlineBadge && offlineBadge && document.getElementById("receiverId").value == userId) {
+        onlineBadge.style.display = state.online ? "inline-block" : "none";
+        offlineBadge.style.display = state.online ? "none" : "inline-block";
+        offlineBadge.title = state.last_seen ? `Last seen ${new Date(state.last_seen + "Z").toLocaleString()}` : "";
+    }
+}
+
+socket.on("presence", (data) => {
+    data.users.forEach(entry => {
+        presenceState[entry.user_id] = entry;
+        showPresence(entry.user_id);
+    });
+});
+
+// Socket.IO drops room membership with the old connection
+socket.on("connect", subscribeSidebarPresence);
+
 // Open a specific user chat
 function openChatWith(user) {
     document.getElementById("chatWith").innerText = `Chatting with: ${user.username}`;
     document.getElementById("receiverId").value = user.id;
     localStorage.setItem("recipient_id", user.id);
 
-    // ✅ Safe toggle for online/offline status badges
-    fetch(`/status/${user.id}`)
-        .then(res => res.json())
-        .then(data => {
-            const onlineBadge = document.getElementById("onlineStatus");
-            const offlineBadge = document.getElementById("offlineStatus");
+    // ✅ Online/offline badges: pushed state for sidebar users, /status only as a fallback
+    if (presenceState[user.id]) {
+        showPresence(user.id);
+    } else {
+        fetch(`/status/${user.id}`)
+            .then(res => res.json())
+            .then(data => {
+                const onlineBadge = document.getElementById("onlineStatus");
+                const offlineBadge = document.getElementById("offlineStatus");
 
-            if (onlineBadge && offlineBadge) {
-                onlineBadge.style.display = data.status === "online" ? "inline-block" : "none";
-                offlineBadge.style.display = data.status === "online" ? "none" : "inline-block";
-            }
-        });
+                if (onlineBadge && offlineBadge) {
+                    onlineBadge.style.display = data.status === "online" ? "inline-block" : "none";
+                    offlineBadge.style.display = data.status === "online" ? "none" : "inline-block";
+                }
+            });
+    }
 
     // ✅ Load chat history for the current user
     loadChatHistory(user.id);
@@ -484,14 +623,13 @@ function loadChatHistory(withUserId) {
         cloudBox.innerHTML = "";
     }
 
-    fetch(`/chat/messages/${myId}`)
+    // Newest page of this one conversation, oldest first (deleted-for-me messages are already left out)
+    fetch(`/chat/conversations/${myId}/${withUserId}/messages`)
         .then(res => res.json())
         .then(messages => {
             messages.forEach(msg => {
-                if ((msg.from == myId && msg.to == withUserId) || (msg.from == withUserId && msg.to == myId)) {
-                    const type = msg.from == myId ? "sent" : "received";
-                    displayMessage(msg, type);
-                }
+                const type = msg.from == myId ? "sent" : "received";
+                displayMessage(msg, type);
             });
         });
 }
@@ -500,7 +638,7 @@ function loadChatHistory(withUserId) {
 window.onload = () => {
     const userId = localStorage.getItem("user_id");
     if (userId) {
-        socket.emit("join", { user_id: parseInt(userId) });
+        joinRoom();
         loadChatList();
 
         // ✅ Clear both chat boxes
@@ -516,13 +654,17 @@ window.onload = () => {
     }
 };
 
-// Typing indicator
+// Typing indicator (the server relays at most one event per 2s per conversation, so don't send more)
 const messageInput = document.getElementById("messageInput");
+const TYPING_SEND_INTERVAL = 2000;
+let lastTypingSent = 0;
 messageInput.addEventListener("input", () => {
     const receiverId = document.getElementById("receiverId").value;
     const senderId = localStorage.getItem("user_id");
+    const now = Date.now();
 
-    if (receiverId && senderId) {
+    if (receiverId && senderId && now - lastTypingSent >= TYPING_SEND_INTERVAL) {
+        lastTypingSent = now;
         socket.emit("typing", {
             from: parseInt(senderId),
             to: parseInt(receiverId)
@@ -543,7 +685,7 @@ socket.on("typing", (data) => {
         clearTimeout(typingTimeout);
         typingTimeout = setTimeout(() => {
             status.style.display = "none";
-        }, 2000);
+        }, 3000);  // Outlives the relay interval so the indicator doesn't flicker
     }
 });
 
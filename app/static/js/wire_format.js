@@ -0,0 +1,81 @@
+// Decoder for the TL-style binary message envelopes (app/services/wire_service.py).
+// Sockets that join with format "tl" receive receive_message / receive_messages
+// as binary attachments (ArrayBuffer) instead of JSON objects.
+
+const TL_CHAT_MESSAGE = 0x25e60620;
+const TL_VECTOR = 0x1cb5c415;
+const TL_FLAG_SECRET = 1 << 0;
+const TL_OPTIONAL = [["media_type", 1 << 1], ["file", 1 << 2], ["thumbnail", 1 << 3]];
+
+const tlTextDecoder = new TextDecoder();
+
+class TLReader {
+    constructor(data) {
+        this.bytes = data instanceof ArrayBuffer
+            ? new Uint8Array(data)
+            : new Uint8Array(data.buffer, data.byteOffset, data.byteLength);
+        this.view = new DataView(this.bytes.buffer, this.bytes.byteOffset, this.bytes.byteLength);
+        this.offset = 0;
+    }
+
+    uint32() { const v = this.view.getUint32(this.offset, true); this.offset += 4; return v; }
+    int32() { const v = this.view.getInt32(this.offset, true); this.offset += 4; return v; }
+    int64() { const v = this.view.getBigInt64(this.offset, true); this.offset += 8; return v; }
+
+    // TL bytes: 1-byte length (or 0xFE + 3-byte length), padded to a multiple of 4
+    string() {
+        let length = this.bytes[this.offset];
+        let start = this.offset + 1;
+        if (length === 254) {
+            length = this.bytes[this.offset + 1] | (this.bytes[this.offset + 2] << 8) | (this.bytes[this.offset + 3] << 16);
+            start = this.offset + 4;
+        }
+        const text = tlTextDecoder.decode(this.bytes.subarray(start, start + length));
+        this.offset = start + length + ((4 - ((start - this.offset + length) % 4)) % 4);
+        return text;
+    }
+}
+
+// Microseconds since the epoch (UTC) -> the same naive ISO string the JSON format carries
+// (datetime.isoformat(): full microseconds, no fraction at all when they are zero)
+function isoFromMicros(micros) {
+    const fraction = Number(micros % 1000000n);
+    const seconds = new Date(Number(micros / 1000000n) * 1000).toISOString().slice(0, 19);
+    return fraction ? `${seconds}.${String(fraction).padStart(6, "0")}` : seconds;
+}
+
+function readChatMessage(reader) {
+    const constructor = reader.uint32();
+    if (constructor !== TL_CHAT_MESSAGE) throw new Error(`Unexpected TL constructor ${constructor.toString(16)}`);
+
+    const flags = reader.uint32();
+    const msg = { id: reader.int32(), from: reader.int32(), to: reader.int32() };
+    msg.timestamp = isoFromMicros(reader.int64());
+    msg.status = reader.string();
+    msg.text = reader.string();
+    msg.chat_mode = flags & TL_FLAG_SECRET ? "secret" : "cloud";
+    TL_OPTIONAL.forEach(([key, bit]) => {
+        if (flags & bit) msg[key] = reader.string();
+    });
+    return msg;
+}
+
+function isBinaryFrame(data) {
+    return data instanceof ArrayBuffer || ArrayBuffer.isView(data);
+}
+
+// receive_message: a chatMessage, or the JSON object for "json" sockets
+function decodeWireMessage(data) {
+    return isBinaryFrame(data) ? readChatMessage(new TLReader(data)) : data;
+}
+
+// receive_messages: a Vector<ChatMessage>, or { messages: [...] } for "json" sockets
+function decodeWireMessages(data) {
+    if (!isBinaryFrame(data)) return data;
+    const reader = new TLReader(data);
+    if (reader.uint32() !== TL_VECTOR) throw new Error("Expected a TL vector");
+    const count = reader.int32();
+    const messages = [];
+    for (let i = 0; i < count; i++) messages.push(readChatMessage(reader));
+    return { messages };
+}
@@ -0,0 +1,97 @@
+# benchmarks/bench_contacts.py
+#
+# /chat/contacts/<id> latency and SQL statement count: the previous
+# implementation (full history scan, User.query.get per partner, every other
+# user loaded) vs. the aggregate query with a paginated tail.
+#
+#   python benchmarks/bench_contacts.py [--messages 1000000] [--users 10000]
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from bench_indexes import build_app, seed
+
+
+def legacy_get_contacts(user_id):
+    """The pre-aggregate implementation, minus jsonify."""
+    from app.models.user import User
+    from app.models.message import Message
+
+    messages = Message.query.filter(
+        (Message.sender_id == user_id) | (Message.receiver_id == user_id)
+    ).order_by(Message.timestamp.desc()).all()
+
+    seen = set()
+    ordered_contacts = []
+    for msg in messages:
+        other_id = msg.receiver_id if msg.sender_id == user_id else msg.sender_id
+        if other_id != user_id and other_id not in seen:
+            user = User.query.get(other_id)
+            if user:
+                ordered_contacts.append({"id": user.id, "username": user.username or user.email or user.phone})
+                seen.add(other_id)
+
+    for u in User.query.filter(User.id != user_id).all():
+        if u.id not in seen:
+            ordered_contacts.append({"id": u.id, "username": u.username or u.email or u.phone})
+    return ordered_contacts
+
+
+def measure(label, fn, user_ids, engine):
+    statements = [0]
+
+    def count(*_):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    start = time.perf_counter()
+    for user_id in user_ids:
+        fn(user_id)
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "before_cursor_execute", count)
+
+    print(f"{label:<8} {elapsed * 1000 / len(user_ids):10.1f} ms/request {statements[0] / len(user_ids):10.1f} queries/request")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        app = build_app(db_path)
+
+        from app import db
+        with app.app_context():
+            db.create_all()
+
+        print(f"seeding {args.users} users / {args.messages} messages...")
+        seed(db_path, args.users, args.messages)
+
+        user_ids = random.Random(3).sample(range(1, args.users + 1), args.requests)
+        client = app.test_client()
+
+        with app.app_context():
+            db.session.execute(db.text("ANALYZE"))
+            measure("before", legacy_get_contacts, user_ids, db.engine)
+            db.session.remove()
+
+            def current(user_id):
+                assert client.get(f"/chat/contacts/{user_id}").status_code == 200
+
+            measure("after", current, user_ids, db.engine)
+
+
+if __name__ == "__main__":
+    main()
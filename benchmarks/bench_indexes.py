@@ -0,0 +1,141 @@
+# benchmarks/bench_indexes.py
+#
+# Query latency for the hot users/messages lookups on a seeded SQLite
+# database, without and then with the indexes declared in the models
+# (migration 7c3e9a1f52d4).
+#
+#   python benchmarks/bench_indexes.py [--messages 1000000] [--users 1000]
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_app(db_path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("MESSAGE_DURABILITY", "strict")  # Keep WAL off so seed() can switch journal modes
+    from app import create_app
+    return create_app()
+
+
+def seed(db_path, users, messages):
+    rng = random.Random(588)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA journal_mode=MEMORY")
+
+    conn.executemany(
+        "INSERT INTO users (id, username, password_hash, auth_key, auth_key_id) VALUES (?, ?, 'x', ?, ?)",
+        ((i, f"user{i}", os.urandom(32), os.urandom(32).hex()) for i in range(1, users + 1)),
+    )
+
+    start = datetime(2025, 1, 1)
+    statuses = ("read", "read", "read", "delivered", "sent")
+
+    def rows():
+        for i in range(1, messages + 1):
+            sender = rng.randint(1, users)
+            receiver = rng.randint(1, users - 1)
+            receiver += receiver >= sender
+            yield (i, sender, receiver, b"x" * 64, rng.choice(statuses),
+                   (start + timedelta(seconds=i * 3)).isoformat(sep=" "))
+
+    conn.executemany(
+        "INSERT INTO messages (id, sender_id, receiver_id, encrypted_data, status, timestamp, "
+        "visible_to_sender, visible_to_receiver, retry_count) VALUES (?, ?, ?, ?, ?, ?, 1, 1, 0)",
+        rows(),
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(label, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return label, (time.perf_counter() - start) * 1000 / repeat
+
+
+def run_queries(app, users, repeat):
+    from app import db
+    from app.models.user import User
+    from app.models.message import Message
+
+    rng = random.Random(7)
+    with app.app_context():
+        key_ids = [row[0] for row in db.session.query(User.auth_key_id).limit(200)]
+
+        def by_auth_key_id():
+            db.session.query(User.auth_key).filter_by(auth_key_id=rng.choice(key_ids)).first()
+
+        def history():
+            uid = rng.randint(1, users)
+            Message.query.filter(
+                (Message.sender_id == uid) | (Message.receiver_id == uid)
+            ).order_by(Message.timestamp.desc()).limit(50).all()
+
+        def pending():
+            Message.query.filter_by(receiver_id=rng.randint(1, users), status="sent").all()
+
+        def pair():
+            a, b = rng.sample(range(1, users + 1), 2)
+            Message.query.filter(
+                ((Message.sender_id == a) & (Message.receiver_id == b)) |
+                ((Message.receiver_id == a) & (Message.sender_id == b))
+            ).all()
+
+        results = [
+            timed("users by auth_key_id", by_auth_key_id, repeat),
+            timed("history page (OR + ORDER BY)", history, repeat),
+            timed("pending delivery on join", pending, repeat),
+            timed("conversation pair (delete_chat)", pair, repeat),
+        ]
+        db.session.remove()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        app = build_app(db_path)
+
+        from app import db
+        with app.app_context():
+            db.create_all()
+            indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+            for index in indexes:
+                index.drop(db.engine)
+
+        print(f"seeding {args.users} users / {args.messages} messages...")
+        seed(db_path, args.users, args.messages)
+
+        before = run_queries(app, args.users, args.repeat)
+
+        with app.app_context():
+            for index in indexes:
+                index.create(db.engine)
+            db.session.execute(db.text("ANALYZE"))
+            db.session.commit()
+
+        after = run_queries(app, args.users, args.repeat)
+
+        print(f"{'query':<34} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+        for (label, b), (_, a) in zip(before, after):
+            print(f"{label:<34} {b:>10.2f} {a:>10.2f} {b / a:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
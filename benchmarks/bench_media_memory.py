@@ -0,0 +1,96 @@
+# benchmarks/bench_media_memory.py
+#
+# Peak Python heap (tracemalloc) while encrypting and decrypting one upload:
+# the previous whole-buffer implementation (file.read() + ljust NUL padding +
+# one CBC call, then read + decrypt + rstrip) vs. the segmented streaming
+# container. The upload is served from a file on disk through a Werkzeug
+# FileStorage, as it would be for a spooled multipart upload.
+#
+#   python benchmarks/bench_media_memory.py [--size-mb 16]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from werkzeug.datastructures import FileStorage
+
+
+def legacy_encrypt(file, user, file_path):
+    from app.services import media_service
+
+    file_data = file.read()
+    msg_key = get_random_bytes(16)
+    aes_key, aes_iv = media_service._media_keys(user, msg_key)
+    cipher = AES.new(aes_key, AES.MODE_CBC, aes_iv[:16])
+    encrypted_data = cipher.encrypt(file_data.ljust((len(file_data) + 15) // 16 * 16, b"\0"))
+    with open(file_path, "wb") as f:
+        f.write(encrypted_data)
+    return msg_key
+
+
+def legacy_decrypt(file_path, user, msg_key):
+    from app.services import media_service
+
+    with open(file_path, "rb") as f:
+        encrypted_data = f.read()
+    aes_key, aes_iv = media_service._media_keys(user, msg_key)
+    return AES.new(aes_key, AES.MODE_CBC, aes_iv[:16]).decrypt(encrypted_data).rstrip(b"\0")
+
+
+def profile(label, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<18} {peak / 2 ** 20:8.2f} MiB peak {elapsed * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=16)
+    args = parser.parse_args()
+
+    os.environ["CRYPTO_TRACE_ENABLED"] = "false"
+    from app.services import media_service
+
+    with tempfile.TemporaryDirectory() as tmp:
+        media_service.MEDIA_FOLDER = tmp
+        source = os.path.join(tmp, "source.bin")
+        with open(source, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(2 ** 20))
+
+        user = SimpleNamespace(username="bench", email=None, phone=None, auth_key=get_random_bytes(256))
+        print(f"{args.size_mb} MiB upload, {media_service.MEDIA_SEGMENT_SIZE // 1024} KiB segments")
+
+        with open(source, "rb") as stream:
+            upload = FileStorage(stream, filename="clip.mp4")
+            legacy_path = os.path.join(tmp, "legacy.bin")
+            msg_key = []
+            profile("before encrypt", lambda: msg_key.append(legacy_encrypt(upload, user, legacy_path)))
+        profile("before decrypt", lambda: legacy_decrypt(legacy_path, user, msg_key[0]))
+
+        with open(source, "rb") as stream:
+            upload = FileStorage(stream, filename="clip.mp4")
+            paths = []
+            profile("after encrypt", lambda: paths.append(media_service.encrypt_and_save_file(upload, user)[0]))
+
+        def stream_out():
+            for _ in media_service.iter_decrypted_file(paths[0], user):
+                pass
+
+        profile("after decrypt", stream_out)
+
+
+if __name__ == "__main__":
+    main()
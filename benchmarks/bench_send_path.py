@@ -0,0 +1,78 @@
+# benchmarks/bench_send_path.py
+#
+# Per-message CPU time and wall latency of the cloud send_message handler.
+# "before" forces the old behaviour (decrypt every message right after
+# encrypting it, CLOUD_SEND_VERIFY_RATE=1.0); "after" carries the plaintext
+# forward (CLOUD_SEND_VERIFY_RATE=0.0).
+#
+#   python benchmarks/bench_send_path.py [--messages 2000] [--size 256]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(app, socketio, label, messages, text):
+    sender = socketio.test_client(app)
+    receiver = socketio.test_client(app)
+    sender.emit("join", {"user_id": 1})
+    receiver.emit("join", {"user_id": 2})
+    sender.get_received()
+    receiver.get_received()
+
+    payload = {"sender_id": 1, "receiver_id": 2, "text": text, "chat_mode": "cloud"}
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(messages):
+        start = time.perf_counter()
+        sender.emit("send_message", payload)
+        latencies.append(time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    sender.disconnect()
+    receiver.disconnect()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{label:<8} {cpu * 1000 / messages:8.3f} ms CPU/msg {p50:8.3f} ms p50 {p99:8.3f} ms p99 "
+          f"{messages / wall:8.0f} msg/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=256, help="plaintext length in characters")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["CRYPTO_TRACE_LEVEL"] = "INFO"
+
+        from app import create_app, db, socketio
+        from app.models.user import User
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            for name in ("sender", "receiver"):
+                user = User(username=name, email=f"{name}@bench", phone=name)
+                user.set_password("bench")
+                db.session.add(user)
+            db.session.commit()
+
+        text = "x" * args.size
+        for label, rate in (("before", 1.0), ("after", 0.0)):
+            app.config["CLOUD_SEND_VERIFY_RATE"] = rate
+            run(app, socketio, label, args.messages, text)
+
+
+if __name__ == "__main__":
+    main()
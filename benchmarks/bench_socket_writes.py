@@ -0,0 +1,80 @@
+# benchmarks/bench_socket_writes.py
+#
+# Socket write throughput on the default SQLite deployment: each round is a
+# cloud send_message to an online receiver followed by the receiver's
+# message_status and mark_read events. Runs once per MESSAGE_DURABILITY mode
+# in a fresh process (the SQLite pragmas are applied at connect time).
+#
+#   python benchmarks/bench_socket_writes.py [--messages 1000]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def worker(messages):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["CRYPTO_TRACE_ENABLED"] = "false"
+
+        from app import create_app, db, socketio
+        from app.models.user import User
+        from app.services.status_service import status_batcher
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            for name in ("sender", "receiver"):
+                user = User(username=name, email=f"{name}@bench", phone=name)
+                user.set_password("bench")
+                db.session.add(user)
+            db.session.commit()
+
+        sender = socketio.test_client(app)
+        receiver = socketio.test_client(app)
+        sender.emit("join", {"user_id": 1})
+        receiver.emit("join", {"user_id": 2})
+
+        payload = {"sender_id": 1, "receiver_id": 2, "text": "benchmark message", "chat_mode": "cloud"}
+        start = time.perf_counter()
+        for _ in range(messages):
+            sender.emit("send_message", payload)
+            message_id = receiver.get_received()[-1]["args"][0]["id"]
+            receiver.emit("message_status", {"message_id": message_id, "status": "✔✔"})
+            receiver.emit("mark_read", {"message_id": message_id})
+            sender.get_received()
+        with app.app_context():
+            status_batcher.flush()
+        elapsed = time.perf_counter() - start
+
+        print(f"{app.config['MESSAGE_DURABILITY']:<8} {messages / elapsed:8.0f} msg/s "
+              f"({elapsed * 1000 / messages:.2f} ms per send + 2 status events)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.messages)
+        return
+
+    for mode in ("strict", "batched"):
+        env = dict(os.environ, MESSAGE_DURABILITY=mode)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", "--messages", str(args.messages)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
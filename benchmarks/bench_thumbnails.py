@@ -0,0 +1,112 @@
+# benchmarks/bench_thumbnails.py
+#
+# Decode time and peak RSS for producing the list/bubble/preview thumbnails
+# of a 4000x3000 JPEG:
+#   full       decode at full resolution, then downscale each size
+#   per-size   one Image.open + thumbnail() per size (generate_thumbnail x3)
+#   one-pass   thumbnail_service.render_thumbnails (draft() + one decode)
+# Each mode runs in a fresh process so ru_maxrss is not shared between them.
+#
+#   python benchmarks/bench_thumbnails.py [--images 5]
+
+import io
+import os
+import sys
+import glob
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+MODES = ("full", "per-size", "one-pass")
+
+
+def make_jpeg(seed):
+    # Noise over a gradient: compresses like a photo rather than a flat fill
+    base = Image.linear_gradient("L").resize((4000, 3000))
+    noise = Image.effect_noise((4000, 3000), 40 + seed)
+    img = Image.merge("RGB", (base, noise, Image.blend(base, noise, 0.5)))
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def full_decode(data, sizes):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    result = {}
+    for name, edge in sizes.items():
+        thumb = img.resize((edge, edge * img.height // img.width), Image.LANCZOS)
+        out = io.BytesIO()
+        thumb.save(out, "JPEG", quality=85)
+        result[name] = out.getvalue()
+    return result
+
+
+def per_size(data, sizes):
+    result = {}
+    for name, edge in sizes.items():
+        img = Image.open(io.BytesIO(data))
+        img.thumbnail((edge, edge))
+        out = io.BytesIO()
+        img.convert("RGB").save(out, "JPEG", quality=85)
+        result[name] = out.getvalue()
+    return result
+
+
+def worker(mode, folder):
+    from app.services.thumbnail_service import THUMBNAIL_SIZES, render_thumbnails
+
+    fn = {
+        "full": full_decode,
+        "per-size": per_size,
+        "one-pass": lambda data, sizes: render_thumbnails(io.BytesIO(data), sizes)[0],
+    }[mode]
+
+    jpegs = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.jpg"))):
+        with open(path, "rb") as f:
+            jpegs.append(f.read())
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    for data in jpegs:
+        fn(data, THUMBNAIL_SIZES)
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(f"{mode:<10} {elapsed * 1000 / len(jpegs):8.1f} ms/image {peak / 1024:8.1f} MiB peak RSS above baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--folder", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.folder)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Sources are written here so generating them does not inflate the workers' RSS
+        for i in range(args.images):
+            with open(os.path.join(tmp, f"{i:03}.jpg"), "wb") as f:
+                f.write(make_jpeg(i))
+
+        print(f"{args.images} x 4000x3000 JPEG -> list/bubble/preview")
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", mode, "--folder", tmp],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
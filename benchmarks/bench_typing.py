@@ -0,0 +1,107 @@
+# benchmarks/bench_typing.py
+#
+# Socket load test for the typing indicator: --pairs conversations type for
+# --seconds at --rate keystroke events per second each (half the receivers
+# are offline). Reports SQL statements issued and events relayed for the
+# previous handler (User.query.get + emit on every keystroke) and the
+# current throttled relay.
+#
+#   python benchmarks/bench_typing.py [--pairs 50] [--rate 8] [--seconds 5]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+
+def legacy_typing(data):
+    """The pre-throttle handler, registered as typing_legacy."""
+    from flask_socketio import emit
+    from app.models.user import User
+
+    sender = data.get("from")
+    receiver = data.get("to")
+    user = User.query.get(sender)
+    if user:
+        emit("typing", {"from": sender, "username": user.username or user.email or "Someone"}, room=f"user_{receiver}")
+
+
+def run(app, socketio, label, event_name, pairs, rate, seconds):
+    from app import db
+
+    senders, receivers = [], []
+    for i in range(pairs):
+        sender = socketio.test_client(app)
+        sender.emit("join", {"user_id": 2 * i + 1})
+        senders.append(sender)
+        if i % 2 == 0:  # Odd pairs type at someone who is offline
+            receiver = socketio.test_client(app)
+            receiver.emit("join", {"user_id": 2 * i + 2})
+            receivers.append(receiver)
+    for client in senders + receivers:
+        client.get_received()
+
+    statements = [0]
+
+    def count(*_):
+        statements[0] += 1
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", count)
+
+    # Simulated clock: keystrokes are spread evenly over `seconds`
+    total = pairs * rate * seconds
+    start = time.perf_counter()
+    for tick in range(rate * seconds):
+        for i, sender in enumerate(senders):
+            sender.emit(event_name, {"from": 2 * i + 1, "to": 2 * i + 2})
+        time.sleep(max(0.0, (tick + 1) / rate - (time.perf_counter() - start)))
+    elapsed = time.perf_counter() - start
+
+    relayed = sum(1 for receiver in receivers for e in receiver.get_received() if e["name"] == "typing")
+    with app.app_context():
+        event.remove(db.engine, "before_cursor_execute", count)
+    for client in senders + receivers:
+        client.disconnect()
+
+    print(f"{label:<8} {total:6d} keystrokes {statements[0]:6d} SQL statements {relayed:6d} relayed "
+          f"({total / elapsed:7.0f} events/s handled)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--rate", type=int, default=8, help="keystroke events per second per sender")
+    parser.add_argument("--seconds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["CRYPTO_TRACE_ENABLED"] = "false"
+        os.environ["PRESENCE_FLUSH_INTERVAL"] = "3600"  # Keep presence writes out of the count
+
+        from app import create_app, db, socketio
+        from app.models.user import User
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            for i in range(1, 2 * args.pairs + 1):
+                user = User(username=f"user{i}", email=f"user{i}@bench", phone=str(i))
+                user.set_password("bench")
+                db.session.add(user)
+            db.session.commit()
+
+        socketio.on_event("typing_legacy", legacy_typing)
+        run(app, socketio, "before", "typing_legacy", args.pairs, args.rate, args.seconds)
+        run(app, socketio, "after", "typing", args.pairs, args.rate, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/bench_upload.py
+#
+# Concurrent multipart uploads against a real (threaded Werkzeug) server:
+#   form       request.files + encrypt_and_save_file, i.e. Werkzeug's default
+#              form parser, which spools each file part to a temp file first
+#   streaming  POST /chat/upload (incremental multipart decoder -> MediaWriter,
+#              plus the Message row and media hand-off)
+# The server runs in a fresh process per mode and reports its peak RSS above
+# idle (sampled from /proc every 10 ms) and the bytes it wrote (/proc/self/io
+# wchar: the temp spool plus the stored objects). The client streams the
+# bodies so it holds none of them. Linux only.
+#
+#   python benchmarks/bench_upload.py [--size-mb 10] [--uploads 32] [--concurrency 8]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {"form": "/bench/upload_form", "streaming": "/chat/upload"}
+BOUNDARY = "----bench-upload-boundary"
+BLOCK = os.urandom(1024 * 1024)
+
+
+def legacy_upload():
+    """The conventional Flask upload handler: parse the form, then encrypt the spooled file."""
+    from flask import request, jsonify
+    from app.services.media_service import encrypt_and_save_file
+
+    file_path, error = encrypt_and_save_file(request.files["file"], None)
+    return jsonify({"file": file_path, "error": error})
+
+
+def _rss_mib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+
+def _written_mib():
+    with open("/proc/self/io") as f:
+        for line in f:
+            if line.startswith("wchar:"):
+                return int(line.split()[1]) / 2 ** 20
+
+
+def worker(mode):
+    # The routes print to stdout; keep the real one for the port and the result
+    out, sys.stdout = sys.stdout, sys.stderr
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["CRYPTO_TRACE_ENABLED"] = "false"
+    os.environ["MEDIA_WORKERS"] = "0"  # Uploads are .zip; processing is an 8 KiB sniff
+    os.environ["MESSAGE_DURABILITY"] = "strict"
+
+    from werkzeug.serving import make_server
+    from app import create_app, db
+    from app.models.user import User
+
+    app = create_app()
+    app.config["MAX_CONTENT_LENGTH"] = None
+    app.add_url_rule(MODES["form"], "bench_upload_form", legacy_upload, methods=["POST"])
+    with app.app_context():
+        db.create_all()
+        for name in ("alice", "bob"):
+            user = User(username=name, email=f"{name}@bench", phone=name)
+            user.set_password("bench")
+            db.session.add(user)
+        db.session.commit()
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    idle, written, peak = _rss_mib(), _written_mib(), [0.0]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.01):
+            peak[0] = max(peak[0], _rss_mib())
+
+    threading.Thread(target=sample, daemon=True).start()
+    print(server.server_port, file=out, flush=True)
+
+    sys.stdin.readline()  # Parent is done
+    done.set()
+    server.shutdown()
+    print(f"{peak[0] - idle:.1f} {_written_mib() - written:.1f}", file=out, flush=True)
+
+
+def body_parts(index, size_mb):
+    head = (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"sender_id\"\r\n\r\n1\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"receiver_id\"\r\n\r\n2\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"upload{index}.zip\"\r\n"
+        f"Content-Type: application/zip\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+    prefix = index.to_bytes(8, "big")  # Distinct content, so the store cannot dedup the work away
+    length = len(head) + len(prefix) + size_mb * len(BLOCK) + len(tail)
+
+    def generate():
+        yield head
+        yield prefix
+        for _ in range(size_mb):
+            yield BLOCK
+        yield tail
+
+    return length, generate()
+
+
+def upload(port, path, index, size_mb):
+    length, body = body_parts(index, size_mb)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    conn.request("POST", path, body=body, headers={
+        "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+        "Content-Length": str(length),
+    })
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    if response.status >= 400:
+        raise RuntimeError(f"{path} answered {response.status}")
+
+
+def run(mode, size_mb, uploads, concurrency):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--worker", mode],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    port = int(proc.stdout.readline())
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda i: upload(port, MODES[mode], i, size_mb), range(uploads)))
+    elapsed = time.perf_counter() - start
+
+    proc.stdin.write("done\n")
+    proc.stdin.flush()
+    peak, written = map(float, proc.stdout.readline().split())
+    proc.wait()
+    print(f"{mode:<10} {uploads * size_mb / elapsed:8.1f} MiB/s {uploads / elapsed:6.2f} uploads/s "
+          f"{peak:8.1f} MiB peak RSS above idle {written:8.0f} MiB written")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=10)
+    parser.add_argument("--uploads", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker)
+        return
+
+    print(f"{args.uploads} x {args.size_mb} MiB uploads, {args.concurrency} concurrent")
+    for mode in MODES:
+        run(mode, args.size_mb, args.uploads, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
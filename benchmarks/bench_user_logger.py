@@ -0,0 +1,85 @@
+# benchmarks/bench_user_logger.py
+#
+# Per-message logger overhead: the old get_user_logger (scan logs/, stat every
+# file, rebuild the FileHandler) vs. the cached UserLoggerRegistry.
+#
+#   python benchmarks/bench_user_logger.py [--messages 5000] [--users 20] [--stale-files 200]
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.logging_service import UserLoggerRegistry
+
+
+def legacy_get_user_logger(logs_dir, username, retention_days=7):
+    """Verbatim copy of the pre-registry implementation (minus the logs_dir lookup)."""
+    os.makedirs(logs_dir, exist_ok=True)
+
+    now = time.time()
+    for filename in os.listdir(logs_dir):
+        file_path = os.path.join(logs_dir, filename)
+        if filename.endswith(".log") and os.path.isfile(file_path):
+            file_mtime = os.path.getmtime(file_path)
+            if now - file_mtime > retention_days * 86400:
+                os.remove(file_path)
+
+    log_file = os.path.join(logs_dir, f"{username}.log")
+    logger = logging.getLogger(f"LegacyMTProtoLogger_{username}")
+
+    if logger.hasHandlers():
+        for handler in list(logger.handlers):
+            handler.close()
+        logger.handlers.clear()
+
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(file_handler)
+    return logger
+
+
+def seed_logs(logs_dir, count):
+    os.makedirs(logs_dir, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(logs_dir, f"idle_user_{i}.log"), "w") as f:
+            f.write("x\n")
+
+
+def run(label, get_logger, messages, users):
+    start = time.perf_counter()
+    for i in range(messages):
+        logger = get_logger(f"user_{i % users}")
+        logger.info("===== MTProto ENCRYPTION FLOW START =====")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed * 1e6 / messages:10.1f} µs/message   ({messages} messages, {elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--stale-files", type=int, default=200, help="other users' log files sitting in logs/")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir = os.path.join(tmp, "legacy")
+        seed_logs(legacy_dir, args.stale_files)
+        run("before", lambda name: legacy_get_user_logger(legacy_dir, name), args.messages, args.users)
+
+        registry_dir = os.path.join(tmp, "registry")
+        seed_logs(registry_dir, args.stale_files)
+        registry = UserLoggerRegistry(logs_dir=registry_dir, max_handlers=args.users)
+        run("after", registry.get_logger, args.messages, args.users)
+        registry.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/bench_wire.py
+#
+# Bytes on the wire and encode/decode CPU for the two message encodings:
+#   socket  a receive_message event as the Socket.IO packet(s) the server
+#           writes: the JSON payload vs. a TL chatMessage binary attachment
+#           (placeholder text frame + binary frame), and an offline batch of
+#           OFFLINE_DELIVERY_CHUNK messages as receive_messages
+#   rest    the /auth/send-message result as hex strings in JSON vs. the TL
+#           encryptedMessage envelope, at several ciphertext sizes
+# CPU is the round trip per message: encode on the server, decode on a
+# (Python) client. No app or database needed.
+#
+#   python benchmarks/bench_wire.py [--rounds 20000]
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketio.packet import Packet, EVENT
+
+from app.services.wire_service import (
+    encode_message, encode_messages, decode_message, decode_messages, encode_encrypted, decode_encrypted,
+)
+
+TEXTS = {
+    "short": "ok, see you at 7",
+    "medium": "The quick brown fox jumps over the lazy dog. " * 6,
+    # Secret chats carry the client-side ciphertext (base64) as text
+    "secret": base64.b64encode(os.urandom(480)).decode(),
+}
+
+
+def payload(index, text, chat_mode="cloud"):
+    return {
+        "id": 100000 + index,
+        "from": 17,
+        "to": 42,
+        "text": text,
+        "timestamp": datetime(2026, 10, 17, 12, 30, 5, 123456).isoformat(),
+        "status": "✔",
+        "chat_mode": chat_mode,
+    }
+
+
+def packet_bytes(event, data):
+    encoded = Packet(EVENT, data=[event, data], namespace="/").encode()
+    if isinstance(encoded, list):  # Text header + binary attachments, one WebSocket frame each
+        return sum(len(part if isinstance(part, bytes) else part.encode()) for part in encoded)
+    return len(encoded.encode())
+
+
+def per_call_us(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def row(label, json_bytes, tl_bytes, json_us, tl_us):
+    print(f"{label:<22} {json_bytes:>8} {tl_bytes:>8} {tl_bytes / json_bytes:>6.0%}   "
+          f"{json_us:>7.2f} {tl_us:>7.2f} µs")
+
+
+def bench_socket(rounds, chunk):
+    print(f"{'socket event':<22} {'json B':>8} {'tl B':>8} {'ratio':>6}   {'json':>7} {'tl':>7}")
+    for name, text in TEXTS.items():
+        message = payload(0, text, "secret" if name == "secret" else "cloud")
+        row(
+            f"receive_message/{name}",
+            packet_bytes("receive_message", message),
+            packet_bytes("receive_message", encode_message(message)),
+            per_call_us(lambda: json.loads(json.dumps(message)), rounds),
+            per_call_us(lambda: decode_message(encode_message(message)), rounds),
+        )
+
+    batch = [payload(i, TEXTS["medium"]) for i in range(chunk)]
+    row(
+        f"receive_messages x{chunk}",
+        packet_bytes("receive_messages", {"messages": batch}),
+        packet_bytes("receive_messages", encode_messages(batch)),
+        per_call_us(lambda: json.loads(json.dumps({"messages": batch})), rounds // chunk) / chunk,
+        per_call_us(lambda: decode_messages(encode_messages(batch)), rounds // chunk) / chunk,
+    )
+
+
+def bench_rest(rounds):
+    print(f"\n{'send-message':<22} {'json B':>8} {'tl B':>8} {'ratio':>6}   {'json':>7} {'tl':>7}")
+    for size in (64, 1024, 16384):
+        fields = (os.urandom(size), os.urandom(16).hex(), os.urandom(32).hex(), os.urandom(8).hex(),
+                  os.urandom(8).hex(), str(time.time_ns()), 1)
+        encrypted_data, msg_key, auth_key_id, salt, session_id, msg_id, seq_no = fields
+
+        def json_round_trip():
+            body = json.dumps({"message": "Encrypted message generated", "payload": {
+                "encrypted_message": encrypted_data.hex(), "msg_key": msg_key, "auth_key_id": auth_key_id,
+                "salt": salt, "session_id": session_id, "msg_id": msg_id, "seq_no": seq_no,
+            }})
+            bytes.fromhex(json.loads(body)["payload"]["encrypted_message"])
+            return body
+
+        row(
+            f"ciphertext {size} B",
+            len(json_round_trip().encode()),
+            len(encode_encrypted(*fields)),
+            per_call_us(json_round_trip, rounds),
+            per_call_us(lambda: decode_encrypted(encode_encrypted(*fields)), rounds),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=int(os.environ.get("OFFLINE_DELIVERY_CHUNK", 100)))
+    args = parser.parse_args()
+
+    bench_socket(args.rounds, args.chunk)
+    bench_rest(args.rounds)
+
+
+if __name__ == "__main__":
+    main()
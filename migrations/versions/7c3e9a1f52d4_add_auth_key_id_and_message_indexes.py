@@ -0,0 +1,36 @@
+"""Add auth_key_id and message lookup indexes
+
+Revision ID: 7c3e9a1f52d4
+Revises: 951161550bae
+Create Date: 2026-10-17 10:42:18.513207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e9a1f52d4'
+down_revision = '951161550bae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_auth_key_id', ['auth_key_id'], unique=False)
+
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index('ix_messages_sender_id_timestamp', ['sender_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_messages_receiver_id_timestamp', ['receiver_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_messages_receiver_id_status', ['receiver_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_receiver_id_status')
+        batch_op.drop_index('ix_messages_receiver_id_timestamp')
+        batch_op.drop_index('ix_messages_sender_id_timestamp')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_auth_key_id')
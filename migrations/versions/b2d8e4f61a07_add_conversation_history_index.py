@@ -0,0 +1,26 @@
+"""Add conversation history index
+
+Revision ID: b2d8e4f61a07
+Revises: 7c3e9a1f52d4
+Create Date: 2026-10-17 15:08:41.274019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d8e4f61a07'
+down_revision = '7c3e9a1f52d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index('ix_messages_sender_receiver_timestamp', ['sender_id', 'receiver_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_sender_receiver_timestamp')
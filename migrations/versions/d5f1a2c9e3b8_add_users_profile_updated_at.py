@@ -0,0 +1,28 @@
+"""Add users.profile_updated_at
+
+Revision ID: d5f1a2c9e3b8
+Revises: b2d8e4f61a07
+Create Date: 2026-10-17 18:21:07.402913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f1a2c9e3b8'
+down_revision = 'b2d8e4f61a07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('profile_updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_users_profile_updated_at', ['profile_updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_profile_updated_at')
+        batch_op.drop_column('profile_updated_at')
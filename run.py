@@ -5,4 +5,4 @@ from app import create_app, socketio
 app = create_app()
 
 if __name__ == "__main__":
-    socketio.run(app, debug=True)
\ No newline at end of file
+    socketio.run(app, debug=True)
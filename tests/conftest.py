@@ -0,0 +1,74 @@
+# tests/conftest.py
+#
+# The app reads its configuration (and several services their folders) from
+# the environment and the working directory at import time, so both are set
+# here, before anything under app/ is imported.
+#
+#   python -m pytest tests
+
+import os
+import sys
+import tempfile
+
+TEST_ROOT = tempfile.mkdtemp(prefix="mtproto-tests-")
+os.chdir(TEST_ROOT)
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(TEST_ROOT, 'test.db')}",
+    CRYPTO_TRACE_ENABLED="false",
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import create_app
+
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """A fresh schema per test, with the process-wide caches emptied."""
+    from app import db
+    from app.services.auth_key_service import auth_key_cache
+    from app.services.profile_service import profile_cache
+
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+    auth_key_cache.clear()
+    profile_cache.clear()
+
+
+@pytest.fixture
+def make_user(db):
+    from app.models.user import User
+
+    def make(name, **fields):
+        user = User(username=name, email=f"{name}@test", phone=name, **fields)
+        user.set_password("test")
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def queries(db):
+    """Statements run against the database while the test body executes."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.event.listen(db.engine, "before_cursor_execute", record)
+    yield statements
+    db.event.remove(db.engine, "before_cursor_execute", record)
@@ -0,0 +1,77 @@
+# tests/test_auth_key_cache.py
+
+import os
+import time
+
+from app.services.auth_key_service import auth_key_cache, AuthKeyCache
+from app.services.profile_service import profile_cache
+
+
+def test_get_loads_once_then_hits(make_user, queries):
+    alice = make_user("alice")
+    alice.set_auth_key(os.urandom(256))
+    queries.clear()
+
+    entry = auth_key_cache.get(alice.auth_key_id)
+    assert entry.auth_key == alice.auth_key
+    assert (entry.user_id, entry.display_name) == (alice.id, "alice")
+    assert len(queries) == 1
+
+    assert auth_key_cache.get(alice.auth_key_id) is entry
+    assert len(queries) == 1
+
+
+def test_get_primes_the_profile_cache(make_user, queries):
+    alice = make_user("alice")
+    alice.set_auth_key(os.urandom(256))
+    auth_key_cache.get(alice.auth_key_id)
+    queries.clear()
+
+    assert profile_cache.display_name(alice.id) == "alice"
+    assert queries == []
+
+
+def test_unknown_key_is_none(db):
+    assert auth_key_cache.get("no-such-key") is None
+
+
+def test_rotation_invalidates_the_old_key(make_user):
+    alice = make_user("alice")
+    alice.set_auth_key(os.urandom(256))
+    old_id = alice.auth_key_id
+    assert auth_key_cache.get(old_id) is not None
+
+    alice.set_auth_key(os.urandom(256))
+    assert auth_key_cache.get(old_id) is None
+    assert auth_key_cache.get(alice.auth_key_id).auth_key == alice.auth_key
+
+
+def test_get_many_uses_one_query(make_user, queries):
+    users = [make_user(name) for name in ("alice", "bob", "carol")]
+    for user in users:
+        user.set_auth_key(os.urandom(256))
+    key_ids = [user.auth_key_id for user in users]
+    auth_key_cache.get(key_ids[0])
+    queries.clear()
+
+    found = auth_key_cache.get_many(key_ids + ["missing"])
+    assert set(found) == set(key_ids)
+    assert len(queries) == 1  # alice was cached; bob, carol and "missing" share one IN query
+
+
+def test_lru_bound_and_ttl(make_user):
+    cache = AuthKeyCache(max_entries=2, ttl=300)
+    users = [make_user(name) for name in ("alice", "bob", "carol")]
+    for user in users:
+        user.set_auth_key(os.urandom(256))
+        cache.get(user.auth_key_id)
+    assert cache.stats()["keys"] == 2
+    assert users[0].auth_key_id not in cache._keys
+
+    cache.clear()
+    cache.ttl = 0
+    cache.get(users[1].auth_key_id)  # Stored already expired
+    time.sleep(0.001)
+    misses = cache.misses
+    assert cache.get(users[1].auth_key_id) is not None
+    assert cache.misses == misses + 1
@@ -0,0 +1,74 @@
+# tests/test_media_download.py
+
+import io
+import os
+
+import pytest
+
+from app.models.message import Message
+from app.services.media_service import store_stream
+
+CONTENT = os.urandom(5000)
+
+
+@pytest.fixture
+def media(db, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    message = Message(sender_id=alice.id, receiver_id=bob.id, encrypted_data=b"x",
+                      file_path=store_stream(io.BytesIO(CONTENT)), original_filename="blob.zip")
+    db.session.add(message)
+    db.session.commit()
+    return f"/chat/media/{message.id}?user_id={bob.id}"
+
+
+def get(app, url, **headers):
+    return app.test_client().get(url, headers=headers)
+
+
+def test_full_body(app, media):
+    response = get(app, media)
+    assert response.status_code == 200
+    assert response.get_data() == CONTENT
+    assert response.headers["Accept-Ranges"] == "bytes"
+
+
+@pytest.mark.parametrize("header, start, stop", [
+    ("bytes=0-9", 0, 10),
+    ("bytes=4990-", 4990, 5000),
+    ("bytes=-100", 4900, 5000),
+    ("bytes=1000-999999", 1000, 5000),
+])
+def test_single_range(app, media, header, start, stop):
+    response = get(app, media, Range=header)
+    assert response.status_code == 206
+    assert response.get_data() == CONTENT[start:stop]
+    assert response.headers["Content-Range"] == f"bytes {start}-{stop - 1}/5000"
+
+
+def test_unsatisfiable_range(app, media):
+    response = get(app, media, Range="bytes=6000-7000")
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == "bytes */5000"
+
+
+def test_multi_range_gets_the_full_body(app, media):
+    response = get(app, media, Range="bytes=0-9,20-29")
+    assert response.status_code == 200
+    assert response.get_data() == CONTENT
+
+
+def test_if_range_mismatch_ignores_the_range(app, media):
+    response = get(app, media, Range="bytes=0-9", **{"If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.get_data() == CONTENT
+
+
+def test_if_range_match_and_etag_revalidation(app, media):
+    etag = get(app, media).headers["ETag"]
+    assert get(app, media, Range="bytes=0-9", **{"If-Range": etag}).status_code == 206
+    assert get(app, media, **{"If-None-Match": etag}).status_code == 304
+
+
+def test_non_participants_are_refused(app, media, make_user):
+    carol = make_user("carol")
+    assert get(app, media.rsplit("=", 1)[0] + f"={carol.id}").status_code == 403
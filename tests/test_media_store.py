@@ -0,0 +1,92 @@
+# tests/test_media_store.py
+
+import io
+import os
+import time
+
+import pytest
+
+from app.models.message import Message
+from app.services.media_service import store_stream, release_media, media_store_stats, decrypt_file
+
+
+@pytest.fixture
+def parties(make_user):
+    return make_user("alice").id, make_user("bob").id
+
+
+@pytest.fixture
+def no_grace(app, monkeypatch):
+    monkeypatch.setitem(app.config, "MEDIA_GC_GRACE", 0)
+
+
+def add_message(db, parties, file_path):
+    message = Message(sender_id=parties[0], receiver_id=parties[1], encrypted_data=b"x", file_path=file_path)
+    db.session.add(message)
+    db.session.commit()
+    return message
+
+
+def age(file_path, seconds=3600):
+    past = time.time() - seconds
+    os.utime(file_path, (past, past))
+
+
+def test_identical_content_is_stored_once(db, parties):
+    content = os.urandom(3000)
+    first = store_stream(io.BytesIO(content))
+    second = store_stream(io.BytesIO(content))
+    other = store_stream(io.BytesIO(os.urandom(3000)))
+
+    assert first == second != other
+    assert decrypt_file(first, None) == content
+
+    for path in (first, second, other):
+        add_message(db, parties, path)
+    stats = media_store_stats()
+    assert (stats["objects"], stats["references"], stats["bytes_saved"]) == (2, 3, os.path.getsize(first))
+
+
+def test_object_lives_until_its_last_reference(db, parties, no_grace):
+    file_path = store_stream(io.BytesIO(b"shared"))
+    first, second = add_message(db, parties, file_path), add_message(db, parties, file_path)
+
+    db.session.delete(first)
+    db.session.commit()
+    assert release_media(file_path) is False
+    assert os.path.exists(file_path)
+
+    db.session.delete(second)
+    db.session.commit()
+    assert release_media(file_path) is True
+    assert not os.path.exists(file_path)
+
+
+def test_fresh_objects_survive_gc(db, parties):
+    file_path = store_stream(io.BytesIO(b"just uploaded"))  # No Message row yet
+    assert release_media(file_path) is False
+    assert os.path.exists(file_path)
+
+
+def test_dedup_hit_protects_an_old_object(db, parties):
+    # An old object loses its only reference while an upload of the same bytes is between
+    # "stored" and "Message committed": GC must not take the object from under it
+    content = os.urandom(1000)
+    old = add_message(db, parties, store_stream(io.BytesIO(content)))
+    file_path = old.file_path
+    age(file_path)
+
+    assert store_stream(io.BytesIO(content)) == file_path  # The in-flight upload reuses it
+    db.session.delete(old)
+    db.session.commit()
+    assert release_media(file_path) is False
+
+    add_message(db, parties, file_path)  # The upload's row lands
+    assert decrypt_file(file_path, None) == content
+
+
+def test_aged_unreferenced_object_is_removed(db, parties):
+    file_path = store_stream(io.BytesIO(b"orphan"))
+    age(file_path)
+    assert release_media(file_path) is True
+    assert release_media(file_path) is False  # Already gone
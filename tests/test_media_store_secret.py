@@ -0,0 +1,33 @@
+# tests/test_media_store_secret.py
+
+import pytest
+from flask import Flask
+
+from app.services import media_service
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    return app
+
+
+def test_missing_secret_fails_outside_debug():
+    with pytest.raises(RuntimeError, match="MEDIA_STORE_SECRET"):
+        media_service.init_app(make_app(DEBUG="False", SECRET_KEY="session-secret"))
+
+
+def test_debug_falls_back_to_the_dev_key():
+    app = make_app(DEBUG=True, SECRET_KEY="session-secret")
+    media_service.init_app(app)
+    assert app.config["MEDIA_STORE_SECRET"] == media_service.DEV_MEDIA_STORE_SECRET
+
+
+def test_media_key_ignores_secret_key():
+    keys = []
+    for secret_key in ("before-rotation", "after-rotation"):
+        app = make_app(DEBUG=False, SECRET_KEY=secret_key, MEDIA_STORE_SECRET="media-secret")
+        media_service.init_app(app)
+        with app.app_context():
+            keys.append(media_service._store_keys(media_service._store_secret()))
+    assert keys[0] == keys[1]
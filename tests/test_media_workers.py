@@ -0,0 +1,35 @@
+# tests/test_media_workers.py
+
+import os
+import sys
+import time
+
+from app.services.media_processing_service import media_processor
+
+
+def test_spawned_workers_do_not_rerun_the_main_script(app, monkeypatch, tmp_path):
+    """A run.py-style script that builds the app at import must not run again in each worker."""
+    from app import socketio
+
+    marker = tmp_path / "imported"
+    script = tmp_path / "run_like.py"
+    script.write_text(f"open({str(marker)!r}, 'a').write('imported\\n')\n")
+    main = sys.modules["__main__"]
+    monkeypatch.setattr(main, "__spec__", None)
+    monkeypatch.setattr(main, "__file__", str(script), raising=False)
+    monkeypatch.setattr(media_processor, "workers", 1)
+
+    results = []
+    media_processor.shutdown()
+    try:
+        with app.app_context():
+            media_processor._run(os.getpid, (), results.append, results.append)
+        deadline = time.monotonic() + 30
+        while not results and time.monotonic() < deadline:
+            socketio.sleep(0.05)
+    finally:
+        media_processor.shutdown()
+
+    assert results and results[0] != os.getpid()
+    assert not marker.exists()
+    assert main.__file__ == str(script)  # Restored once the worker started
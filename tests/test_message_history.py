@@ -0,0 +1,85 @@
+# tests/test_message_history.py
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.message import Message
+
+BASE = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def conversation(db, make_user):
+    """alice <-> bob, seven secret-chat messages; 2 and 3 share a timestamp."""
+    alice, bob = make_user("alice"), make_user("bob")
+    offsets = [0, 1, 2, 2, 3, 4, 5]
+    for index, offset in enumerate(offsets):
+        sender, receiver = (alice, bob) if index % 2 == 0 else (bob, alice)
+        db.session.add(Message(
+            sender_id=sender.id, receiver_id=receiver.id, encrypted_data=f"m{index}".encode(),
+            auth_key_id="secretchat", timestamp=BASE + timedelta(seconds=offset),
+        ))
+    db.session.commit()
+    return alice.id, bob.id
+
+
+def texts(response):
+    return [msg["text"] for msg in response.get_json()]
+
+
+def test_newest_page_oldest_first(app, conversation):
+    alice_id, _ = conversation
+    response = app.test_client().get(f"/chat/messages/{alice_id}?limit=3")
+    assert texts(response) == ["m4", "m5", "m6"]
+    assert response.headers["X-Before-Cursor"].endswith(f"_{response.get_json()[0]['id']}")
+
+
+def test_before_cursor_walks_back_without_gaps(app, conversation):
+    alice_id, bob_id = conversation
+    client = app.test_client()
+    url = f"/chat/conversations/{alice_id}/{bob_id}/messages?limit=2"
+
+    seen, cursor = [], None
+    while True:
+        response = client.get(url + (f"&before={cursor}" if cursor else ""))
+        page = texts(response)
+        if not page:
+            break
+        seen = page + seen
+        cursor = response.headers["X-Before-Cursor"]
+
+    assert seen == [f"m{i}" for i in range(7)]  # The timestamp tie (m2/m3) is split by id
+
+
+def test_after_cursor_catches_up(app, conversation):
+    alice_id, _ = conversation
+    client = app.test_client()
+    first = client.get(f"/chat/messages/{alice_id}?limit=3")
+    response = client.get(f"/chat/messages/{alice_id}?after={first.headers['X-Before-Cursor']}&limit=2")
+    assert texts(response) == ["m5", "m6"]
+
+
+def test_invalid_cursor_is_rejected(app, conversation):
+    alice_id, _ = conversation
+    assert app.test_client().get(f"/chat/messages/{alice_id}?before=garbage").status_code == 400
+
+
+def test_hidden_messages_are_left_out(app, db, conversation):
+    alice_id, bob_id = conversation
+    Message.query.filter_by(encrypted_data=b"m6").update({"visible_to_receiver": False})
+    Message.query.filter_by(encrypted_data=b"m5").update({"visible_to_receiver": False})
+    db.session.commit()
+
+    assert "m5" not in texts(app.test_client().get(f"/chat/messages/{alice_id}"))  # alice received m5
+    assert "m5" in texts(app.test_client().get(f"/chat/messages/{bob_id}"))
+    assert "m6" not in texts(app.test_client().get(f"/chat/messages/{bob_id}"))
+
+
+def test_ndjson_streams_every_row(app, conversation):
+    alice_id, _ = conversation
+    response = app.test_client().get(f"/chat/messages/{alice_id}?format=ndjson&limit=1")
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row["text"] for row in rows] == [f"m{i}" for i in range(7)]
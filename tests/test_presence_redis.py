@@ -0,0 +1,179 @@
+# tests/test_presence_redis.py
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.services.presence_service import RedisPresence, PresenceService
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+def worker(client, worker_id, ttl=60):
+    return RedisPresence(client, ttl=ttl, worker_id=worker_id)
+
+
+def kill(client, backend):
+    """What a worker dying without a disconnect leaves behind, once its TTLs have run out."""
+    for sid in list(backend._local):
+        client.delete(backend._sid_key(sid))
+    client.delete(backend._alive_key(backend.worker_id))
+
+
+def test_first_and_last_socket(client):
+    a = worker(client, "a")
+    assert a.add(1, "s1") is True
+    assert a.add(1, "s2") is False
+    assert a.remove("s1") == (1, False)
+    assert a.remove("s2") == (1, True)
+    assert not a.is_online(1)
+    assert a.remove("unknown") == (None, False)
+
+
+def test_keys_carry_a_ttl(client):
+    a = worker(client, "a", ttl=30)
+    a.add(1, "s1")
+    for key in (a._sid_key("s1"), a._user_key(1), a._alive_key("a")):
+        assert 0 < client.ttl(key) <= 30
+
+
+def test_heartbeat_refreshes_ttls(client):
+    a = worker(client, "a", ttl=30)
+    a.add(1, "s1")
+    client.expire(a._sid_key("s1"), 1)
+    client.expire(a._user_key(1), 1)
+
+    assert a.heartbeat() == []
+    assert client.ttl(a._sid_key("s1")) > 1
+    assert client.ttl(a._user_key(1)) > 1
+
+
+def test_ghost_sid_does_not_hide_the_first_socket(client):
+    a, b = worker(client, "a"), worker(client, "b")
+    a.add(1, "ghost")
+    kill(client, a)
+
+    # The user set still lists the ghost, but its key has expired
+    assert b.add(1, "s1") is True
+    assert b.sids(1) == {"s1"}
+
+
+def test_reap_takes_dead_workers_offline(client):
+    a, b = worker(client, "a"), worker(client, "b")
+    a.add(1, "s1")
+    a.add(2, "s2")
+    b.add(2, "s3")
+    kill(client, a)
+
+    assert sorted(b.heartbeat()) == [(1, True), (2, False)]
+    assert not b.is_online(1)
+    assert b.is_online(2)
+    assert not client.exists(a._worker_key("a"))
+
+
+def test_live_workers_are_not_reaped(client):
+    a, b = worker(client, "a"), worker(client, "b")
+    a.add(1, "s1")
+    assert b.reap() == []
+    assert b.is_online(1)
+
+
+def test_restart_clears_its_predecessor(client):
+    old = worker(client, "slot-0")
+    old.add(1, "s1")
+
+    new = worker(client, "slot-0")  # Same stable id, alive marker still fresh
+    assert new.reap(include_self=True) == [(1, True)]
+    assert not new.is_online(1)
+
+
+def test_reconnect_after_a_dead_worker_delivers_pending(app, db, make_user, client, monkeypatch):
+    from app import socketio
+    from app.models.message import Message
+    from app.services.presence_service import presence
+
+    alice, bob = make_user("alice"), make_user("bob")
+    db.session.add(Message(sender_id=alice.id, receiver_id=bob.id, encrypted_data=b"while away",
+                           auth_key_id="secretchat", status="sent"))
+    db.session.commit()
+
+    dead = worker(client, "dead")
+    dead.add(bob.id, "ghost")
+    kill(client, dead)
+    monkeypatch.setattr(presence, "backend", worker(client, "live"))
+
+    socket = socketio.test_client(app)
+    socket.emit("join", {"user_id": bob.id})
+    received = [event["args"][0] for event in socket.get_received() if event["name"] == "receive_messages"]
+    socket.disconnect()
+
+    assert [msg["text"] for batch in received for msg in batch["messages"]] == ["while away"]
+    db.session.expire_all()
+    assert Message.query.one().status == "delivered"
+
+
+@pytest.fixture
+def announced(monkeypatch):
+    """``presence`` events emitted; windows are closed by calling announce() instead of a timer."""
+    from app import socketio
+
+    events = []
+    monkeypatch.setattr(socketio, "start_background_task", lambda *args, **kwargs: None)
+    monkeypatch.setattr(socketio, "emit", lambda event, data, room=None: events.append((room, data)))
+    return events
+
+
+def online_flags(events):
+    return [(room, [entry["online"] for entry in data["users"]]) for room, data in events]
+
+
+def test_reload_across_workers_announces_nothing(client, announced):
+    a, b = PresenceService(worker(client, "a")), PresenceService(worker(client, "b"))
+    a.connect(1, "s1")
+    a.announce()
+    assert online_flags(announced) == [("presence_1", [True])]
+    announced.clear()
+
+    # Page reload: the old socket drops on worker a, the new one lands on worker b
+    a.disconnect("s1")
+    b.connect(1, "s2")
+    assert b.announce() == 0  # b did not open the window
+    assert a.announce() == 0  # a did, and the user is online again
+    assert announced == []
+    assert not client.exists(a.backend._window_key(1))
+
+
+def test_offline_is_announced_once_by_the_window_owner(client, announced):
+    a, b = PresenceService(worker(client, "a")), PresenceService(worker(client, "b"))
+    a.connect(1, "s1")
+    a.announce()
+    announced.clear()
+
+    a.disconnect("s1")
+    b.connect(1, "s2")
+    b.disconnect("s2")  # Came back on b and left again within the window
+    assert b.announce() + a.announce() == 1
+    assert online_flags(announced) == [("presence_1", [False])]
+
+
+def test_window_key_expires_without_its_owner(client, announced):
+    a = PresenceService(worker(client, "a"), coalesce=0.5)
+    a.connect(1, "s1")
+    assert 0 < client.pttl(a.backend._window_key(1)) <= 2000
+
+
+def test_wire_formats_follow_live_sockets(client):
+    a, b = worker(client, "a"), worker(client, "b")
+    a.add(1, "s1", "json")
+    b.add(1, "s2", "tl")
+    assert a.wire_formats(1) == {"json", "tl"}
+
+    b.remove("s2")
+    assert a.wire_formats(1) == {"json"}
+
+    kill(client, a)
+    b.reap()
+    assert b.wire_formats(1) == set()
@@ -0,0 +1,39 @@
+# tests/test_presence_service.py
+
+from datetime import datetime
+
+import pytest
+
+from app.services.presence_service import PresenceService
+
+
+@pytest.fixture
+def service(app, monkeypatch):
+    from app import socketio
+
+    monkeypatch.setattr(socketio, "start_background_task", lambda *args, **kwargs: None)
+    service = PresenceService()
+    service.app = app
+    return service
+
+
+def test_failed_flush_requeues_the_batch(db, make_user, service, monkeypatch):
+    alice, bob = make_user("alice"), make_user("bob")
+    service.connect(alice.id, "s1")
+    service.connect(bob.id, "s2")
+
+    def lost_connection():
+        service.disconnect("s1")  # Recorded while the batch is in flight: newer, so the requeue keeps it
+        raise RuntimeError("server closed the connection")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.session, "commit", lost_connection)
+        service.flush()
+    assert service._pending[alice.id][0] is False
+    assert service._pending[bob.id][0] is True
+
+    service.flush()
+    db.session.expire_all()
+    assert (alice.is_online, bob.is_online) == (False, True)
+    assert isinstance(alice.last_seen, datetime)
+    assert service._pending == {}
@@ -0,0 +1,133 @@
+# tests/test_profile_cache.py
+
+from app.models.user import User
+from app.services.profile_service import profile_cache, ProfileCache
+
+
+def test_get_many_uses_one_query(make_user, queries):
+    ids = [make_user(name).id for name in ("alice", "bob", "carol")]
+    profile_cache.clear()
+    queries.clear()
+
+    profiles = profile_cache.get_many(ids + [999])
+    assert {user_id: p.display_name for user_id, p in profiles.items()} == dict(zip(ids, ["alice", "bob", "carol"]))
+    assert len(queries) == 1
+
+    assert profile_cache.display_name(ids[0]) == "alice"
+    assert len(queries) == 1
+
+
+def test_display_name_falls_back_to_email_then_phone(db):
+    user = User(email="only@mail", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    assert profile_cache.display_name(user.id) == "only@mail"
+
+
+def test_rename_is_seen_after_commit(db, make_user):
+    alice = make_user("alice")
+    assert profile_cache.display_name(alice.id) == "alice"
+
+    alice.username = "alicia"
+    db.session.flush()
+    # Flushed but not committed: another reader would still load the old row, so nothing is dropped yet
+    assert profile_cache.display_name(alice.id) == "alice"
+
+    db.session.commit()
+    assert profile_cache.display_name(alice.id) == "alicia"
+
+
+def test_rollback_keeps_the_cache(db, make_user):
+    alice = make_user("alice")
+    profile_cache.display_name(alice.id)
+
+    alice.username = "mallory"
+    db.session.flush()
+    db.session.rollback()
+    assert profile_cache.display_name(alice.id) == "alice"
+
+
+def test_insert_and_delete_reach_the_directory(db, make_user):
+    alice = make_user("alice")
+    assert [p.display_name for p in profile_cache.directory_page()] == ["alice"]
+
+    bob = make_user("bob")
+    assert [p.display_name for p in profile_cache.directory_page()] == ["alice", "bob"]
+
+    db.session.delete(bob)
+    db.session.commit()
+    assert [p.id for p in profile_cache.directory_page()] == [alice.id]
+
+
+def test_directory_page_prefix_and_keyset(db, make_user):
+    for name in ("anna", "bob", "andy", "Amy", "carl"):
+        make_user(name)
+
+    page = profile_cache.directory_page(limit=2, prefix="a")
+    assert [p.display_name for p in page] == ["anna", "andy"]
+    rest = profile_cache.directory_page(after_id=page[-1].id, limit=2, prefix="a")
+    assert [p.display_name for p in rest] == ["Amy"]
+
+
+def test_directory_page_is_one_bounded_query(make_user, queries):
+    anna_id = make_user("anna").id
+    for name in ("bob", "carl"):
+        make_user(name)
+    queries.clear()
+
+    assert [p.display_name for p in profile_cache.directory_page(limit=2)] == ["anna", "bob"]
+    assert len(queries) == 1
+    assert "LIMIT" in queries[0]
+    assert profile_cache.display_name(anna_id) == "anna"
+    assert len(queries) == 1  # Primed by the page
+
+
+def test_directory_prefix_is_literal(make_user):
+    make_user("a_b")
+    make_user("axb")
+    assert [p.display_name for p in profile_cache.directory_page(prefix="a_")] == ["a_b"]
+    assert profile_cache.directory_page(prefix="%") == []
+
+
+def test_lru_bound(make_user):
+    cache = ProfileCache(max_entries=2)
+    for name in ("alice", "bob", "carol"):
+        cache.get(make_user(name).id)
+    assert cache.stats()["profiles"] == 2
+
+
+def test_directory_etag_tracks_inserts_renames_and_deletes(db, make_user):
+    alice = make_user("alice")
+    etag = profile_cache.directory_etag()
+    assert profile_cache.directory_etag() == etag
+    # Another worker derives the same tag from the same table
+    assert ProfileCache().directory_etag() == etag
+
+    alice.is_online = True  # Presence writes are not profile changes
+    db.session.commit()
+    assert profile_cache.directory_etag() == etag
+
+    alice.username = "alicia"
+    db.session.commit()
+    renamed = profile_cache.directory_etag()
+    assert renamed != etag
+
+    bob = make_user("bob")
+    added = profile_cache.directory_etag()
+    assert added != renamed
+
+    db.session.delete(bob)
+    db.session.commit()
+    assert profile_cache.directory_etag() not in (added, etag)
+
+
+def test_users_revalidates_with_304(app, make_user):
+    make_user("alice")
+    client = app.test_client()
+    response = client.get("/users")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert client.get("/users", headers={"If-None-Match": etag}).status_code == 304
+
+    make_user("bob")
+    assert client.get("/users", headers={"If-None-Match": etag}).status_code == 200
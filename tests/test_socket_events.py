@@ -0,0 +1,83 @@
+# tests/test_socket_events.py
+
+import pytest
+
+
+@pytest.fixture
+def socket(app, db):
+    from app import socketio
+
+    client = socketio.test_client(app)
+    yield client
+    if client.is_connected():
+        client.disconnect()
+
+
+def errors(socket):
+    return [event["args"][0] for event in socket.get_received() if event["name"] == "error"]
+
+
+@pytest.mark.parametrize("payload", [{}, {"user_id": None}, {"user_id": "abc"}, None, [1], "7"])
+def test_join_rejects_a_bad_user_id(socket, payload):
+    assert not socket.emit("join", payload, callback=True)
+    assert errors(socket) == [{"message": "user_id must be an integer"}]
+
+
+def test_join_accepts_a_string_id(socket, make_user):
+    bob = make_user("bob")
+    assert socket.emit("join", {"user_id": str(bob.id)}, callback=True) == {"format": "json"}
+
+
+@pytest.mark.parametrize("payload", [{}, {"from": 1}, {"from": "x", "to": 2}, None, [1, 2], "typing"])
+def test_malformed_typing_is_dropped(socket, payload):
+    from app.services.presence_service import typing_throttle
+
+    relayed = typing_throttle.relayed
+    socket.emit("typing", payload)
+    assert socket.get_received() == []
+    assert typing_throttle.relayed == relayed
+
+
+def test_typing_reaches_an_online_receiver(app, socket, make_user):
+    from app import socketio
+
+    alice, bob = make_user("alice"), make_user("bob")
+    receiver = socketio.test_client(app)
+    receiver.emit("join", {"user_id": bob.id})
+    receiver.get_received()
+
+    socket.emit("typing", {"from": alice.id, "to": bob.id})
+    events = [event for event in receiver.get_received() if event["name"] == "typing"]
+    receiver.disconnect()
+    assert events[0]["args"][0] == {"from": alice.id, "username": "alice"}
+
+
+@pytest.mark.parametrize("wire_format", ["json", "tl"])
+def test_messages_are_encoded_only_for_joined_formats(app, socket, make_user, monkeypatch, wire_format):
+    from app import socketio
+    from app.services import wire_service
+
+    bob = make_user("bob")
+    socket.emit("join", {"user_id": bob.id, "format": wire_format})
+
+    rooms = []
+    monkeypatch.setattr(socketio, "emit", lambda event, data, room=None: rooms.append(room))
+    payload = {"id": 1, "from": bob.id, "to": bob.id, "text": "hi", "status": "✔", "chat_mode": "cloud",
+               "timestamp": "2026-10-17T12:00:00"}
+    wire_service.emit_message(payload, bob.id)
+    wire_service.emit_messages([payload], bob.id)
+    wire_service.emit_message(payload, bob.id + 1)  # Offline: nothing to encode
+    assert rooms == [wire_service.wire_room(bob.id, wire_format)] * 2
+
+
+def test_throttled_typing_skips_the_presence_lookup(socket, make_user, monkeypatch):
+    from app.services.presence_service import presence, typing_throttle
+
+    alice, bob = make_user("alice"), make_user("bob")
+    lookups = []
+    monkeypatch.setattr(presence, "is_online", lambda user_id: lookups.append(user_id) or False)
+    monkeypatch.setattr(typing_throttle, "_last", {})
+
+    for _ in range(5):
+        socket.emit("typing", {"from": alice.id, "to": bob.id})
+    assert lookups == [bob.id]
@@ -0,0 +1,95 @@
+# tests/test_status_batcher.py
+
+import pytest
+
+from app.models.message import Message
+from app.services.status_service import MessageStatusBatcher
+
+
+@pytest.fixture
+def messages(db, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    rows = [Message(sender_id=alice.id, receiver_id=bob.id, encrypted_data=b"x", status="sent") for _ in range(3)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+def statuses(db, ids):
+    db.session.expire_all()
+    return [db.session.get(Message, message_id).status for message_id in ids]
+
+
+def batcher(app, durability, max_pending=200):
+    batcher = MessageStatusBatcher(durability=durability, flush_interval=60, max_pending=max_pending)
+    batcher.app = app
+    return batcher
+
+
+def test_batched_writes_wait_for_flush(app, db, messages):
+    status_batcher = batcher(app, "batched")
+    status_batcher.record(messages[0], "delivered")
+
+    assert statuses(db, messages[:1]) == ["sent"]
+    assert status_batcher.pending_status(messages[0]) == "delivered"
+
+    status_batcher.flush()
+    assert statuses(db, messages[:1]) == ["delivered"]
+    assert status_batcher.pending_status(messages[0]) is None
+
+
+def test_highest_status_wins_within_a_batch(app, db, messages):
+    status_batcher = batcher(app, "batched")
+    status_batcher.record(messages[0], "read")
+    status_batcher.record(messages[0], "✔✔")  # Client acks rank as delivered
+    status_batcher.record(messages[1], "delivered")
+    status_batcher.record(messages[1], "read")
+    status_batcher.flush()
+
+    assert statuses(db, messages[:2]) == ["read", "read"]
+
+
+def test_read_is_never_downgraded(app, db, messages):
+    status_batcher = batcher(app, "batched")
+    status_batcher.record(messages[0], "read")
+    status_batcher.flush()
+    status_batcher.record(messages[0], "delivered")
+    status_batcher.flush()
+
+    assert statuses(db, messages[:1]) == ["read"]
+
+
+def test_max_pending_flushes_inline(app, db, messages):
+    status_batcher = batcher(app, "batched", max_pending=3)
+    for message_id in messages:
+        status_batcher.record(message_id, "delivered")
+
+    assert statuses(db, messages) == ["delivered"] * 3
+
+
+def test_strict_commits_every_event(app, db, messages):
+    status_batcher = batcher(app, "strict")
+    status_batcher.record(messages[2], "read")
+
+    assert statuses(db, messages) == ["sent", "sent", "read"]
+
+
+def test_failed_flush_keeps_the_batch(app, db, messages, monkeypatch):
+    status_batcher = batcher(app, "batched")
+    status_batcher.record(messages[0], "delivered")
+    status_batcher.record(messages[1], "read")
+
+    def locked():
+        raise RuntimeError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.session, "commit", locked)
+        assert status_batcher.flush() is False
+
+    assert statuses(db, messages[:2]) == ["sent", "sent"]
+    assert status_batcher.pending_status(messages[0]) == "delivered"
+
+    status_batcher.record(messages[0], "read")  # Arrives before the retry: highest status still wins
+    assert status_batcher.flush() is True
+    assert statuses(db, messages[:2]) == ["read", "read"]
+    assert status_batcher.pending_status(messages[0]) is None
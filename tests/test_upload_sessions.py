@@ -0,0 +1,189 @@
+# tests/test_upload_sessions.py
+
+import io
+import os
+import time
+
+import pytest
+
+from app.models.message import Message
+from app.services.media_processing_service import media_processor
+from app.services.media_service import iter_decrypted_range, store_stream
+from app.services.upload_service import upload_sessions
+
+PART = 1024
+CONTENT = os.urandom(3 * PART + 100)
+
+
+@pytest.fixture
+def inline(monkeypatch):
+    monkeypatch.setattr(media_processor, "workers", 0)
+
+
+@pytest.fixture
+def users(db, make_user):
+    return make_user("alice"), make_user("bob")
+
+
+@pytest.fixture
+def client(app, users):
+    return app.test_client()
+
+
+@pytest.fixture
+def sender(app, users):
+    from app import socketio
+
+    socket = socketio.test_client(app)
+    socket.emit("join", {"user_id": users[0].id})
+    socket.get_received()
+    yield socket
+    socket.disconnect()
+
+
+def open_session(client, users, size=len(CONTENT), part_size=PART, filename="blob.zip"):
+    alice, bob = users
+    return client.post("/chat/uploads", json={
+        "sender_id": alice.id, "receiver_id": bob.id, "filename": filename, "size": size, "part_size": part_size,
+    })
+
+
+def put_part(client, upload_id, part, data=None):
+    data = CONTENT[part * PART:(part + 1) * PART] if data is None else data
+    return client.put(f"/chat/uploads/{upload_id}/parts/{part}", data=data)
+
+
+def events(socket, name):
+    return [event["args"][0] for event in socket.get_received() if event["name"] == name]
+
+
+def stored_content(file_path):
+    return b"".join(iter_decrypted_range(file_path, None))
+
+
+def test_open_describes_the_parts(client, users):
+    response = open_session(client, users)
+    assert response.status_code == 201
+    session = response.get_json()
+    assert (session["parts"], session["part_size"], session["received"], session["sealing"]) == (4, PART, [], False)
+
+
+@pytest.mark.parametrize("fields, status", [
+    ({"part_size": 1000}, 400),
+    ({"part_size": 1024 * 1024}, 400),
+    ({"size": 0}, 413),
+    ({"filename": "run.exe"}, 400),
+])
+def test_open_rejects_bad_sessions(client, users, fields, status):
+    assert open_session(client, users, **fields).status_code == status
+
+
+def test_parts_in_any_order_and_resent(client, users):
+    upload_id = open_session(client, users).get_json()["upload_id"]
+    for part in (3, 1, 1, 0):
+        assert put_part(client, upload_id, part).status_code == 204
+    assert client.get(f"/chat/uploads/{upload_id}").get_json()["received"] == [0, 1, 3]
+
+
+def test_part_of_the_wrong_size_is_rejected(client, users):
+    upload_id = open_session(client, users).get_json()["upload_id"]
+    assert put_part(client, upload_id, 0, b"short").status_code == 400
+    assert put_part(client, upload_id, 3, CONTENT[:PART]).status_code == 400  # The last part is 100 bytes
+    assert put_part(client, upload_id, 4, b"x").status_code == 400
+    assert client.get(f"/chat/uploads/{upload_id}").get_json()["received"] == []
+
+
+def test_finalize_with_missing_parts_is_a_conflict(client, users):
+    upload_id = open_session(client, users).get_json()["upload_id"]
+    put_part(client, upload_id, 0)
+    response = client.post(f"/chat/uploads/{upload_id}/finalize")
+    assert response.status_code == 409
+    assert "[1, 2, 3]" in response.get_json()["error"]
+
+
+def test_finalize_answers_202_and_publishes_the_message(inline, db, client, users, sender):
+    upload_id = open_session(client, users).get_json()["upload_id"]
+    for part in range(4):
+        put_part(client, upload_id, part)
+
+    response = client.post(f"/chat/uploads/{upload_id}/finalize")
+    assert response.status_code == 202
+    assert response.get_json()["sealing"] is True
+
+    finalized = events(sender, "upload_finalized")
+    assert [event["upload_id"] for event in finalized] == [upload_id]
+    message = db.session.get(Message, finalized[0]["message"]["id"])
+    assert message.original_filename == "blob.zip"
+    assert stored_content(message.file_path) == CONTENT
+
+    # The session is gone, and the object deduplicates with a single-shot upload of the same bytes
+    assert client.get(f"/chat/uploads/{upload_id}").status_code == 404
+    assert client.post(f"/chat/uploads/{upload_id}/finalize").status_code == 404
+    assert store_stream(io.BytesIO(CONTENT)) == message.file_path
+
+
+def test_failed_seal_reopens_the_session(inline, monkeypatch, client, users, sender):
+    from app.services import media_service
+
+    def broken(path, user=None):
+        raise OSError("disk full")
+
+    upload_id = open_session(client, users).get_json()["upload_id"]
+    for part in range(4):
+        put_part(client, upload_id, part)
+
+    monkeypatch.setattr(media_service, "seal_media_object", broken)
+    assert client.post(f"/chat/uploads/{upload_id}/finalize").status_code == 202
+    assert [event["upload_id"] for event in events(sender, "upload_failed")] == [upload_id]
+    assert client.get(f"/chat/uploads/{upload_id}").get_json()["received"] == [0, 1, 2, 3]
+
+    monkeypatch.undo()
+    monkeypatch.setattr(media_processor, "workers", 0)
+    assert client.post(f"/chat/uploads/{upload_id}/finalize").status_code == 202
+    assert events(sender, "upload_finalized")
+
+
+def test_finalize_does_not_seal_on_the_request_path(app, client, users, sender):
+    """With media workers the route returns before the container is sealed."""
+    from app import socketio
+
+    media_processor.shutdown()
+    upload_id = open_session(client, users).get_json()["upload_id"]
+    for part in range(4):
+        put_part(client, upload_id, part)
+
+    try:
+        assert client.post(f"/chat/uploads/{upload_id}/finalize").status_code == 202
+        assert client.get(f"/chat/uploads/{upload_id}").get_json()["sealing"] is True
+
+        deadline = time.monotonic() + 30
+        finalized = []
+        while not finalized and time.monotonic() < deadline:
+            socketio.sleep(0.05)
+            finalized = events(sender, "upload_finalized")
+        assert [event["upload_id"] for event in finalized] == [upload_id]
+    finally:
+        media_processor.shutdown()
+
+
+def test_discard(client, users):
+    upload_id = open_session(client, users).get_json()["upload_id"]
+    assert client.delete(f"/chat/uploads/{upload_id}").status_code == 204
+    assert client.get(f"/chat/uploads/{upload_id}").status_code == 404
+    assert put_part(client, upload_id, 0).status_code == 404
+
+
+def test_sweep_removes_idle_sessions(client, users):
+    idle = open_session(client, users).get_json()["upload_id"]
+    active = open_session(client, users).get_json()["upload_id"]
+    old = time.time() - upload_sessions.ttl - 60
+    os.utime(upload_sessions._dir(idle), (old, old))
+
+    assert upload_sessions.sweep() == 1
+    assert client.get(f"/chat/uploads/{idle}").status_code == 404
+    assert client.get(f"/chat/uploads/{active}").status_code == 200
+
+
+def test_unknown_or_malformed_ids(client, users):
+    assert client.get("/chat/uploads/" + "0" * 32).status_code == 404
+    assert client.get("/chat/uploads/..%2Fetc").status_code == 404
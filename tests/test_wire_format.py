@@ -0,0 +1,46 @@
+# tests/test_wire_format.py
+
+import os
+import json
+import shutil
+import subprocess
+from datetime import datetime
+
+import pytest
+
+from app.services.wire_service import encode_message, decode_message, encode_messages, decode_messages
+
+WIRE_FORMAT_JS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "app", "static", "js", "wire_format.js")
+
+TIMESTAMPS = [
+    datetime(2026, 10, 17, 12, 30, 5, 123456),
+    datetime(2026, 10, 17, 12, 30, 5),  # isoformat() drops a zero fraction
+    datetime(2026, 1, 2, 3, 4, 5, 7),
+    datetime(1999, 12, 31, 23, 59, 59, 999999),
+]
+
+
+def payload(timestamp, **fields):
+    return dict({"id": 7, "from": 1, "to": 2, "text": "hi ✔", "timestamp": timestamp.isoformat(),
+                 "status": "✔", "chat_mode": "cloud"}, **fields)
+
+
+@pytest.mark.parametrize("timestamp", TIMESTAMPS)
+def test_round_trip_keeps_microseconds(timestamp):
+    assert decode_message(encode_message(payload(timestamp))) == payload(timestamp)
+
+
+def test_vector_and_optional_fields():
+    messages = [payload(TIMESTAMPS[0], chat_mode="secret"), payload(TIMESTAMPS[1], file="a/b", media_type="image")]
+    assert decode_messages(encode_messages(messages)) == messages
+
+
+@pytest.mark.skipif(not shutil.which("node"), reason="node is not installed")
+@pytest.mark.parametrize("timestamp", TIMESTAMPS)
+def test_browser_decoder_matches_the_json_format(timestamp):
+    script = (open(WIRE_FORMAT_JS).read()
+              + f"\nconsole.log(JSON.stringify(decodeWireMessage(new Uint8Array({list(encode_message(payload(timestamp)))}))));")
+    decoded = json.loads(subprocess.check_output(["node", "-e", script]))
+    assert decoded["timestamp"] == timestamp.isoformat()
+    assert decoded == payload(timestamp)